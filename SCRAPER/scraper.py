@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 import gspread
 import re
@@ -7,51 +9,54 @@ from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 # --- Import for multiprocessing ---
+import json
+import uuid
+import queue
 import multiprocessing
-from functools import partial
 
-# --- Import geopy and phonenumbers libraries ---
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+# --- Import phonenumbers library ---
 import phonenumbers
 from phonenumbers import phonenumberutil
 
+# --- Shared helpers live in the backend package (no DB/Selenium imports there) ---
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from geocoding import GeoCache
+from scroll_engine import scroll_feed
+from browser_profile import PageMetrics, apply_profile, enable_blocking
+from instrumentation import StageTimings
+from rate_control import get_rate_controller, page_signal
+from driver_path import resolve_driver_path
+from sheet_sink import SheetSink, SheetKeyCache, SHEET_CACHE_DIR
+
+_geo_cache = None
+UNIT_HISTORY_PATH = os.path.join(SHEET_CACHE_DIR, "unit_sizes.json")
+MAPS_BASE_URL = os.getenv("MAPS_BASE_URL", "https://www.google.com/maps").rstrip("/")
+
 def get_country_for_location(location):
     """
-    Uses the Nominatim geocoding API to reliably find the country name and 2-letter code.
+    Finds the country name and 2-letter code for a location.
+    Checks the persistent geocode cache and the bundled city table first and
+    only falls back to the Nominatim API on a miss.
     Returns: (str: country_name, str: country_code)
     """
+    global _geo_cache
+    if _geo_cache is None:
+        _geo_cache = GeoCache(user_agent="my_business_scraper_v1.3", timeout=10)
+
     print(f"--- Determining country for '{location}'...")
-    try:
-        geolocator = Nominatim(user_agent="my_business_scraper_v1.3")
-        location_data = geolocator.geocode(
-            location, 
-            addressdetails=True, 
-            language="en", 
-            timeout=10
-        )
-        
-        if location_data and 'address' in location_data.raw and 'country' in location_data.raw['address']:
-            country_name = location_data.raw['address']['country']
-            country_code = location_data.raw['address']['country_code'].upper() # e.g., "in" -> "IN"
-            print(f"--- Found country: {country_name} ({country_code}) ---")
-            return country_name, country_code
-        else:
-            print(f"--- Could not find country for '{location}' via geopy. ---")
-            return "Not specified", None
-            
-    except (GeocoderTimedOut, GeocoderUnavailable) as e:
-        print(f"--- Geocoding service error: {e}. Defaulting to 'Not specified'. ---")
-        return "Not specified", None
-    except Exception as e:
-        print(f"--- An unexpected error occurred in get_country_for_location: {e} ---")
-        return "Not specified", None
+    resolution = _geo_cache.resolve(location, default=("Not specified", None))
+    status = "cache hit" if resolution.cache_hit else "cache miss"
+
+    if resolution.source == "default":
+        print(f"--- Could not find country for '{location}' ({status}). Defaulting to 'Not specified'. ---")
+    else:
+        print(f"--- Found country: {resolution.country} ({resolution.country_code}) [{status}, {resolution.source}] ---")
+    return resolution.country, resolution.country_code
 
 def validate_and_get_mobile(phone_number_str, country_code):
     """
@@ -82,31 +87,56 @@ def validate_and_get_mobile(phone_number_str, country_code):
         print(f"     └── ⛔ Error in phone validation: {e}")
         return None
 
-def find_and_save_dynamically(keyword, location, user_country, user_country_code, worksheet, existing_keys):
+def start_browser():
+    """A new Chrome with the CLI's options. Pool workers start one and reuse it for every unit."""
+    options = webdriver.ChromeOptions()
+    options.add_argument('--log-level=3')
+    options.add_argument('--ignore-certificate-errors')
+    options.add_argument('--allow-running-insecure-content')
+    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+    options.add_argument('--start-maximized') # Start the browser maximized
+    apply_profile(options) # BROWSER_PROFILE=lean blocks images/fonts/tiles and loads pages eagerly
+    # Resolved once per process and remembered on disk; CHROMEDRIVER_PATH / DRIVER_OFFLINE=1 pin it
+    driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+    enable_blocking(driver)
+    return driver
+
+def reset_browser(driver):
+    """Close leftover tabs so the next unit starts from a single blank tab."""
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.get("about:blank")
+
+def find_and_save_dynamically(keyword, location, user_country, user_country_code, sink, existing_keys, driver=None, unit_stats=None):
     """
     Searches Google Maps, visits the business website to find an email,
     and saves valid, unique businesses that have a valid mobile number (email is optional).
     
-    NOTE: This function opens and closes its own browser instance.
+    NOTE: This function opens and closes its own browser instance unless `driver` is passed in
+    (pool workers reuse theirs). `unit_stats`, if given, gets the number of result links.
     """
     search_query = f"{keyword} in {location}, {user_country}".replace(" ", "+")
-    url = f"https://www.google.com/maps/search/{search_query}" 
+    url = f"{MAPS_BASE_URL}/search/{search_query}" 
 
-    service = Service(ChromeDriverManager().install())
-    options = webdriver.ChromeOptions()
-    options.add_argument('--log-level=3')
-    options.add_argument('--ignore-certificate-errors')
-    options.add_argument('--allow-running-insecure-content')
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-    options.add_argument('--start-maximized') # Start the browser maximized
+    timings = StageTimings() # where this query's time went, printed when it finishes
+    metrics = PageMetrics(timings=timings)
+    # Adaptive pacing instead of fixed sleeps: speeds up while Maps answers normally, backs off on throttling
+    maps_rate = get_rate_controller("maps")
+    web_rate = get_rate_controller("web")
+    own_driver = driver is None
     
-    driver = None # Initialize driver to None
     try:
-        driver = webdriver.Chrome(service=service, options=options)
+        if own_driver:
+            with timings.span("driver_startup"):
+                driver = start_browser()
         wait = WebDriverWait(driver, 15) 
 
         print(f"[{keyword}] Navigating to Google Maps for '{location}, {user_country}'...")
-        driver.get(url)
+        maps_rate.acquire(url)
+        metrics.timed_get(driver, url)
 
         # --- Handle Consent Pop-up ---
         try:
@@ -120,17 +150,14 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
         business_card_selector = 'a.hfpxzc'
         scrollable_div = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="feed"]')))
         print(f"[{keyword}] Scrolling to load all results for '{location}'...")
-        last_count = 0
-        while True:
-            driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scrollable_div)
-            time.sleep(random.uniform(2.0, 4.0)) 
-            current_count = len(driver.find_elements(By.CSS_SELECTOR, business_card_selector))
-            if current_count == last_count:
-                print(f"[{keyword}] Reached the end of the results.")
-                break
-            last_count = current_count
+        with timings.span("scroll"):
+            result = scroll_feed(driver, scrollable_div, business_card_selector)
+        print(f"[{keyword}] Reached the end of the results ({result.reason}, {result.scrolls} scrolls in {result.elapsed:.1f}s).")
 
         business_links = [elem.get_attribute('href') for elem in driver.find_elements(By.CSS_SELECTOR, business_card_selector)]
+        if unit_stats is not None:
+            unit_stats["links"] = len(business_links)
+        maps_rate.observe(url, page_signal(driver.current_url, driver.title) or (None if business_links else "empty_feed"))
         print(f"[{keyword}] Found {len(business_links)} businesses in '{location}'. Starting scraping...")
         
         added_count = 0
@@ -142,7 +169,16 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
         for i, link in enumerate(business_links):
             try:
                 driver.switch_to.new_window('tab')
-                driver.get(link)
+                enable_blocking(driver)
+                maps_rate.acquire(link)
+                metrics.timed_get(driver, link)
+                signal = page_signal(driver.current_url, driver.title)
+                maps_rate.observe(link, signal)
+                if signal:
+                    print(f"     [{keyword}] 🟠 Throttled ({signal}), slowing down to {maps_rate.rate(link):.2f} pages/s.")
+                    driver.close()
+                    driver.switch_to.window(original_tab)
+                    continue
 
                 try: name = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'h1.DUwDvf, h1.fontHeadlineLarge'))).text
                 except TimeoutException: name = "Name not found"
@@ -161,22 +197,30 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
                 email = "No email found"
                 if website != "No website":
                     try:
-                        driver.get(website)
-                        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-                        time.sleep(random.uniform(2.0, 4.0)) 
-                        mailto_links = driver.find_elements(By.CSS_SELECTOR, 'a[href^="mailto:"]')
-                        if mailto_links:
-                            email_href = mailto_links[0].get_attribute('href')
-                            email = email_href.replace('mailto:', '', 1).split('?')[0] 
-                        if email == "No email found":
-                            page_source = driver.page_source
-                            email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.(?!jpg|png|svg|jpeg|gif|webp)[a-zA-Z]{2,}'
-                            matches = re.findall(email_regex, page_source, re.IGNORECASE)
-                            if matches: email = matches[0] 
+                        with timings.span("email_fetch"):
+                            web_rate.acquire(website)
+                            metrics.timed_get(driver, website)
+                            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                            web_rate.success(website)
+                            # Give scripts a moment to render mailto links, but only until one shows up
+                            try:
+                                WebDriverWait(driver, 2).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'a[href^="mailto:"]')))
+                            except TimeoutException:
+                                pass
+                            mailto_links = driver.find_elements(By.CSS_SELECTOR, 'a[href^="mailto:"]')
+                            if mailto_links:
+                                email_href = mailto_links[0].get_attribute('href')
+                                email = email_href.replace('mailto:', '', 1).split('?')[0] 
+                            if email == "No email found":
+                                page_source = driver.page_source
+                                email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.(?!jpg|png|svg|jpeg|gif|webp)[a-zA-Z]{2,}'
+                                matches = re.findall(email_regex, page_source, re.IGNORECASE)
+                                if matches: email = matches[0] 
                     except Exception as web_e:
                         print(f"     [{keyword}] ⛔ Error scraping website {website}: {type(web_e).__name__}")
                 
-                mobile_number = validate_and_get_mobile(phone, user_country_code)
+                with timings.span("phone_validation"):
+                    mobile_number = validate_and_get_mobile(phone, user_country_code)
                 print(f"[{keyword}][{i+1}/{len(business_links)}] Scraped: {name} | Mobile: {mobile_number or 'None'}")
                 
                 if not mobile_number:
@@ -187,7 +231,7 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
 
                 item_key = (name, address)
                 
-                if item_key in existing_keys:
+                if not existing_keys.claim(item_key):
                     print(f"     [{keyword}] 🔵 Skipping (Duplicate already in sheet).")
                     driver.close()
                     driver.switch_to.window(original_tab)
@@ -195,19 +239,15 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
                 
                 row_to_add = [name, address, mobile_number, website, email, country, keyword, city]
                 
-                worksheet.append_row(row_to_add, value_input_option='USER_ENTERED')
-                
-                existing_keys.add(item_key) 
+                # Buffered: the sink writes batches with append_rows in the background
+                sink.add(row_to_add)
                 
                 added_count += 1
-                print(f"     [{keyword}] ✅ Added to Google Sheet.")
+                print(f"     [{keyword}] ✅ Queued for Google Sheet.")
                 
                 driver.close()
                 driver.switch_to.window(original_tab)
 
-                if i < len(business_links) - 1:
-                    time.sleep(random.uniform(2.6, 5.6))
-
             except Exception as e:
                 print(f"     [{keyword}] ⛔ An unexpected error occurred on this business: {e}")
                 if len(driver.window_handles) > 1:
@@ -219,86 +259,190 @@ def find_and_save_dynamically(keyword, location, user_country, user_country_code
 
     except TimeoutException:
         print(f"[{keyword}] ⛔ Could not find search results for '{location}'. Skipping.")
+        try:
+            maps_rate.throttled(url, page_signal(driver.current_url, driver.title) or "empty_feed")
+        except Exception:
+            pass
         return 0
     except Exception as e:
         print(f"[{keyword}] ⛔ An unexpected error occurred in find_and_save: {e}")
         return 0
     finally:
         if driver:
-            driver.quit()
+            metrics.add_transfer(driver)
+            report = metrics.report()
+            transfer = (f"{report['mb_transferred']} MB, {report['blocked_requests']} requests blocked"
+                        if report["mb_transferred"] is not None else "transfer not measured (BROWSER_METRICS=0)")
+            print(f"[{keyword}] Browser ({report['profile']}): {report['pages']} pages, avg load {report['avg_load_ms']} ms, {transfer}.")
+            breakdown = ", ".join(f"{stage} {numbers['total_s']}s" for stage, numbers in timings.report().items())
+            print(f"[{keyword}] Time by stage: {breakdown}")
+            pacing = maps_rate.report()
+            print(f"[{keyword}] Pacing: {maps_rate.rate(url):.2f} pages/s to Maps, {pacing['waited_s']}s waited, "
+                  f"throttle signals: {pacing['throttle_signals'] or 'none'}.")
+            if own_driver:
+                driver.quit()
+            else:
+                try:
+                    reset_browser(driver)
+                except Exception:
+                    pass # the worker checks the browser before its next unit
+
+
+# --- Spreadsheet setup (parent process) ---
+def open_spreadsheet():
+    scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+    creds = Credentials.from_service_account_file("service_account.json", scopes=scope)
+    client = gspread.authorize(creds)
+    return client.open("scraper")
+
+def prepare_worksheet(spreadsheet, user_keyword, all_worksheet_titles):
+    """Get or create the keyword's worksheet and bring its dedup keys up to date."""
+    # --- Get/Create worksheet ---
+    worksheet = None
+    for title in all_worksheet_titles:
+        if title.lower() == user_keyword.lower():
+            print(f"[{user_keyword}] Found existing worksheet: '{title}'")
+            worksheet = spreadsheet.worksheet(title)
+            break
+
+    if worksheet is None:
+        print(f"[{user_keyword}] Worksheet '{user_keyword}' not found. Creating it...")
+        worksheet = spreadsheet.add_worksheet(title=user_keyword, rows="1000", cols="20")
+        worksheet.append_row(['NAME', 'ADDRESS', 'PHONE', 'WEBSITE', 'EMAIL', 'COUNTRY', 'KEYWORD', 'CITY'])
+
+    # --- Get existing keys for this worksheet ---
+    print(f"[{user_keyword}] Fetching existing data to prevent duplicates...")
+    headers = worksheet.row_values(1)
+    if 'EMAIL' not in headers:
+        worksheet.update_cell(1, 5, 'EMAIL') # Add header if missing
+
+    # Only NAME/ADDRESS of rows added since the last run are read; the rest come from the local cache
+    key_cache = SheetKeyCache(worksheet)
+    rows_read = key_cache.sync(headers)
+    print(f"[{user_keyword}] Found {len(key_cache.keys)} existing records ({rows_read} rows read from the sheet).")
+    return worksheet, key_cache
+
+
+# --- Work units: one (keyword, location) pair each, biggest first ---
+def unit_key(keyword, location):
+    return f"{keyword.lower()}|{location.lower()}"
+
+def load_unit_history():
+    """Result links seen per unit on earlier runs, used to start the biggest units first."""
+    try:
+        with open(UNIT_HISTORY_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
+def save_unit_history(history):
+    os.makedirs(os.path.dirname(UNIT_HISTORY_PATH), exist_ok=True)
+    with open(UNIT_HISTORY_PATH, "w") as f:
+        json.dump(history, f)
 
-# --- Worker function for parallel processing ---
-def process_keyword_task(user_keyword, locations_list):
+def plan_units(keywords_list, locations_list, history):
+    # Units never seen before sort first: a full results list is the common case
+    units = [(kw, loc) for kw in keywords_list for loc in locations_list]
+    return sorted(units, key=lambda unit: -history.get(unit_key(*unit), float("inf")))
+
+
+class SharedKeys:
+    """The (name, address) keys of one worksheet, held in a Manager dict every worker process sees."""
+
+    def __init__(self, shared, title):
+        self.shared = shared
+        self.title = title
+
+    def claim(self, key):
+        """True if this call took the key. setdefault runs in the manager, so two processes can't both win."""
+        token = uuid.uuid4().hex
+        return self.shared.setdefault((self.title, *key), token) == token
+
+    def release(self, keys):
+        """Give up keys whose rows did not reach the sheet, so another unit or the next run can add them."""
+        for key in keys:
+            self.shared.pop((self.title, *key), None)
+
+
+def browser_alive(driver):
+    try:
+        driver.window_handles
+        return True
+    except Exception:
+        return False
+
+
+# --- Worker process: pulls units until it gets None ---
+def unit_worker(unit_queue, results, shared_keys, countries, titles):
     """
-    This function is run by each parallel process.
-    It handles ONE keyword and loops through ALL locations for it.
+    Runs in each pool process. Authorizes with Google once, keeps one browser
+    for all of its units and takes the next (keyword, location) off the shared
+    queue as soon as it is free, so no core idles while work is left.
     """
     
-    # --- THIS IS THE FIX ---
     # Add a random delay ("jitter") to prevent all processes from
     # authenticating at the exact same time.
     time.sleep(random.uniform(1.0, 5.0))
-    # --- END OF FIX ---
+    name = multiprocessing.current_process().name
 
-    print(f"\n--- Process started for keyword: '{user_keyword}' ---")
-    
+    sinks = {} # worksheet title -> SheetSink, one buffered writer per sheet in this process
+    driver = None
     try:
-        # --- Each process must authorize itself ---
-        print(f"[{user_keyword}] Connecting to Google Sheets...")
-        scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-        creds = Credentials.from_service_account_file("service_account.json", scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open("scraper")
-        
-        # --- Get/Create worksheet ---
-        worksheet = None
-        all_worksheet_titles = [ws.title for ws in spreadsheet.worksheets()]
-        for title in all_worksheet_titles:
-            if title.lower() == user_keyword.lower():
-                print(f"[{user_keyword}] Found existing worksheet: '{title}'")
-                worksheet = spreadsheet.worksheet(title)
+        print(f"[{name}] Connecting to Google Sheets...")
+        spreadsheet = open_spreadsheet()
+        while True:
+            unit = unit_queue.get()
+            if unit is None:
                 break
-
-        if worksheet is None:
-            print(f"[{user_keyword}] Worksheet '{user_keyword}' not found. Creating it...")
-            worksheet = spreadsheet.add_worksheet(title=user_keyword, rows="1000", cols="20")
-            worksheet.append_row(['NAME', 'ADDRESS', 'PHONE', 'WEBSITE', 'EMAIL', 'COUNTRY', 'KEYWORD', 'CITY'])
-
-        # --- Get existing keys for this worksheet ---
-        print(f"[{user_keyword}] Fetching existing data to prevent duplicates...")
-        headers = worksheet.row_values(1)
-        if 'EMAIL' not in headers:
-            worksheet.update_cell(1, 5, 'EMAIL') # Add header if missing
-
-        existing_records = worksheet.get_all_records()
-        existing_business_keys = {(rec['NAME'], rec['ADDRESS']) for rec in existing_records if 'NAME' in rec and 'ADDRESS' in rec}
-        print(f"[{user_keyword}] Found {len(existing_business_keys)} existing records.")
-        
-        total_added_for_this_keyword = 0
-        
-        # --- Loop through locations for this one keyword ---
-        for loc_index, location in enumerate(locations_list): 
-            user_country, user_country_code = get_country_for_location(location)
-            print(f"\n[{user_keyword}] Processing Location {loc_index + 1}/{len(locations_list)}: '{location}'")
-            
-            newly_added = find_and_save_dynamically(
-                user_keyword, location, user_country, user_country_code, 
-                worksheet, # Pass the G-Sheet object
-                existing_business_keys # Pass the local set
-            )
-            total_added_for_this_keyword += newly_added
-            print(f"--- [{user_keyword}] Finished '{location}'. Added {newly_added}. ---")
-
-        print(f"\n--- Process finished for keyword: '{user_keyword}'. Total added: {total_added_for_this_keyword} ---")
-        return total_added_for_this_keyword
+            keyword, location = unit
+            added, unit_stats = 0, {}
+            try:
+                if driver is None or not browser_alive(driver):
+                    if driver is not None:
+                        try:
+                            driver.quit()
+                        except Exception:
+                            pass
+                    driver = start_browser()
+                title = titles[keyword]
+                if title not in sinks:
+                    # The main process persists only the keys of rows that reached the sheet
+                    sinks[title] = SheetSink(
+                        spreadsheet.worksheet(title),
+                        on_written=lambda keys, title=title: results.put(("written", title, keys)),
+                        on_unsaved=SharedKeys(shared_keys, title).release,
+                    )
+                user_country, user_country_code = countries[location]
+                print(f"\n[{name}] Processing '{keyword}' in '{location}'")
+                added = find_and_save_dynamically(
+                    keyword, location, user_country, user_country_code,
+                    sinks[title], # Buffered writer for this worksheet
+                    SharedKeys(shared_keys, title), # Dedup keys shared by all processes
+                    driver, unit_stats,
+                )
+            except Exception as e:
+                print(f"⛔ [{name}] '{keyword}' in '{location}' failed: {e}")
+            results.put(("unit", keyword, location, added, unit_stats.get("links")))
 
     except FileNotFoundError:
-        print(f"⛔ [{user_keyword}] ERROR: 'service_account.json' not found. Process can't start.")
-        return 0
+        print(f"⛔ [{name}] ERROR: 'service_account.json' not found. Process can't start.")
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
-        print(f"⛔ [{user_keyword}] An unexpected error occurred: {e}")
-        return 0
+        print(f"⛔ [{name}] An unexpected error occurred: {e}")
+    finally:
+        for title, sink in sinks.items():
+            # Whatever is still buffered is written before the process exits
+            sink.close()
+            stats = sink.stats
+            print(f"[{name}] Google Sheet '{title}': {stats['rows_written']} rows in {stats['api_calls']} writes, "
+                  f"{stats['retries']} quota retries ({stats['backoff_seconds']:.0f}s backoff), {stats['rows_unsaved']} rows saved locally.")
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        results.put(("exit", name))
 
 
 # --- Main script execution ---
@@ -310,37 +454,98 @@ if __name__ == "__main__":
     locations_input = input(f"Enter locations, separated by commas (e.g., 'New Delhi, London, New York'): ")
     locations_list = [loc.strip() for loc in locations_input.split(',') if loc.strip()]
 
+    num_units = len(keywords_list) * len(locations_list)
+
     # --- Ask for parallel process count ---
     max_processes = multiprocessing.cpu_count()
     print(f"\nYou have {max_processes} CPU cores.")
     print(f"It's recommended to run 2-{max_processes-1} parallel browsers.")
     
-    parallel_count = input(f"How many keywords do you want to run in parallel at a time? (Max {len(keywords_list)}): ")
+    parallel_count = input(f"How many browsers do you want to run in parallel? (Max {num_units}): ")
     try:
-        num_processes = min(int(parallel_count), len(keywords_list))
+        num_processes = max(1, min(int(parallel_count), num_units))
     except ValueError:
         print("Invalid number. Defaulting to 1.")
         num_processes = 1
 
-    print(f"\nStarting {num_processes} parallel process(es) for {len(keywords_list)} keyword(s)...")
-    
     if not keywords_list or not locations_list:
         print("No keywords or locations entered. Exiting.")
     else:
-        # --- Create a partial function to pass the constant 'locations_list' ---
-        task_with_locations = partial(process_keyword_task, locations_list=locations_list)
-        
-        # --- Run the pool ---
         try:
             # Set start method to 'spawn' for stability, especially on Windows/macOS
             multiprocessing.set_start_method('spawn', force=True) 
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                # 'map' will run the function for each item in 'keywords_list'
-                results = pool.map(task_with_locations, keywords_list)
-            
-            total_added_count = sum(results)
+
+            # Geocode every location once here instead of once per process
+            countries = {location: get_country_for_location(location) for location in locations_list}
+
+            print("Connecting to Google Sheets...")
+            spreadsheet = open_spreadsheet()
+            all_worksheet_titles = [ws.title for ws in spreadsheet.worksheets()]
+            titles, key_caches = {}, {}
+            for keyword in keywords_list:
+                worksheet, key_cache = prepare_worksheet(spreadsheet, keyword, all_worksheet_titles)
+                titles[keyword] = worksheet.title
+                key_caches[worksheet.title] = key_cache
+
+            history = load_unit_history()
+            units = plan_units(keywords_list, locations_list, history)
+            print(f"\nStarting {num_processes} parallel process(es) for {num_units} (keyword, location) unit(s)...")
+
+            with multiprocessing.Manager() as manager:
+                shared_keys = manager.dict({(title, *key): True for title, cache in key_caches.items() for key in cache.keys})
+                unit_queue = multiprocessing.Queue()
+                results = multiprocessing.Queue()
+                for unit in units:
+                    unit_queue.put(unit)
+                for _ in range(num_processes):
+                    unit_queue.put(None)
+
+                workers = [
+                    multiprocessing.Process(target=unit_worker, args=(unit_queue, results, shared_keys, countries, titles), name=f"worker-{i + 1}")
+                    for i in range(num_processes)
+                ]
+                for worker in workers:
+                    worker.start()
+
+                total_added_count, units_done, exited = 0, 0, 0
+                written_keys = {} # worksheet title -> keys of rows appended this session
+                while exited < len(workers):
+                    try:
+                        kind, *message = results.get(timeout=5)
+                    except queue.Empty:
+                        if not any(worker.is_alive() for worker in workers):
+                            break
+                        continue
+                    if kind == "exit":
+                        exited += 1
+                        continue
+                    if kind == "written":
+                        title, keys = message
+                        written_keys.setdefault(title, set()).update(keys)
+                        continue
+                    keyword, location, added, links = message
+                    units_done += 1
+                    total_added_count += added
+                    if links is not None:
+                        history[unit_key(keyword, location)] = links
+                    print(f"--- [{keyword}] Finished '{location}'. Added {added}. ({units_done}/{num_units} units done) ---")
+
+                for worker in workers:
+                    worker.join()
+
+                # Keys of rows written this session go into the local caches for the next run; rows
+                # that ended up in the fallback CSV stay out so the next run scrapes them again
+                for title, keys in written_keys.items():
+                    key_caches[title].keys.update(keys)
+
+            for key_cache in key_caches.values():
+                key_cache.save()
+            save_unit_history(history)
+
             print("\n\n--- All keywords and locations processed. ---")
             print(f"✅ Total new businesses added in this session: {total_added_count}")
 
+        except FileNotFoundError:
+            print("⛔ ERROR: 'service_account.json' not found. Can't start.")
         except Exception as e:
-            print(f"⛔ An main processing error occurred: {e}")
\ No newline at end of file
+            print(f"⛔ An main processing error occurred: {e}")
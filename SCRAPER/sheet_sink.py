@@ -0,0 +1,211 @@
+import os
+import csv
+import json
+import time
+import atexit
+import random
+import threading
+from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1
+
+# Buffered Google Sheets writes for the CLI. Rows are queued with add() and written by a
+# background thread with one append_rows call per batch, so scraping never waits on the
+# Sheets API. Quota errors (429) and transient 5xx are retried with truncated exponential
+# backoff; rows that still cannot be written go to SHEET_FALLBACK_CSV instead of being lost.
+SHEET_BATCH_SIZE = int(os.getenv("SHEET_BATCH_SIZE", "25"))
+SHEET_FLUSH_INTERVAL = float(os.getenv("SHEET_FLUSH_INTERVAL", "15")) # seconds a row may wait in the buffer
+SHEET_MAX_RETRIES = int(os.getenv("SHEET_MAX_RETRIES", "7"))
+SHEET_MAX_BACKOFF = 64.0
+SHEET_CACHE_DIR = os.getenv("SHEET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sheet_cache"))
+SHEET_FALLBACK_CSV = os.getenv("SHEET_FALLBACK_CSV", os.path.join(os.path.dirname(os.path.abspath(__file__)), "unsaved_rows.csv"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "code", None)
+
+
+def with_backoff(call, stats=None, max_retries=SHEET_MAX_RETRIES):
+    """Run a Sheets API call, retrying quota and server errors with 1, 2, 4... s (+ jitter) waits."""
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except APIError as e:
+            if _status(e) not in RETRY_STATUSES or attempt == max_retries:
+                raise
+            delay = min(2 ** attempt + random.uniform(0, 1), SHEET_MAX_BACKOFF)
+            if stats is not None:
+                stats["retries"] += 1
+                stats["backoff_seconds"] += delay
+            time.sleep(delay)
+
+
+def row_key(row):
+    """(NAME, ADDRESS) of a row as the CLI writes it."""
+    return (row[0], row[1])
+
+
+class SheetKeyCache:
+    """
+    (NAME, ADDRESS) keys of one worksheet, kept in a local JSON file between runs.
+    Only the NAME and ADDRESS columns are read, and only the rows added since the
+    last sync; if the last synced row no longer matches (rows deleted or sorted
+    in the sheet) the two columns are read again from the top.
+    """
+
+    def __init__(self, worksheet, cache_dir=SHEET_CACHE_DIR):
+        self.worksheet = worksheet
+        self.path = os.path.join(cache_dir, f"{worksheet.spreadsheet.id}_{worksheet.id}.json")
+        self.keys = set()
+        self.rows_synced = 1 # header row
+        self.anchor = None # key in row rows_synced, to detect edits
+
+    def _load_file(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.keys = {tuple(key) for key in data["keys"]}
+            self.rows_synced = data["rows_synced"]
+            self.anchor = tuple(data["anchor"]) if data.get("anchor") else None
+        except (OSError, ValueError, KeyError):
+            self.keys, self.rows_synced, self.anchor = set(), 1, None
+
+    def _read(self, headers, first_row):
+        name_col = rowcol_to_a1(1, headers.index("NAME") + 1)[:-1]
+        address_col = rowcol_to_a1(1, headers.index("ADDRESS") + 1)[:-1]
+        # One request for both columns, open-ended to the last row
+        names, addresses = with_backoff(lambda: self.worksheet.batch_get([
+            f"{name_col}{first_row}:{name_col}",
+            f"{address_col}{first_row}:{address_col}",
+        ]))
+        length = max(len(names), len(addresses))
+        cell = lambda column, i: column[i][0] if i < len(column) and column[i] else ""
+        return [(cell(names, i), cell(addresses, i)) for i in range(length)]
+
+    def sync(self, headers):
+        """Bring the key set up to date with the sheet. Returns the number of rows read."""
+        if "NAME" not in headers or "ADDRESS" not in headers:
+            return 0
+        self._load_file()
+        if self.rows_synced > 1 and self.anchor:
+            rows = self._read(headers, self.rows_synced)
+            if rows and rows[0] == self.anchor:
+                self._add_rows(rows[1:])
+                self.save()
+                return len(rows) - 1
+        self.keys, self.rows_synced, self.anchor = set(), 1, None
+        rows = self._read(headers, 2)
+        self._add_rows(rows)
+        self.save()
+        return len(rows)
+
+    def _add_rows(self, rows):
+        for key in rows:
+            if key[0] or key[1]:
+                self.keys.add(key)
+        if rows:
+            self.rows_synced += len(rows)
+            self.anchor = rows[-1]
+
+    def save(self):
+        # Keys of rows this run appended are added by SheetSink once their batch is written; the
+        # next sync reads those rows again past rows_synced, which only re-adds keys we have
+        keys = list(self.keys) # one atomic copy; the sink thread keeps adding keys
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"keys": sorted(keys), "rows_synced": self.rows_synced, "anchor": self.anchor}, f)
+        os.replace(tmp, self.path)
+
+
+class SheetSink:
+    """Buffered appender for one worksheet. add() never blocks on the network."""
+
+    def __init__(self, worksheet, batch_size=SHEET_BATCH_SIZE, flush_interval=SHEET_FLUSH_INTERVAL, key_cache=None,
+                 on_written=None, on_unsaved=None):
+        self.worksheet = worksheet
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.key_cache = key_cache
+        # Called with the keys of each batch that was appended / that went to the fallback CSV
+        self.on_written = on_written
+        self.on_unsaved = on_unsaved
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+        self.stats = {"rows_written": 0, "api_calls": 0, "retries": 0, "backoff_seconds": 0.0, "rows_unsaved": 0}
+        self._thread = threading.Thread(target=self._flush_loop, name="sheet-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(min(self.flush_interval, 1.0))
+            self._wake.clear()
+            with self._lock:
+                due = self._buffer and (len(self._buffer) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval)
+            if due:
+                self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer, self._oldest = self._buffer, [], None
+            if not rows:
+                return 0
+            try:
+                with_backoff(lambda: self._append(rows), self.stats)
+            except Exception as e:
+                print(f"⛔ Could not write {len(rows)} rows to '{self.worksheet.title}' ({type(e).__name__}); saved them to {SHEET_FALLBACK_CSV}")
+                self._save_fallback(rows)
+                keys = [row_key(row) for row in rows]
+                if self.key_cache:
+                    # Not in the sheet, so the next run must not skip them
+                    self.key_cache.keys.difference_update(keys)
+                if self.on_unsaved:
+                    self.on_unsaved(keys)
+                return 0
+            self.stats["rows_written"] += len(rows)
+            keys = [row_key(row) for row in rows]
+            if self.key_cache:
+                self.key_cache.keys.update(keys)
+                self.key_cache.save()
+            if self.on_written:
+                self.on_written(keys)
+            return len(rows)
+
+    def _append(self, rows):
+        self.stats["api_calls"] += 1
+        self.worksheet.append_rows(rows, value_input_option="USER_ENTERED")
+
+    def _save_fallback(self, rows):
+        self.stats["rows_unsaved"] += len(rows)
+        with open(SHEET_FALLBACK_CSV, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for row in rows:
+                writer.writerow([self.worksheet.title, *row])
+
+    def close(self):
+        """Stop the flush thread and write whatever is still buffered. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import threading
+from instrumentation import count_error
+
+# Browser profiles shared by the API engine and the SCRAPER CLI (Selenium only, no DB imports).
+#   standard  what we always ran: full page loads with every resource
+#   lean      opt-in: images, media, fonts, map tiles and trackers are blocked over CDP,
+#             pages return at DOMContentLoaded ("eager") and unused Chrome features are off
+# BROWSER_METRICS=1 (set by the benchmark) adds Chrome's performance log to either profile for
+# bytes per page; page-load times are always recorded. Off by default: the log costs CPU and memory.
+BROWSER_PROFILE = os.getenv("BROWSER_PROFILE", "standard")
+BROWSER_METRICS = os.getenv("BROWSER_METRICS", "0") == "1"
+
+BLOCKED_URL_PATTERNS = [
+    # images
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp", "*.avif",
+    "*googleusercontent.com/p/*", "*streetviewpixels-pa.googleapis.com*",
+    # fonts and media
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm", "*.mp3",
+    "*fonts.gstatic.com*",
+    # map tiles (raster and vector); the results feed and place panel do not need them
+    "*/maps/vt*", "*/maps/rpc/vt*", "*/kh/v=*", "*khms*.google.com*",
+    # analytics and ads
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*hotjar.com*",
+]
+
+LEAN_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+]
+
+
+def apply_profile(options, profile=None):
+    """Add the profile's settings to a ChromeOptions before the browser starts."""
+    profile = profile or BROWSER_PROFILE
+    if profile == "lean":
+        options.page_load_strategy = "eager"
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+        })
+    if BROWSER_METRICS:
+        # Network events from the performance log give us bytes per page
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def enable_blocking(driver, profile=None):
+    """CDP URL blocking for the current tab. Call again after opening a new tab."""
+    if (profile or BROWSER_PROFILE) != "lean":
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        count_error("url_blocking", e)
+
+
+def drain_network_log(driver):
+    """(bytes received, requests finished, requests blocked) since the last drain."""
+    if not BROWSER_METRICS:
+        return 0, 0, 0
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        count_error("performance_log", e)
+        return 0, 0, 0
+    received = finished = blocked = 0
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method = message.get("method")
+        if method == "Network.loadingFinished":
+            finished += 1
+            received += message["params"].get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and message["params"].get("blockedReason"):
+            blocked += 1
+    return int(received), finished, blocked
+
+
+class PageMetrics:
+    """Running totals for one profile: pages, bytes, blocked requests and load times."""
+
+    def __init__(self, profile=None, timings=None):
+        self.profile = profile or BROWSER_PROFILE
+        self.timings = timings # optional StageTimings, gets a page_load sample per page
+        self.pages = 0
+        self.bytes = 0
+        self.requests = 0
+        self.blocked = 0
+        self.load_seconds = 0.0
+        self.max_load_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def timed_get(self, driver, url):
+        """driver.get(url), recording its load time and the bytes it pulled in."""
+        start = time.monotonic()
+        try:
+            driver.get(url)
+        finally:
+            self.record(driver, time.monotonic() - start)
+
+    def record(self, driver, elapsed):
+        if self.timings is not None:
+            self.timings.record("page_load", elapsed)
+        self.add_transfer(driver)
+        with self._lock:
+            self.pages += 1
+            self.load_seconds += elapsed
+            self.max_load_seconds = max(self.max_load_seconds, elapsed)
+
+    def add_transfer(self, driver):
+        """Count traffic that is not a page load, e.g. the XHRs fired while scrolling the feed."""
+        received, finished, blocked = drain_network_log(driver)
+        with self._lock:
+            self.bytes += received
+            self.requests += finished
+            self.blocked += blocked
+
+    def report(self):
+        """Transfer figures come from the performance log and are None (not measured) without BROWSER_METRICS=1."""
+        with self._lock:
+            pages = self.pages or 1
+            measured = lambda value: value if BROWSER_METRICS else None
+            return {
+                "profile": self.profile,
+                "pages": self.pages,
+                "mb_transferred": measured(round(self.bytes / (1024 * 1024), 2)),
+                "kb_per_page": measured(round(self.bytes / 1024 / pages, 1)),
+                "requests": measured(self.requests),
+                "blocked_requests": measured(self.blocked),
+                "avg_load_ms": round(self.load_seconds * 1000 / pages, 1),
+                "max_load_ms": round(self.max_load_seconds * 1000, 1),
+            }
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+
+# Per-task progress checkpoints in the task_checkpoints collection, so a task
+# interrupted by a crash, restart or cancel can be resumed where it stopped:
+#   request    the scrape arguments, to re-run the task from POST /scrape/{id}/resume
+#   links      {query_idx: every place link collected for that (keyword, location)}
+#   processed  links fully handled: visited with no lead, skipped, or their lead is in Mongo
+#   done       query indexes whose links are all processed
+# A link that produced a lead only counts as processed once the writer has stored
+# the lead, so a resume never skips a lead that was still in the email/write pipeline.
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "10")) # processed links between writes
+
+
+class TaskCheckpoint:
+    def __init__(self, collection, task_id, every=CHECKPOINT_EVERY):
+        self.collection = collection
+        self.task_id = task_id
+        self.every = max(1, every)
+        self.links = {}
+        self.processed = set()
+        self.done = set()
+        self.leads_found = 0
+        self._unsaved = []
+        self._new_leads = 0
+        self._finished = set()
+        self._pending = {} # dedup_key -> link, for leads not written yet
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, collection, task_id, request):
+        """Load the task's checkpoint, or start one that remembers `request`."""
+        checkpoint = cls(collection, task_id)
+        doc = collection.find_one({"_id": task_id})
+        if doc:
+            checkpoint.links = {int(idx): links for idx, links in doc.get("links", {}).items()}
+            checkpoint.processed = set(doc.get("processed", []))
+            checkpoint.done = set(doc.get("done", []))
+            checkpoint.leads_found = doc.get("leads_found", 0)
+        else:
+            collection.update_one(
+                {"_id": task_id},
+                {"$setOnInsert": {"request": request, "created_at": time.time()}, "$set": {"updated_at": time.time()}},
+                upsert=True,
+            )
+        return checkpoint
+
+    @property
+    def resumed(self):
+        return bool(self.links or self.done)
+
+    def links_for(self, query_idx):
+        """Links still to handle for a query that got past scrolling, or None if it has to start over."""
+        with self._lock:
+            links = self.links.get(query_idx)
+            return None if links is None else [link for link in links if link not in self.processed]
+
+    def set_links(self, query_idx, links):
+        with self._lock:
+            self.links[query_idx] = list(links)
+        self.collection.update_one(
+            {"_id": self.task_id},
+            {"$set": {f"links.{query_idx}": list(links), "updated_at": time.time()}},
+        )
+
+    def link_done(self, link):
+        with self._lock:
+            self._mark(link)
+            due = len(self._unsaved) >= self.every
+        if due:
+            self.flush()
+
+    def lead_pending(self, dedup_key, link):
+        with self._lock:
+            self._pending[dedup_key] = link
+
+    def leads_flushed(self, written, failed):
+        # Links whose lead failed to write stay unprocessed and are visited again on resume
+        with self._lock:
+            for lead in written:
+                link = self._pending.pop(lead.get("dedup_key"), None)
+                if link:
+                    self._mark(link)
+            for lead in failed:
+                self._pending.pop(lead.get("dedup_key"), None)
+            self._new_leads += len(written)
+        self.flush()
+
+    def query_finished(self, query_idx):
+        with self._lock:
+            self._finished.add(query_idx)
+        self.flush()
+
+    def _mark(self, link):
+        if link not in self.processed:
+            self.processed.add(link)
+            self._unsaved.append(link)
+
+    def flush(self):
+        with self._lock:
+            links, self._unsaved = self._unsaved, []
+            new_leads, self._new_leads = self._new_leads, 0
+            done = [
+                idx for idx in self._finished - self.done
+                if all(link in self.processed for link in self.links.get(idx, []))
+            ]
+            self.done.update(done)
+            self.leads_found += new_leads
+        if not links and not done and not new_leads:
+            return
+        update = {"$set": {"updated_at": time.time()}, "$inc": {"leads_found": new_leads}}
+        add = {}
+        if links:
+            add["processed"] = {"$each": links}
+        if done:
+            add["done"] = {"$each": done}
+        if add:
+            update["$addToSet"] = add
+        self.collection.update_one({"_id": self.task_id}, update)
+
+    def delete(self):
+        self.collection.delete_one({"_id": self.task_id})
+
+
+def load_checkpoint(collection, task_id):
+    return collection.find_one({"_id": task_id}, {"request": 1, "leads_found": 1, "done": 1})
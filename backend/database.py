@@ -1,6 +1,5 @@
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,17 +7,77 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "maps_scraper")
 
+class _Lazy:
+    """Stands in for a client or database and builds it on first use, so importing this module stays cheap."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __getitem__(self, name):
+        return self._get()[name]
+
+
+def _motor_client():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(MONGODB_URI)
+
+def _pymongo_client():
+    from pymongo import MongoClient
+    return MongoClient(MONGODB_URI)
+
 # Async client for FastAPI
-client = AsyncIOMotorClient(MONGODB_URI)
-db = client[DATABASE_NAME]
+client = _Lazy(_motor_client)
+db = _Lazy(lambda: client[DATABASE_NAME])
 
 # Sync client for Background Workers
-sync_client = MongoClient(MONGODB_URI)
-db_sync = sync_client[DATABASE_NAME]
+sync_client = _Lazy(_pymongo_client)
+db_sync = _Lazy(lambda: sync_client[DATABASE_NAME])
 
 async def get_database():
     return db
 
+# (keys, options) for every index the API and the scraper rely on
+LEAD_INDEXES = [
+    # Unique on the normalized (name, address) key; partial so pre-dedup leads without the field don't collide
+    ("dedup_key", {"unique": True, "name": "dedup_key_unique", "partialFilterExpression": {"dedup_key": {"$exists": True}}}),
+    ("place_id", {"name": "place_id", "sparse": True}),
+    # Keyset pagination on /leads/all: newest first, _id breaks timestamp ties
+    ([("timestamp", -1), ("_id", -1)], {"name": "timestamp_id"}),
+    ([("keyword", 1), ("timestamp", -1), ("_id", -1)], {"name": "keyword_timestamp_id"}),
+    ([("task_id", 1), ("timestamp", -1), ("_id", -1)], {"name": "task_timestamp_id"}),
+    # Stored leads reused by later tasks from the place cache (see place_cache.py)
+    ([("task_ids", 1), ("timestamp", -1), ("_id", -1)], {"name": "task_ids_timestamp_id"}),
+    ([("city", 1), ("timestamp", -1), ("_id", -1)], {"name": "city_timestamp_id"}),
+    # Prefix search: multikey on precomputed edge n-grams (see search_index.py)
+    ([("search_tokens", 1), ("timestamp", -1), ("_id", -1)], {"name": "search_tokens_timestamp_id"}),
+    # Startup backfill finds leads tokenized by an older SEARCH_VERSION
+    ("search_v", {"name": "search_v"}),
+]
+
+async def ensure_indexes():
+    for keys, options in LEAD_INDEXES:
+        try:
+            await db.leads.create_index(keys, **options)
+        except Exception as e:
+            print(f"❌ Could not create lead index {options.get('name')}: {e}")
+    try:
+        # forget_deleted clears the place cache by lead_id
+        await db.place_cache.create_index("lead_id", name="lead_id")
+    except Exception as e:
+        print(f"❌ Could not create place cache index: {e}")
+
 async def test_connection():
     try:
         await client.admin.command('ping')
@@ -0,0 +1,168 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from urllib.parse import unquote
+from text_norm import fold, clean
+
+# Cross-task dedup: a unique (partial) index on leads.dedup_key is the source of truth,
+# a fixed-size Bloom filter in front of it answers "definitely new" without a DB round trip.
+DEDUP_BLOOM_CAPACITY = int(os.getenv("DEDUP_BLOOM_CAPACITY", "5000000"))
+DEDUP_BLOOM_ERROR_RATE = float(os.getenv("DEDUP_BLOOM_ERROR_RATE", "0.001"))
+
+PLACE_ID_PATTERNS = (
+    re.compile(r"!1s(0x[0-9a-f]+:0x[0-9a-f]+)", re.IGNORECASE),
+    re.compile(r"!19s(ChIJ[\w-]+)"),
+)
+
+
+def _normalize(text):
+    # Names in any script keep their letters; only punctuation and spacing are ignored
+    return " ".join(clean(fold(text)).split())
+
+
+def make_dedup_key(name, address):
+    """Normalized (name, address) key, e.g. 'Café  Roma!' + 'MG Road,' -> 'cafe roma|mg road', 'Кафе Пушкин' -> 'кафе пушкин|'."""
+    return f"{_normalize(name)}|{_normalize(address)}"
+
+
+def parse_place_id(href):
+    """Pull the stable Maps place id out of a /maps/place/ link, or None."""
+    if not href:
+        return None
+    href = unquote(href)
+    for pattern in PLACE_ID_PATTERNS:
+        match = pattern.search(href)
+        if match:
+            return match.group(1)
+    return None
+
+
+class BloomFilter:
+    """Plain bytearray Bloom filter; memory is fixed by capacity and error rate."""
+
+    def __init__(self, capacity=DEDUP_BLOOM_CAPACITY, error_rate=DEDUP_BLOOM_ERROR_RATE):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+
+class DedupIndex:
+    """
+    Process-wide "have we stored this business before?" check.
+    Bloom filter says no -> definitely new (no DB call). Bloom says maybe ->
+    confirm against the indexed leads collection, so false positives never drop a lead.
+    """
+
+    def __init__(self, collection, capacity=DEDUP_BLOOM_CAPACITY, error_rate=DEDUP_BLOOM_ERROR_RATE):
+        self.collection = collection
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.warmed = threading.Event()
+
+    def warm(self):
+        """Load every stored key into the Bloom filter. Older leads without dedup_key are keyed on the fly."""
+        loaded = 0
+        cursor = self.collection.find({"duplicate_of": {"$exists": False}}, {"dedup_key": 1, "place_id": 1, "name": 1, "address": 1}).batch_size(5000)
+        for doc in cursor:
+            self.add(doc.get("dedup_key") or make_dedup_key(doc.get("name"), doc.get("address")), doc.get("place_id"))
+            loaded += 1
+        self.warmed.set()
+        return loaded
+
+    def add(self, dedup_key=None, place_id=None):
+        if dedup_key:
+            self.bloom.add("k:" + dedup_key)
+        if place_id:
+            self.bloom.add("p:" + place_id)
+
+    def is_known_place(self, place_id):
+        if not place_id or "p:" + place_id not in self.bloom:
+            return False
+        return self.collection.find_one({"place_id": place_id}, {"_id": 1}) is not None
+
+    def is_known(self, dedup_key):
+        if "k:" + dedup_key not in self.bloom:
+            return False
+        return self.collection.find_one({"dedup_key": dedup_key}, {"_id": 1}) is not None
+
+
+def backfill_dedup_keys(collection, batch_size=5000):
+    """
+    Key leads stored before dedup_key existed, or under an older normalization. Needs the
+    unique index (database.ensure_indexes) in place: when stored leads share a key the
+    oldest keeps it and the others get duplicate_of instead, which leaves them outside the
+    partial index. Nothing is deleted. Returns (rekeyed, duplicates). Safe to re-run.
+    """
+    from pymongo.errors import DuplicateKeyError
+    rekeyed = duplicates = 0
+    cursor = collection.find({"duplicate_of": {"$exists": False}}, {"name": 1, "address": 1, "dedup_key": 1}).sort("_id", 1).batch_size(batch_size)
+    for doc in cursor:
+        key = make_dedup_key(doc.get("name"), doc.get("address"))
+        if doc.get("dedup_key") == key:
+            continue
+        holder = collection.find_one({"dedup_key": key}, {"_id": 1})
+        if holder is None:
+            try:
+                collection.update_one({"_id": doc["_id"]}, {"$set": {"dedup_key": key}})
+                rekeyed += 1
+                continue
+            except DuplicateKeyError:
+                # A scraper stored the same business in the meantime
+                holder = collection.find_one({"dedup_key": key}, {"_id": 1})
+                if holder is None:
+                    continue
+        collection.update_one({"_id": doc["_id"]}, {"$set": {"duplicate_of": holder["_id"]}, "$unset": {"dedup_key": ""}})
+        duplicates += 1
+    return rekeyed, duplicates
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            from database import db_sync
+            _index = DedupIndex(db_sync.leads)
+        return _index
+
+
+def warm_dedup_index(backfill=False):
+    if backfill:
+        try:
+            from database import db_sync
+            rekeyed, duplicates = backfill_dedup_keys(db_sync.leads)
+            if rekeyed or duplicates:
+                print(f"✅ Dedup keys backfilled on {rekeyed} leads ({duplicates} stored duplicates marked)")
+        except Exception as e:
+            print(f"❌ Could not backfill dedup keys: {e}")
+    try:
+        count = get_dedup_index().warm()
+        print(f"✅ Dedup index warmed with {count} leads")
+    except Exception as e:
+        print(f"❌ Could not warm dedup index: {e}")
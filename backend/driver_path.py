@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+
+# Where chromedriver lives, resolved once per process and remembered on disk, so a cold
+# start does not repeat webdriver_manager's version check and download on every query.
+#   CHROMEDRIVER_PATH   pinned binary (e.g. baked into the image); nothing is looked up
+#   DRIVER_OFFLINE=1    never touch the network: the pinned path or the last resolved one
+# Otherwise the path remembered in DRIVER_PATH_CACHE is reused for DRIVER_PATH_TTL seconds,
+# then webdriver_manager is asked again (Chrome updates itself, the driver has to follow).
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "")
+DRIVER_OFFLINE = os.getenv("DRIVER_OFFLINE", "0") == "1"
+DRIVER_PATH_CACHE = os.getenv("DRIVER_PATH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "maps-scraper", "chromedriver-path"))
+DRIVER_PATH_TTL = int(os.getenv("DRIVER_PATH_TTL", str(24 * 3600)))
+
+_resolved = None
+_lock = threading.Lock()
+
+
+def _cached_path(max_age=None):
+    try:
+        with open(DRIVER_PATH_CACHE) as f:
+            path = f.read().strip()
+        age = time.time() - os.path.getmtime(DRIVER_PATH_CACHE)
+    except OSError:
+        return None
+    if not path or not os.path.exists(path) or (max_age is not None and age > max_age):
+        return None
+    return path
+
+
+def _remember(path):
+    try:
+        os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+        with open(DRIVER_PATH_CACHE, "w") as f:
+            f.write(path)
+    except OSError:
+        pass
+
+
+def _install():
+    # Imported here so processes that never start a browser never load webdriver_manager
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def resolve_driver_path(refresh=False):
+    """
+    chromedriver path for this process. refresh=True skips the remembered path, e.g. after
+    Chrome refused to start with it because it was updated in the meantime.
+    """
+    global _resolved
+    with _lock:
+        if CHROMEDRIVER_PATH:
+            return CHROMEDRIVER_PATH
+        if _resolved and not refresh:
+            return _resolved
+        if DRIVER_OFFLINE:
+            path = _cached_path()
+            if not path:
+                raise RuntimeError("DRIVER_OFFLINE=1 but no chromedriver is pinned (CHROMEDRIVER_PATH) or cached yet")
+        else:
+            path = None if refresh else _cached_path(DRIVER_PATH_TTL)
+            if path is None:
+                try:
+                    path = _install()
+                except Exception:
+                    # No network: the last driver we had is better than none
+                    path = _cached_path()
+                    if not path:
+                        raise
+                else:
+                    _remember(path)
+        _resolved = path
+        return path
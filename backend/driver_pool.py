@@ -0,0 +1,169 @@
+import os
+import queue
+import atexit
+import threading
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import SessionNotCreatedException
+from driver_path import resolve_driver_path
+from browser_profile import BROWSER_PROFILE, apply_profile, enable_blocking, drain_network_log
+from instrumentation import count_error, span
+
+# Process-wide pool of warm headless Chrome instances.
+# Size and recycling are tunable per deployment (Render free plan: keep it small).
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", "25"))
+DRIVER_CHECKOUT_TIMEOUT = float(os.getenv("DRIVER_CHECKOUT_TIMEOUT", "300"))
+
+
+def build_chrome_options(profile=BROWSER_PROFILE):
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1280,720')
+    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+    options.add_argument('--log-level=3')
+    return apply_profile(options, profile)
+
+
+class PooledDriver:
+    """A WebDriver plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Fixed-size pool of Chrome drivers. Drivers are started lazily up to `size`,
+    handed out one query at a time, reset between uses and replaced after
+    `max_uses` checkouts or as soon as they fail a health check.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES, profile=BROWSER_PROFILE):
+        self.size = max(1, size)
+        self.profile = profile
+        self.max_uses = max(1, max_uses)
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used (warmest) driver in play
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _start(self):
+        with span("driver_startup"):
+            try:
+                # Resolved once per process (see driver_path.py), not per browser
+                driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=build_chrome_options(self.profile))
+            except SessionNotCreatedException:
+                # Chrome updated under a remembered driver: look the driver up again once
+                driver = webdriver.Chrome(service=Service(resolve_driver_path(refresh=True)), options=build_chrome_options(self.profile))
+        enable_blocking(driver, self.profile)
+        return PooledDriver(driver)
+
+    def _discard(self, item):
+        try:
+            item.driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    @staticmethod
+    def is_healthy(item):
+        try:
+            item.driver.window_handles
+            item.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def reset(item):
+        """Clear cookies and extra tabs so the next query starts from a clean session."""
+        driver = item.driver
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except Exception:
+            driver.delete_all_cookies()
+        driver.get("about:blank")
+        # Leftover network events would be billed to the next checkout's first page
+        drain_network_log(driver)
+
+    def acquire(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                item = None
+                with self._lock:
+                    can_start = self._created < self.size
+                    if can_start:
+                        self._created += 1
+                if can_start:
+                    try:
+                        return self._start()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    item = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("No browser became available in the driver pool")
+
+            if self.is_healthy(item):
+                return item
+            self._discard(item)
+
+    def release(self, item):
+        item.uses += 1
+        if self._closed or item.uses >= self.max_uses:
+            self._discard(item)
+            return
+        try:
+            self.reset(item)
+        except Exception as e:
+            count_error("driver_reset", e)
+            self._discard(item)
+            return
+        self._idle.put(item)
+
+    def close_all(self):
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(item)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+def shutdown_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
@@ -0,0 +1,344 @@
+import os
+import re
+import time
+import codecs
+import sqlite3
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse, urljoin, unquote
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import count_error, span
+from rate_control import Throttled, get_rate_controller
+
+# Website fetches run here, off the browser threads, over one pooled HTTP session.
+EMAIL_MAX_CONCURRENCY = int(os.getenv("EMAIL_MAX_CONCURRENCY", "16"))
+EMAIL_PER_HOST_LIMIT = int(os.getenv("EMAIL_PER_HOST_LIMIT", "2"))
+EMAIL_FETCH_TIMEOUT = float(os.getenv("EMAIL_FETCH_TIMEOUT", "5"))
+EMAIL_MAX_BYTES = int(os.getenv("EMAIL_MAX_BYTES", str(256 * 1024))) # per page; most sites show the email well before this
+EMAIL_MAX_PAGES = int(os.getenv("EMAIL_MAX_PAGES", "3")) # homepage + up to 2 contact/about pages
+# Chains share one website across many listings, so results are cached per domain
+EMAIL_CACHE_SIZE = int(os.getenv("EMAIL_CACHE_SIZE", "20000"))
+EMAIL_CACHE_TTL = int(os.getenv("EMAIL_CACHE_TTL", str(7 * 24 * 3600)))
+EMAIL_CACHE_PATH = os.getenv("EMAIL_CACHE_PATH", "") # set to a file to persist the cache in SQLite
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+JUNK_DOMAINS = ('example.com', 'domain.com', 'sentry.io', 'wixpress.com', 'sentry-next.wixpress.com')
+# Hosts (and their subdomains) where each business has its own page: cached per page, not per host
+SHARED_HOSTS = ('facebook.com', 'instagram.com', 'linktr.ee', 'sites.google.com', 'wixsite.com', 'business.site',
+                'wordpress.com', 'blogspot.com', 'squarespace.com', 'weebly.com', 'linkedin.com', 'twitter.com',
+                'x.com', 'tiktok.com', 'youtube.com', 'google.com', 'goo.gl', 'bit.ly')
+
+# One pass over the page finds every "@"-like marker: plain @, mailto: links (%40),
+# entities (&#64;) and "name [at] site [dot] com"; the address is then read outwards from it
+_DOT = r'(?:\.|\s*[\[({]\s*dot\s*[\])}]\s*)'
+AT_RE = re.compile(r'@|%40|&#0*64;|&#x0*40;|\s*[\[({]\s*at\s*[\])}]\s*', re.I)
+DOT_RE = re.compile(_DOT, re.I)
+DOMAIN_RE = re.compile(rf'(?:[a-z0-9-]{{1,63}}{_DOT}){{1,8}}[a-z]{{2,24}}(?![a-z0-9-])', re.I)
+LOCAL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-")
+MAX_LOCAL = 64
+CONTACT_LINK_RE = re.compile(r'href=["\']([^"\'#]*(?:contact|about|kontakt|impressum|reach-us|get-in-touch)[^"\'#]*)["\']', re.I)
+SCAN_OVERLAP = 256 # chars kept between chunks so a match split across two reads is still found
+
+
+def build_session(pool_size=EMAIL_MAX_CONCURRENCY):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def find_emails(text):
+    """Valid-looking addresses in `text`, in page order."""
+    found = []
+    for at in AT_RE.finditer(text):
+        start = at.start()
+        while start > 0 and at.start() - start < MAX_LOCAL and text[start - 1] in LOCAL_CHARS:
+            start -= 1
+        while start < at.start() and not text[start].isalnum():
+            start += 1
+        domain = DOMAIN_RE.match(text, at.end())
+        if start == at.start() or not domain:
+            continue
+        email = f"{unquote(text[start:at.start()]).lower()}@{DOT_RE.sub('.', domain.group()).lower()}"
+        if email.endswith(IMAGE_SUFFIXES) or email.endswith(JUNK_DOMAINS):
+            continue
+        found.append(email)
+    return found
+
+
+def domain_key(url):
+    parsed = urlparse(url if "//" in url else "//" + url)
+    host = parsed.netloc.lower().split(":")[0]
+    host = host[4:] if host.startswith("www.") else host
+    if any(host == shared or host.endswith("." + shared) for shared in SHARED_HOSTS):
+        # facebook.com/<page>, profile.php?id=..., <user>.wixsite.com/<site>: the path and query name the business
+        path = parsed.path.rstrip("/")
+        return f"{host}{path}?{parsed.query}" if parsed.query else f"{host}{path}"
+    return host
+
+
+def scan_page(url, session=None, max_bytes=EMAIL_MAX_BYTES):
+    """
+    Stream `url` and stop at the first email or after max_bytes.
+    Returns (email or None, contact page links seen, bytes read).
+    """
+    links, read = [], 0
+    with (session or requests).get(url, headers=HEADERS, timeout=EMAIL_FETCH_TIMEOUT, verify=False, stream=True) as response:
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            raise Throttled("http_429", float(retry_after) if retry_after.isdigit() else None)
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="ignore")
+        tail = ""
+        for chunk in response.iter_content(16 * 1024):
+            read += len(chunk)
+            text = tail + decoder.decode(chunk)
+            emails = find_emails(text)
+            if emails:
+                return emails[0], links, read
+            links.extend(CONTACT_LINK_RE.findall(text))
+            if read >= max_bytes:
+                break
+            tail = text[-SCAN_OVERLAP:]
+    return None, links, read
+
+
+def find_email(url, session=None, max_pages=EMAIL_MAX_PAGES, stats=None):
+    """Homepage first, then a few same-site contact/about pages. Raises if the homepage cannot be fetched."""
+    email, links, read = scan_page(url, session)
+    pages = 1
+    if stats is not None:
+        stats["pages"] += 1
+        stats["bytes"] += read
+    host = urlparse(url).netloc
+    seen = {url}
+    for link in links:
+        if email or pages >= max_pages:
+            break
+        target = urljoin(url, link)
+        if target in seen or urlparse(target).netloc != host:
+            continue
+        seen.add(target)
+        pages += 1
+        try:
+            email, _, read = scan_page(target, session)
+        except Throttled:
+            raise
+        except Exception:
+            continue
+        if stats is not None:
+            stats["pages"] += 1
+            stats["bytes"] += read
+    return email
+
+
+def fast_extract_email(url, session=None):
+    """Ultra-fast email extraction without opening a browser tab"""
+    if not url or url == "No website": return "No email"
+    try:
+        return find_email(url, session) or "No email"
+    except Exception as e:
+        count_error("email_fetch", e)
+    return "No email"
+
+
+class EmailCache:
+    """
+    Per-domain results (including "No email") in an LRU with TTL. See domain_key for hosts shared by many businesses.
+    With `path` set, entries are also kept in SQLite so they survive restarts.
+    """
+
+    def __init__(self, max_size=EMAIL_CACHE_SIZE, ttl=EMAIL_CACHE_TTL, path=EMAIL_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS email_cache (domain TEXT PRIMARY KEY, email TEXT, stored_at REAL)")
+            self._conn.commit()
+
+    def get(self, domain):
+        with self._lock:
+            item = self._items.get(domain)
+            if item is None and self._conn is not None:
+                item = self._conn.execute("SELECT email, stored_at FROM email_cache WHERE domain = ?", (domain,)).fetchone()
+            if item is None or time.time() - item[1] >= self.ttl:
+                self._items.pop(domain, None)
+                return None
+            self._items[domain] = item
+            self._items.move_to_end(domain)
+            return item[0]
+
+    def put(self, domain, email):
+        item = (email, time.time())
+        with self._lock:
+            self._items[domain] = item
+            self._items.move_to_end(domain)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO email_cache (domain, email, stored_at) VALUES (?, ?, ?)", (domain, *item))
+                self._conn.commit()
+
+
+class KeyedLocks:
+    """Lock (or semaphore) per key that only exists while someone holds or waits on it."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._items = {} # key -> [lock, holders and waiters]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                item = self._items[key] = [self.factory(), 0]
+            item[1] += 1
+        try:
+            with item[0]:
+                yield
+        finally:
+            with self._lock:
+                item[1] -= 1
+                if not item[1]:
+                    del self._items[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class EmailEnricher:
+    """
+    Process-wide email fetcher. A shared thread pool caps global concurrency,
+    per-host semaphores keep us from hammering a single site, and every fetch
+    reuses connections from one requests.Session.
+    """
+
+    def __init__(self, max_concurrency=EMAIL_MAX_CONCURRENCY, per_host=EMAIL_PER_HOST_LIMIT):
+        self.session = build_session(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="email")
+        self._per_host = max(1, per_host)
+        self._host_slots = KeyedLocks(lambda: threading.BoundedSemaphore(self._per_host))
+        self._domain_locks = KeyedLocks(threading.Lock)
+        self._hosts_lock = threading.Lock()
+        self.cache = EmailCache()
+        self.rate = get_rate_controller("web") # per-site pacing, slows down on 429s
+        self._stats = {"cache_hits": 0, "fetches": 0, "pages": 0, "bytes": 0, "errors": 0}
+
+    def _host_slot(self, url):
+        return self._host_slots.hold(urlparse(url).netloc.lower())
+
+    def _domain_lock(self, domain):
+        return self._domain_locks.hold(domain)
+
+    def extract(self, url):
+        if not url or url == "No website":
+            return "No email"
+        domain = domain_key(url)
+        cached = self.cache.get(domain)
+        if cached is None:
+            # One fetch per domain at a time; listings of the same chain wait and then hit the cache
+            with self._domain_lock(domain):
+                cached = self.cache.get(domain)
+                if cached is None:
+                    return self._fetch(url, domain)
+        with self._hosts_lock:
+            self._stats["cache_hits"] += 1
+        return cached
+
+    def _fetch(self, url, domain):
+        page_stats = {"pages": 0, "bytes": 0}
+        try:
+            with self._host_slot(url):
+                self.rate.acquire(url)
+                email = find_email(url, self.session, stats=page_stats) or "No email"
+            self.rate.success(url)
+        except Throttled as e:
+            # Not cached either: the listing after the cool-down gets another try
+            self.rate.throttled(url, e.reason, e.retry_after)
+            count_error("email_fetch", e)
+            email, failed = "No email", True
+        except Exception as e:
+            # Network errors are not cached, the next listing retries
+            count_error("email_fetch", e)
+            email, failed = "No email", True
+        else:
+            failed = False
+            self.cache.put(domain, email)
+        with self._hosts_lock:
+            self._stats["fetches"] += 1
+            self._stats["errors"] += failed
+            self._stats["pages"] += page_stats["pages"]
+            self._stats["bytes"] += page_stats["bytes"]
+        return email
+
+    def stats(self):
+        with self._hosts_lock:
+            return dict(self._stats)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+class EmailStage:
+    """
+    Per-task pipeline stage: detail workers hand leads over with put() and move on,
+    the lead gets its email filled in here and is then passed to on_ready (which persists it).
+    """
+
+    def __init__(self, enricher, on_ready, timings=None):
+        self.enricher = enricher
+        self.on_ready = on_ready
+        self.timings = timings # StageTimings of the task, for the email_fetch stage
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _enrich(self, lead):
+        with span("email_fetch", self.timings):
+            lead["email"] = self.enricher.extract(lead.get("website"))
+        self.on_ready(lead)
+
+    def put(self, lead):
+        future = self.enricher.executor.submit(self._enrich, lead)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def join(self):
+        """Block until every lead handed to this stage has been enriched and persisted."""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            done, _ = wait(pending)
+            with self._lock:
+                self._pending.difference_update(done)
+
+
+_enricher = None
+_enricher_lock = threading.Lock()
+
+
+def get_email_enricher():
+    global _enricher
+    with _enricher_lock:
+        if _enricher is None:
+            _enricher = EmailEnricher()
+        return _enricher
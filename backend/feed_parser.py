@@ -0,0 +1,75 @@
+import re
+from bs4 import BeautifulSoup
+from dedup import parse_place_id
+
+# Bulk extraction of leads from the results feed HTML (div[role="feed"]),
+# so most businesses never need their own /maps/place/ page load.
+REQUIRED_FIELDS = ("name", "address", "phone")
+PHONE_RE = re.compile(r"^\+?[\d\s().-]{6,}$")
+HOURS_WORDS = ("open", "closed", "closes", "opens", "24 hours")
+
+
+def _card_text_parts(card):
+    parts = []
+    for row in card.select("div.W4Efsd"):
+        # Nested W4Efsd rows repeat their children's text; only read leaf rows
+        if row.select_one("div.W4Efsd"):
+            continue
+        text = row.get_text(" ", strip=True)
+        parts.append([p.strip() for p in text.split("·") if p.strip()])
+    return parts
+
+
+def _guess_address(parts):
+    # Row layout is "<category> · <address>" followed by hours/phone rows
+    for row in parts:
+        if len(row) < 2:
+            continue
+        candidate = row[1]
+        if PHONE_RE.match(candidate) or candidate.lower().startswith(HOURS_WORDS):
+            continue
+        return candidate
+    return None
+
+
+def parse_card(card):
+    anchor = card.select_one("a.hfpxzc") or card.select_one('a[href*="/maps/place/"]')
+    if not anchor or not anchor.get("href"):
+        return None
+    link = anchor["href"]
+
+    name_el = card.select_one("div.qBF1Pd") or card.select_one(".fontHeadlineSmall")
+    name = name_el.get_text(strip=True) if name_el else anchor.get("aria-label")
+
+    phone_el = card.select_one("span.UsdlK")
+    phone = phone_el.get_text(strip=True) if phone_el else None
+
+    website_el = card.select_one('a[data-value="Website"]') or card.select_one("a.lcr4fd")
+    website = website_el.get("href") if website_el else None
+
+    return {
+        "link": link,
+        "place_id": parse_place_id(link),
+        "name": name or None,
+        "address": _guess_address(_card_text_parts(card)),
+        "phone": phone,
+        "website": website,
+    }
+
+
+def parse_feed_cards(feed_html):
+    """Every result card in the feed, in feed order, one dict per unique link."""
+    soup = BeautifulSoup(feed_html or "", "html.parser")
+    cards, seen = [], set()
+    for anchor in soup.select("a.hfpxzc, a[href*='/maps/place/']"):
+        # The card is the anchor's nearest ancestor that also holds the text rows
+        card = anchor.find_parent("div", class_="Nv2PK") or anchor.parent
+        parsed = parse_card(card)
+        if parsed and parsed["link"] not in seen:
+            seen.add(parsed["link"])
+            cards.append(parsed)
+    return cards
+
+
+def is_complete(card):
+    return all(card.get(field) for field in REQUIRED_FIELDS)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+from text_norm import fold, clean
+from instrumentation import count_error
+
+# Location -> (country, country_code) resolution shared by the API and the SCRAPER CLI.
+# Lookup order: persistent SQLite cache -> bundled offline table -> Nominatim.
+# Kept free of DB/Selenium imports so SCRAPER/scraper.py can import it directly.
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".geocode_cache.sqlite3"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+OFFLINE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "common_cities.json")
+
+# source is one of "cache", "offline", "network" or "default"; cache_hit is True when no network call was made
+GeoResolution = namedtuple("GeoResolution", ["country", "country_code", "cache_hit", "source"])
+
+
+def normalize_location(location):
+    """'  New   Delhi, INDIA ' -> 'new delhi, india' (accents and stray punctuation dropped)."""
+    # Any script: 'Москва' must not share the cache entry of every other non-Latin city
+    parts = [" ".join(clean(part).split()) for part in fold(location).split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+def _load_offline_table(path=OFFLINE_TABLE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    countries = {k: tuple(v) for k, v in data.get("countries", {}).items()}
+    cities = {k: tuple(v) for k, v in data.get("cities", {}).items()}
+    return countries, cities
+
+
+class GeoCache:
+    """
+    SQLite-backed cache with TTL, fronted by the bundled city/country table.
+    Safe to share between threads; several processes can point at the same file.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL, user_agent="map_scrape_v2_fast", timeout=5):
+        self.path = path
+        self.ttl = ttl
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.countries, self.cities = _load_offline_table()
+        self.hits = 0
+        self.misses = 0
+        self._geolocator = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode (location TEXT PRIMARY KEY, country TEXT, country_code TEXT, resolved_at REAL)"
+        )
+        self._conn.commit()
+
+    def lookup_offline(self, key):
+        if key in self.cities:
+            return self.cities[key]
+        parts = key.split(", ")
+        # "<anything>, <known country>" is unambiguous without a network call
+        if len(parts) > 1 and parts[-1] in self.countries:
+            return self.countries[parts[-1]]
+        if key in self.countries:
+            return self.countries[key]
+        return None
+
+    def _get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT country, country_code, resolved_at FROM geocode WHERE location = ?", (key,)
+            ).fetchone()
+        if row and time.time() - row[2] < self.ttl:
+            return row[0], row[1]
+        return None
+
+    def _put(self, key, country, country_code):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (location, country, country_code, resolved_at) VALUES (?, ?, ?, ?)",
+                (key, country, country_code, time.time()),
+            )
+            self._conn.commit()
+
+    def _geocode(self, location):
+        from geopy.geocoders import Nominatim
+        if self._geolocator is None:
+            self._geolocator = Nominatim(user_agent=self.user_agent)
+        location_data = self._geolocator.geocode(location, addressdetails=True, language="en", timeout=self.timeout)
+        if location_data and 'address' in location_data.raw and 'country' in location_data.raw['address']:
+            return location_data.raw['address']['country'], location_data.raw['address']['country_code'].upper()
+        return None
+
+    def resolve(self, location, default=("India", "IN")):
+        key = normalize_location(location)
+
+        cached = self._get(key)
+        if cached:
+            self._count(hit=True)
+            return GeoResolution(cached[0], cached[1], True, "cache")
+
+        offline = self.lookup_offline(key)
+        if offline:
+            self._count(hit=True)
+            return GeoResolution(offline[0], offline[1], True, "offline")
+
+        self._count(hit=False)
+        try:
+            found = self._geocode(location)
+        except Exception as e:
+            count_error("geocode", e)
+            found = None
+        if found:
+            self._put(key, *found)
+            return GeoResolution(found[0], found[1], False, "network")
+        # Failures are not cached so a flaky Nominatim call gets retried next time
+        return GeoResolution(default[0], default[1], False, "default")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geo_cache(**kwargs):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GeoCache(**kwargs)
+        return _cache
+
+
+def resolve_country(location, default=("India", "IN")):
+    return get_geo_cache().resolve(location, default)
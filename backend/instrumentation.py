@@ -0,0 +1,126 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Process-wide counters and stage timings, served in Prometheus text format at GET /metrics.
+# No DB or Selenium imports, so the SCRAPER CLI can use StageTimings too.
+# Stages: driver_startup, driver_checkout, page_load, scroll, phone_validation, email_fetch, mongo_insert
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRICS = {
+    "scraper_stage_seconds": ("histogram", "Time spent in each scraper stage."),
+    "scraper_leads_total": ("counter", "Leads by outcome: accepted, dropped (no valid phone) or deduped."),
+    "scraper_errors_total": ("counter", "Exceptions the scraper caught and carried on from, by category and type."),
+    "scraper_tasks_total": ("counter", "Finished scrape tasks by final status."),
+    "scraper_geocode_total": ("counter", "Location lookups by source (cache, offline, network, default) and cache hit."),
+}
+
+_lock = threading.Lock()
+_counters = {} # (metric, labels) -> value
+_histograms = {} # labels -> [bucket counts..., sum, count]
+
+
+def _labels(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def inc(metric, amount=1, **labels):
+    key = (metric, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(stage, seconds):
+    key = _labels({"stage": stage})
+    idx = bisect_left(STAGE_BUCKETS, seconds)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * len(STAGE_BUCKETS) + [0.0, 0]
+        # Buckets are stored non-cumulative and summed up in render()
+        if idx < len(STAGE_BUCKETS):
+            values[idx] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+
+def count_error(category, exc=None):
+    """Record an exception that is handled rather than raised (what used to be a bare `except: pass`)."""
+    inc("scraper_errors_total", category=category, type=type(exc).__name__ if exc is not None else "unknown")
+
+
+@contextmanager
+def span(stage, timings=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings.record(stage, elapsed)
+        else:
+            observe(stage, elapsed)
+
+
+class StageTimings:
+    """Per-task breakdown of stage timings; every sample also goes to the process-wide histogram."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        observe(stage, seconds)
+        with self._lock:
+            count, total, longest = self._stages.get(stage, (0, 0.0, 0.0))
+            self._stages[stage] = (count + 1, total + seconds, max(longest, seconds))
+
+    def span(self, stage):
+        return span(stage, self)
+
+    def report(self):
+        with self._lock:
+            stages = dict(self._stages)
+        return {
+            stage: {
+                "count": count,
+                "total_s": round(total, 2),
+                "avg_ms": round(total * 1000 / count, 1),
+                "max_ms": round(longest * 1000, 1),
+            }
+            for stage, (count, total, longest) in sorted(stages.items(), key=lambda item: -item[1][1])
+        }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def render():
+    """Everything recorded so far, in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        if kind == "histogram":
+            for labels, values in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(STAGE_BUCKETS, values):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {values[-1]}")
+        else:
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+import io
+import os
+import re
+import csv
+import json
+import unicodedata
+from urllib.parse import quote
+from datetime import datetime
+from place_cache import task_filter
+
+# Streaming lead export. Rows come off a Motor cursor in batches and are encoded
+# a chunk at a time, so memory stays flat no matter how many leads match.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+PARQUET_ROW_GROUP = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", "50000"))
+
+EXPORT_FIELDS = ["name", "address", "phone", "website", "email", "country", "city", "keyword", "task_id", "timestamp"]
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def export_query(task_id=None, keyword=None, city=None, since=None, until=None):
+    query = {}
+    if task_id:
+        query.update(task_filter(task_id))
+    if keyword:
+        query["keyword"] = keyword
+    if city:
+        query["city"] = city
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    return query
+
+
+def open_export_cursor(collection, query):
+    projection = {field: 1 for field in EXPORT_FIELDS}
+    projection["_id"] = 0
+    return collection.find(query, projection).sort([("timestamp", -1), ("_id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+
+
+async def _batches(cursor, size=EXPORT_BATCH_SIZE):
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def csv_stream(cursor):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    # BOM so Excel opens UTF-8 names and addresses correctly
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    async for batch in _batches(cursor):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_text(doc.get(field)) for field in EXPORT_FIELDS] for doc in batch)
+        yield buf.getvalue().encode("utf-8")
+
+
+async def ndjson_stream(cursor):
+    async for batch in _batches(cursor):
+        yield "".join(json.dumps(doc, default=_text, ensure_ascii=False) + "\n" for doc in batch).encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever pyarrow wrote since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def content_disposition(filename):
+    """
+    Attachment header for any filename. Starlette encodes headers as latin-1, so a keyword
+    like "café" or "кафе" goes in filename* (RFC 5987) with an ASCII fallback in filename.
+    """
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode()
+    fallback = re.sub(r"[^\w.-]+", "_", fallback, flags=re.ASCII).strip("_") or "leads"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def parquet_stream(cursor, row_group_size=PARQUET_ROW_GROUP):
+    # Optional dependency: the endpoint checks parquet_available() before streaming
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, pa.timestamp("ms") if field == "timestamp" else pa.string()) for field in EXPORT_FIELDS])
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    rows = []
+    try:
+        async for batch in _batches(cursor):
+            rows.extend(batch)
+            if len(rows) >= row_group_size:
+                writer.write_table(_table(pa, schema, rows), row_group_size=row_group_size)
+                rows = []
+                yield sink.drain()
+        if rows:
+            writer.write_table(_table(pa, schema, rows), row_group_size=row_group_size)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _table(pa, schema, rows):
+    columns = {}
+    for field in EXPORT_FIELDS:
+        if field == "timestamp":
+            columns[field] = [doc.get(field) for doc in rows]
+        else:
+            columns[field] = [None if doc.get(field) is None else str(doc.get(field)) for doc in rows]
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+STREAMS = {"csv": csv_stream, "ndjson": ndjson_stream, "parquet": parquet_stream}
@@ -0,0 +1,142 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+# Materialized counters behind /stats and /keywords, kept in the lead_stats
+# collection so the dashboard never runs count_documents({}) or distinct() on leads.
+#   _id "totals"         total leads, finished task counts, leads from finished tasks
+#   _id "kw:<keyword>"   {type: "keyword", value, count}
+#   _id "city:<city>"    {type: "city", value, count}
+#   _id "day:<Y-m-d>"    {type: "day", value, count}, for growth
+#   _id "task:<id>"      {type: "task", value, count, status}, per-task yield
+# The lead writer adds, the delete endpoints subtract.
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "10"))
+GROWTH_WINDOW_DAYS = 7
+
+DIMENSIONS = (("keyword", "kw"), ("city", "city"))
+
+
+def _day(ts):
+    return ts.strftime("%Y-%m-%d") if isinstance(ts, datetime) else None
+
+
+def lead_stat_ops(leads, sign=1):
+    """UpdateOne ops adding (sign=1) or removing (sign=-1) `leads` from the counters."""
+    counts = Counter()
+    for lead in leads:
+        for field, prefix in DIMENSIONS:
+            if lead.get(field):
+                counts[(prefix, field, lead[field])] += 1
+        day = _day(lead.get("timestamp"))
+        if day:
+            counts[("day", "day", day)] += 1
+        # Deletes leave task yield alone: it records what the task collected
+        if sign > 0 and lead.get("task_id"):
+            counts[("task", "task", lead["task_id"])] += 1
+
+    ops = [UpdateOne({"_id": "totals"}, {"$inc": {"total": sign * len(leads)}}, upsert=True)] if leads else []
+    for (prefix, kind, value), n in counts.items():
+        ops.append(UpdateOne(
+            {"_id": f"{prefix}:{value}"},
+            {"$inc": {"count": sign * n}, "$setOnInsert": {"type": kind, "value": value}},
+            upsert=True,
+        ))
+    return ops
+
+
+def task_outcome_ops(task_id, status, leads_found):
+    """Counted once per finished task, for success rate and leads per task."""
+    return [
+        UpdateOne({"_id": f"task:{task_id}"}, {"$set": {"status": status}, "$setOnInsert": {"type": "task", "value": task_id, "count": 0}}, upsert=True),
+        UpdateOne({"_id": "totals"}, {"$inc": {f"tasks_{status}": 1, "finished_task_leads": leads_found}}, upsert=True),
+    ]
+
+
+def record_leads(collection, leads, sign=1):
+    ops = lead_stat_ops(leads, sign)
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+
+def record_task_yield(collection, task_id, count=1):
+    """A stored lead picked up again by a task (place cache reuse/refresh): task yield only, totals stay."""
+    collection.update_one({"_id": f"task:{task_id}"}, {"$inc": {"count": count}, "$setOnInsert": {"type": "task", "value": task_id}}, upsert=True)
+
+
+def record_task_outcome(collection, task_id, status, leads_found):
+    collection.bulk_write(task_outcome_ops(task_id, status, leads_found), ordered=False)
+
+
+def ensure_stats_indexes(collection):
+    collection.create_index([("type", 1), ("count", 1)])
+
+
+def rebuild_stats(leads, collection):
+    """
+    Recompute keyword, city and day counters from the leads collection (one-off,
+    for databases that predate lead_stats). Task counters are kept as they are.
+    """
+    day_expr = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+    docs = []
+    for field, prefix in DIMENSIONS:
+        for row in leads.aggregate([{"$match": {field: {"$nin": [None, ""]}}}, {"$group": {"_id": f"${field}", "n": {"$sum": 1}}}], allowDiskUse=True):
+            docs.append({"_id": f"{prefix}:{row['_id']}", "type": field, "value": row["_id"], "count": row["n"]})
+    for row in leads.aggregate([{"$match": {"timestamp": {"$type": "date"}}}, {"$group": {"_id": day_expr, "n": {"$sum": 1}}}], allowDiskUse=True):
+        docs.append({"_id": f"day:{row['_id']}", "type": "day", "value": row["_id"], "count": row["n"]})
+
+    collection.delete_many({"type": {"$in": ["keyword", "city", "day"]}})
+    if docs:
+        collection.insert_many(docs, ordered=False)
+    collection.update_one({"_id": "totals"}, {"$set": {"total": leads.estimated_document_count()}}, upsert=True)
+    return len(docs)
+
+
+def ensure_stats():
+    """Startup hook: build the counters once if this database has never had them."""
+    try:
+        from database import db_sync
+        ensure_stats_indexes(db_sync.lead_stats)
+        if db_sync.lead_stats.find_one({"_id": "totals"}) is None:
+            count = rebuild_stats(db_sync.leads, db_sync.lead_stats)
+            print(f"✅ Lead stats built ({count} counters)")
+    except Exception as e:
+        print(f"❌ Could not build lead stats: {e}")
+
+
+def _percent(value):
+    return f"{round(value * 100)}%"
+
+
+def summarize(totals, locations_count, day_docs, today=None):
+    """The /stats payload from the totals doc, the city count and the recent day counters."""
+    totals = totals or {}
+    completed = totals.get("tasks_completed", 0)
+    failed = totals.get("tasks_failed", 0)
+    finished = completed + failed + totals.get("tasks_cancelled", 0)
+
+    # Leads added in the last GROWTH_WINDOW_DAYS vs the window before it
+    today = today or datetime.utcnow()
+    per_day = {doc["value"]: doc.get("count", 0) for doc in day_docs}
+    recent = sum(per_day.get(_day(today - timedelta(days=d)), 0) for d in range(GROWTH_WINDOW_DAYS))
+    previous = sum(per_day.get(_day(today - timedelta(days=d)), 0) for d in range(GROWTH_WINDOW_DAYS, 2 * GROWTH_WINDOW_DAYS))
+    growth = None
+    if previous:
+        change = (recent - previous) / previous
+        growth = ("+" if change >= 0 else "-") + _percent(abs(change))
+
+    return {
+        "total_leads": max(0, totals.get("total", 0)),
+        "locations_count": locations_count,
+        # Completed over completed + failed; cancelled tasks say nothing about the scraper
+        "success_rate": _percent(completed / (completed + failed)) if completed + failed else None,
+        "growth": growth,
+        "leads_last_7_days": recent,
+        "tasks_finished": finished,
+        "avg_leads_per_task": round(totals.get("finished_task_leads", 0) / finished, 1) if finished else None,
+    }
+
+
+def growth_since():
+    """Lowest day counter _id summarize() needs."""
+    return "day:" + _day(datetime.utcnow() - timedelta(days=2 * GROWTH_WINDOW_DAYS))
@@ -0,0 +1,178 @@
+import os
+import time
+import atexit
+import threading
+import weakref
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from instrumentation import count_error, observe
+
+# Leads are buffered and written with one unordered bulk write per batch
+# instead of one insert_one round trip per lead.
+LEAD_BATCH_SIZE = int(os.getenv("LEAD_BATCH_SIZE", "50"))
+LEAD_FLUSH_INTERVAL = float(os.getenv("LEAD_FLUSH_INTERVAL", "2.0"))
+
+_live_writers = weakref.WeakSet()
+
+
+class LeadWriter:
+    """
+    Batching sink for lead documents. Flushes when `batch_size` leads are
+    buffered or the oldest buffered lead is `flush_interval` seconds old,
+    and on close(). on_flushed(written, failed) is called after every batch
+    with the leads that made it to Mongo and the ones that did not.
+
+    With `key_field` set, each lead is upserted on that field ($setOnInsert),
+    so leads already stored by another task are counted as deduped, not written.
+    """
+
+    def __init__(self, collection, on_flushed=None, batch_size=LEAD_BATCH_SIZE, flush_interval=LEAD_FLUSH_INTERVAL, key_field=None, timings=None):
+        self.collection = collection
+        self.timings = timings # StageTimings of the task, for the mongo_insert stage
+        self.key_field = key_field
+        self.on_flushed = on_flushed
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._oldest = None
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one insert_many in flight per writer
+        self._stop = threading.Event()
+        self._closed = False
+
+        self.batches = 0
+        self.leads_written = 0
+        self.leads_failed = 0
+        self.leads_deduped = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        self._timer = threading.Thread(target=self._flush_loop, name="lead-writer", daemon=True)
+        self._timer.start()
+        _live_writers.add(self)
+
+    def add(self, lead):
+        if self._closed:
+            raise RuntimeError("LeadWriter is closed")
+        with self._buffer_lock:
+            self._buffer.append(lead)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(min(self.flush_interval, 0.5)):
+            with self._buffer_lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    count_error("lead_write", e)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer, self._oldest = self._buffer, [], None
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            if self.key_field:
+                written_idx, failed_idx = self._upsert(batch)
+            else:
+                written_idx, failed_idx = self._insert(batch)
+            elapsed = time.perf_counter() - start
+            elapsed_ms = elapsed * 1000
+            if self.timings is not None:
+                self.timings.record("mongo_insert", elapsed)
+            else:
+                observe("mongo_insert", elapsed)
+
+            written = [doc for i, doc in enumerate(batch) if i in written_idx]
+            failed = [doc for i, doc in enumerate(batch) if i in failed_idx]
+            self._record(len(batch), len(written), len(failed), elapsed_ms)
+
+        if self.on_flushed:
+            self.on_flushed(written, failed)
+        return len(written)
+
+    def _insert(self, batch):
+        failed_idx = set()
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything except the reported errors was written
+            failed_idx = {err["index"] for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            count_error("lead_write", e)
+            failed_idx = set(range(len(batch)))
+        return set(range(len(batch))) - failed_idx, failed_idx
+
+    def _upsert(self, batch):
+        ops = [UpdateOne({self.key_field: doc[self.key_field]}, {"$setOnInsert": doc}, upsert=True) for doc in batch]
+        failed_idx = set()
+        try:
+            result = self.collection.bulk_write(ops, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+            # E11000 here means a concurrent upsert won the race: a duplicate, not a failure
+            failed_idx = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+        except Exception as e:
+            count_error("lead_write", e)
+            return set(), set(range(len(batch)))
+        for idx, _id in upserted.items():
+            batch[idx]["_id"] = _id
+        return set(upserted), failed_idx
+
+    def _record(self, size, written, failed, elapsed_ms):
+        self.batches += 1
+        self.leads_written += written
+        self.leads_failed += failed
+        self.leads_deduped += size - written - failed
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def stats(self):
+        batches = self.batches or 1
+        return {
+            "batches": self.batches,
+            "leads_written": self.leads_written,
+            "leads_failed": self.leads_failed,
+            "leads_deduped": self.leads_deduped,
+            "avg_batch_size": round((self.leads_written + self.leads_failed + self.leads_deduped) / batches, 1),
+            "max_batch_size": self.max_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "avg_flush_ms": round(self._total_flush_ms / batches, 1),
+            "max_flush_ms": round(self.max_flush_ms, 1),
+        }
+
+    def close(self):
+        """Flush whatever is buffered and stop the interval thread. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        try:
+            self.flush()
+        finally:
+            _live_writers.discard(self)
+
+
+def flush_all_writers():
+    # Shutdown hook: nothing buffered is lost when the process exits
+    for writer in list(_live_writers):
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+atexit.register(flush_all_writers)
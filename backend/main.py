@@ -1,10 +1,29 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+import sys
 import uuid
-from typing import List, Dict
+import json
+import time
+import base64
+import asyncio
+import threading
+from datetime import datetime
+from typing import List, Dict, Literal
 from models import ScrapeRequest, ScrapeStatus, BusinessLead, BulkDeleteRequest
-from database import test_connection, db
-from scraper_engine import run_scraper_task # We'll implement the actual task runner details
+from database import test_connection, ensure_indexes, db
+from lead_writer import flush_all_writers
+from dedup import warm_dedup_index
+from task_store import get_task_store, TERMINAL_STATUSES, TASK_STORE
+from scheduler import JobScheduler, InMemoryJobQueue, MongoJobQueue
+from work_queue import WorkerDispatch, UnitQueue, SCRAPE_EXECUTION
+from search_index import parse_search, relevance_pipeline, backfill_search_index
+from lead_export import EXPORT_FORMATS, STREAMS, export_query, open_export_cursor, parquet_available, content_disposition
+from checkpoints import load_checkpoint
+from place_cache import task_filter
+from lead_stats import lead_stat_ops, summarize, growth_since, ensure_stats, STATS_CACHE_TTL
+import instrumentation
 
 app = FastAPI(title="Maps Scraper API")
 
@@ -17,68 +36,254 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory task tracking (In production, use Redis)
-tasks: Dict[str, ScrapeStatus] = {}
+# Task tracking: in-memory by default, Mongo-backed with TASK_STORE=mongo (multi-worker / restart safe)
+task_store = get_task_store()
+
+def run_scrape_job(task_id, request, cancel_event):
+    # Scheduler runner: the job may have been queued by another API process
+    task_store.adopt(task_id)
+    task_store.update(task_id, status="running", queue_position=None, message="Starting scraping mission...")
+    # Selenium, phonenumbers, requests etc. load with the first scrape, not at API startup
+    from scraper_engine import run_scraper_task
+    run_scraper_task(
+        task_id, request["keywords"], request["locations"], request["parallel_count"],
+        request["extraction_mode"], request["max_results"], cancel_event=cancel_event,
+    )
+
+def _job_queue():
+    if TASK_STORE == "mongo":
+        from database import db_sync
+        return MongoJobQueue(db_sync.scrape_jobs)
+    return InMemoryJobQueue()
+
+def _job_scheduler():
+    if SCRAPE_EXECUTION == "workers":
+        # Jobs are split into (keyword, location) units that worker.py processes lease from Mongo
+        if TASK_STORE != "mongo":
+            raise RuntimeError("SCRAPE_EXECUTION=workers needs TASK_STORE=mongo")
+        from database import db_sync
+        return WorkerDispatch(UnitQueue(db_sync.scrape_units), task_store, db_sync.tasks, db_sync.task_checkpoints)
+    # Bounded job pool: at most SCRAPE_MAX_CONCURRENT_JOBS scrapes at once, the rest wait in the queue
+    return JobScheduler(run_scrape_job, _job_queue())
+
+scheduler = _job_scheduler()
 
 @app.on_event("startup")
 async def startup_db_client():
     await test_connection()
+    await ensure_indexes()
+    # Key older leads (the unique index exists by now), then load every known business into the dedup filter
+    threading.Thread(target=warm_dedup_index, kwargs={"backfill": True}, daemon=True).start()
+    threading.Thread(target=backfill_search_index, daemon=True).start()
+    threading.Thread(target=ensure_stats, daemon=True).start()
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    scheduler.stop()
+    flush_all_writers()
+    if "driver_pool" in sys.modules:
+        # Only loaded if this process ever ran a scrape
+        sys.modules["driver_pool"].shutdown_driver_pool()
+    task_store.close()
 
 @app.get("/")
 async def root():
     return {"message": "Maps Scraper API is running!"}
 
-import threading
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape target: stage timings, lead outcomes and handled errors for this process
+    return PlainTextResponse(instrumentation.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/scrape", response_model=ScrapeStatus)
-async def start_scraping(request: ScrapeRequest):
+def start_scraping(request: ScrapeRequest):
     task_id = str(uuid.uuid4())
     
     status = ScrapeStatus(
         task_id=task_id,
-        status="running",
+        status="queued",
         progress=0,
         leads_found=0,
-        message=f"Starting scraping mission for {len(request.keywords)} keywords..."
+        message=f"Queued scraping mission for {len(request.keywords)} keywords..."
     )
-    tasks[task_id] = status
+    task_store.create(status)
+    # Whichever process runs the job adopts the task; until then nobody writes it
+    task_store.release(task_id)
     
-    # Run scraping in a separate thread because it's blocking (Selenium)
-    thread = threading.Thread(
-        target=run_scraper_task, 
-        args=(task_id, request.keywords, request.locations)
-    )
-    thread.start()
+    # Selenium work runs on the scheduler's bounded worker pool, not a thread per request
+    scheduler.submit(task_id, request.model_dump(), priority=request.priority)
     
+    return current_status(task_id)
+
+def current_status(task_id):
+    status = task_store.get(task_id)
+    if status is not None and status.status == "queued":
+        status.queue_position = scheduler.position(task_id)
+        if scheduler.blocked_reason:
+            status.message = f"Queued ({scheduler.blocked_reason})"
     return status
 
 @app.get("/status/{task_id}", response_model=ScrapeStatus)
-async def get_status(task_id: str):
-    if task_id not in tasks:
+def get_status(task_id: str):
+    status = current_status(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return status
+
+@app.delete("/scrape/{task_id}", response_model=ScrapeStatus)
+def cancel_scraping(task_id: str):
+    status = task_store.get(task_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return tasks[task_id]
+    if status.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Task already {status.status}")
+
+    outcome = scheduler.cancel(task_id)
+    if outcome == "queued":
+        task_store.adopt(task_id)
+        task_store.update(task_id, status="cancelled", queue_position=None, message="Cancelled before it started.")
+        task_store.release(task_id)
+    elif outcome == "running" and task_store.owns(task_id):
+        # The engine stops at its next checkpoint (between links) and sets the final status
+        task_store.update(task_id, message="Cancelling...")
+    return current_status(task_id)
+
+@app.post("/scrape/{task_id}/resume", response_model=ScrapeStatus)
+def resume_scraping(task_id: str, priority: int = 0):
+    """Re-queue an interrupted, failed or cancelled task; it skips finished queries and processed links."""
+    from database import db_sync
+    status = task_store.get(task_id)
+    if status is not None and status.status == "completed":
+        raise HTTPException(status_code=409, detail="Task already completed")
+    saved = load_checkpoint(db_sync.task_checkpoints, task_id)
+    if saved is None:
+        raise HTTPException(status_code=404, detail="No checkpoint for this task")
+    if status is not None and (scheduler.is_active(task_id) or (status.status == "running" and not task_store.owns(task_id))):
+        raise HTTPException(status_code=409, detail="Task is still running")
+
+    message = f"Queued to resume ({len(saved.get('done', []))} queries already done)..."
+    if status is None:
+        # The API restarted with the in-memory store: rebuild the status from the checkpoint
+        task_store.create(ScrapeStatus(task_id=task_id, status="queued", progress=0, leads_found=saved.get("leads_found", 0), message=message))
+    else:
+        task_store.adopt(task_id)
+        task_store.update(task_id, status="queued", message=message)
+    task_store.release(task_id)
+    scheduler.submit(task_id, {**saved["request"], "priority": priority}, priority=priority)
+    return current_status(task_id)
+
+STREAM_POLL_INTERVAL = 1.0
+
+@app.get("/status/{task_id}/stream")
+async def stream_status(task_id: str):
+    """Server-Sent Events: pushes the ScrapeStatus whenever it changes, closes once the task ends."""
+    if await run_in_threadpool(task_store.get, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def events():
+        last = None
+        idle = 0.0
+        while True:
+            status = await run_in_threadpool(current_status, task_id)
+            if status is None:
+                return
+            payload = status.model_dump_json()
+            if payload != last:
+                last, idle = payload, 0.0
+                yield f"data: {payload}\n\n"
+            elif idle >= 15:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            if status.status in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+            idle += STREAM_POLL_INTERVAL
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+LEADS_COUNT_TTL = 30.0
+_count_cache: Dict[str, tuple] = {}
+
+def encode_cursor(lead):
+    raw = json.dumps({"ts": lead["timestamp"].isoformat(), "id": str(lead["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    from bson import ObjectId
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(raw["ts"]), ObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def count_leads(query, mode):
+    """Exact counts for filtered queries are cached briefly; the unfiltered total comes from collection metadata."""
+    if mode == "none":
+        return None, False
+    if not query and mode == "auto":
+        return await db.leads.estimated_document_count(), True
+    key = json.dumps(query, sort_keys=True, default=str)
+    cached = _count_cache.get(key)
+    if cached and time.monotonic() - cached[1] < LEADS_COUNT_TTL:
+        return cached[0], False
+    total = await db.leads.count_documents(query)
+    if len(_count_cache) > 256:
+        _count_cache.clear()
+    _count_cache[key] = (total, time.monotonic())
+    return total, False
 
 @app.get("/leads/all")
 async def get_all_leads(
     page: int = 1, 
     limit: int = 50, 
     search: str = None, 
-    keyword: str = None
+    keyword: str = None,
+    task_id: str = None,
+    cursor: str = None,
+    count: Literal["auto", "exact", "none"] = "auto",
+    sort: Literal["newest", "relevance"] = "newest"
 ):
+    """
+    Newest-first leads. Pass the previous response's next_cursor to page with a
+    keyset seek on (timestamp, _id), which costs the same on page 500 as on page 1.
+    `page` without a cursor still works (skip-based) for jumping to arbitrary pages.
+
+    `search` matches word prefixes in name, city and address through the indexed
+    search_tokens field; sort=relevance ranks whole-word name matches first.
+    """
     query = {}
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"city": {"$regex": search, "$options": "i"}},
-            {"address": {"$regex": search, "$options": "i"}}
-        ]
+    terms = parse_search(search) if search else []
+    if terms:
+        query["search_tokens"] = {"$all": terms}
     if keyword:
         query["keyword"] = keyword
+    if task_id:
+        query.update(task_filter(task_id))
 
-    total = await db.leads.count_documents(query)
-    skip = (page - 1) * limit
+    total, estimated = await count_leads(query, count)
+
+    if terms and sort == "relevance":
+        skip = (page - 1) * limit
+        leads = await db.leads.aggregate(relevance_pipeline(query, terms, skip, limit)).to_list(limit)
+        for lead in leads:
+            lead["_id"] = str(lead["_id"])
+        return {
+            "leads": leads, "total": total, "total_is_estimate": estimated, "page": page, "limit": limit,
+            "pages": (total + limit - 1) // limit if total is not None else None, "next_cursor": None
+        }
+
+    find_query = query
+    skip = 0
+    if cursor:
+        ts, oid = decode_cursor(cursor)
+        seek = {"$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]}
+        find_query = {"$and": [query, seek]} if query else seek
+    else:
+        skip = (page - 1) * limit
     
-    leads = await db.leads.find(query).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
+    leads = await db.leads.find(find_query).sort([("timestamp", -1), ("_id", -1)]).skip(skip).limit(limit).to_list(limit)
+    next_cursor = encode_cursor(leads[-1]) if len(leads) == limit else None
     
     for lead in leads:
         lead["_id"] = str(lead["_id"])
@@ -86,68 +291,94 @@ async def get_all_leads(
     return {
         "leads": leads,
         "total": total,
+        "total_is_estimate": estimated,
         "page": page,
         "limit": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit if total is not None else None,
+        "next_cursor": next_cursor
     }
 
+@app.get("/leads/export")
+async def export_leads(
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    task_id: str = None,
+    keyword: str = None,
+    city: str = None,
+    since: datetime = None,
+    until: datetime = None
+):
+    """Every matching lead, streamed newest first. No row limit; memory use does not grow with the export."""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow (pip install pyarrow)")
+    cursor = open_export_cursor(db.leads, export_query(task_id, keyword, city, since, until))
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"leads_{task_id or keyword or 'all'}.{extension}"
+    return StreamingResponse(
+        STREAMS[format](cursor),
+        media_type=media_type,
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
+
+STAT_FIELDS = {"keyword": 1, "city": 1, "timestamp": 1}
+_stats_cache: Dict[str, tuple] = {}
+
+async def cached_stat(key, compute):
+    cached = _stats_cache.get(key)
+    if cached and time.monotonic() - cached[1] < STATS_CACHE_TTL:
+        return cached[0]
+    value = await compute()
+    _stats_cache[key] = (value, time.monotonic())
+    return value
+
+async def forget_deleted(leads):
+    # A place cache entry left behind would keep the place from being scraped again
+    await db.place_cache.delete_many({"lead_id": {"$in": [lead["_id"] for lead in leads]}})
+    # Keep the materialized counters in step with deletes
+    ops = lead_stat_ops(leads, sign=-1)
+    if ops:
+        await db.lead_stats.bulk_write(ops, ordered=False)
+        await db.lead_stats.delete_many({"type": {"$in": ["keyword", "city", "day"]}, "count": {"$lte": 0}})
+    _stats_cache.clear()
+    _count_cache.clear()
+
 @app.delete("/leads/{lead_id}")
 async def delete_lead(lead_id: str):
     from bson import ObjectId
-    result = await db.leads.delete_one({"_id": ObjectId(lead_id)})
-    if result.deleted_count == 0:
+    lead = await db.leads.find_one_and_delete({"_id": ObjectId(lead_id)}, projection=STAT_FIELDS)
+    if lead is None:
         raise HTTPException(status_code=404, detail="Lead not found")
+    await forget_deleted([lead])
     return {"message": "Lead deleted successfully"}
 
 @app.post("/leads/bulk-delete")
 async def bulk_delete_leads(request: BulkDeleteRequest):
     from bson import ObjectId
     object_ids = [ObjectId(lid) for lid in request.lead_ids]
-    result = await db.leads.delete_many({"_id": {"$in": object_ids}})
+    leads = await db.leads.find({"_id": {"$in": object_ids}}, STAT_FIELDS).to_list(None)
+    result = await db.leads.delete_many({"_id": {"$in": [lead["_id"] for lead in leads]}})
+    await forget_deleted(leads)
     return {"message": f"Successfully deleted {result.deleted_count} leads"}
 
 @app.get("/stats")
 async def get_stats():
-    total_leads = await db.leads.count_documents({})
-    # Count unique locations
-    locations = await db.leads.distinct("city")
-    return {
-        "total_leads": total_leads,
-        "locations_count": len(locations),
-        "success_rate": "95%", # Placeholder
-        "growth": "+5%" # Placeholder
-    }
+    async def compute():
+        # Reads a handful of lead_stats docs instead of counting and distinct-ing leads
+        totals = await db.lead_stats.find_one({"_id": "totals"})
+        locations = await db.lead_stats.count_documents({"type": "city", "count": {"$gt": 0}})
+        days = await db.lead_stats.find({"type": "day", "_id": {"$gte": growth_since()}}).to_list(None)
+        return summarize(totals, locations, days)
+    return await cached_stat("stats", compute)
 
 @app.get("/keywords")
 async def get_keywords():
-    keywords = await db.leads.distinct("keyword")
-    return keywords
+    async def compute():
+        docs = await db.lead_stats.find({"type": "keyword", "count": {"$gt": 0}}, {"value": 1}).sort("value", 1).to_list(None)
+        return [doc["value"] for doc in docs]
+    return await cached_stat("keywords", compute)
 
 @app.get("/leads/{task_id}")
 async def get_leads(task_id: str):
-    leads = await db.leads.find({"task_id": task_id}).to_list(1000)
+    leads = await db.leads.find(task_filter(task_id)).to_list(1000)
     for lead in leads:
         lead["_id"] = str(lead["_id"])
     return leads
-    try:
-        tasks[task_id].status = "running"
-        tasks[task_id].progress = 10
-        tasks[task_id].message = "Initializing browsers..."
-        
-        # Here we would call the parallel scraping logic
-        # For now, let's simulate progress
-        for i in range(1, 10):
-            await asyncio.sleep(2) # Simulate work
-            tasks[task_id].progress = 10 + (i * 10)
-            tasks[task_id].leads_found += random.randint(1, 5)
-            tasks[task_id].message = f"Found {tasks[task_id].leads_found} leads so far..."
-            
-        tasks[task_id].status = "completed"
-        tasks[task_id].progress = 100
-        tasks[task_id].message = "Scraping finished successfully!"
-        
-    except Exception as e:
-        tasks[task_id].status = "failed"
-        tasks[task_id].message = f"Error: {str(e)}"
-
-import random
@@ -1,11 +1,14 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 
 class ScrapeRequest(BaseModel):
     keywords: List[str]
     locations: List[str]
-    parallel_count: int = 1
+    parallel_count: int = Field(1, ge=1) # browsers working on this task at once
+    extraction_mode: Literal["feed", "detail"] = "feed" # "feed" reads result cards in bulk, visits place pages only when fields are missing
+    max_results: Optional[int] = Field(None, ge=1) # per (keyword, location); scrolling stops once this many results are loaded
+    priority: int = 0 # higher runs first when jobs are queued
 
 class BusinessLead(BaseModel):
     name: str
@@ -20,10 +23,12 @@ class BusinessLead(BaseModel):
 
 class ScrapeStatus(BaseModel):
     task_id: str
-    status: str # "running", "completed", "failed"
+    status: str # "queued", "running", "completed", "failed", "cancelled"
     progress: int # percentage
     leads_found: int
     message: Optional[str] = None
+    queue_position: Optional[int] = None # 1-based, only while queued
+    stats: Dict[str, Any] = Field(default_factory=dict) # per-task engine counters (writer, feed, timings...)
 
 class BulkDeleteRequest(BaseModel):
     lead_ids: List[str]
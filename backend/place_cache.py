@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import threading
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from dedup import make_dedup_key
+from lead_stats import record_task_yield
+
+# Place-level freshness cache in the place_cache collection, one doc per Maps place:
+#   _id           place id parsed from the href, or the href without its query string
+#   lead_id       the stored lead for this place
+#   scraped_at    when the place page (or its feed card) was last read
+#   content_hash  hash of name/address/phone/website as last read
+# Places read within PLACE_CACHE_TTL are not visited again: the stored lead is
+# attached to the new task (task_ids) instead. Older ones are re-read and the lead
+# is only rewritten when the content hash changed. An entry whose lead was deleted
+# is dropped and the place is scraped as new.
+PLACE_CACHE_TTL = int(os.getenv("PLACE_CACHE_TTL", str(30 * 24 * 3600)))
+
+HASHED_FIELDS = ("name", "address", "phone", "website")
+
+
+def place_key(link, place_id=None):
+    return place_id or (link or "").split("?")[0]
+
+
+def content_hash(fields):
+    raw = "\x1f".join(str(fields.get(name) or "") for name in HASHED_FIELDS)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def task_filter(task_id):
+    """Leads collected by a task, including stored leads it reused from the place cache."""
+    return {"$or": [{"task_id": task_id}, {"task_ids": task_id}]}
+
+
+class PlaceCache:
+    """Per-task view of the place cache: lookups, reuse/refresh bookkeeping and skip stats."""
+
+    def __init__(self, collection, leads, task_id, ttl=PLACE_CACHE_TTL, stats=None):
+        self.collection = collection
+        self.leads = leads
+        self.task_id = task_id
+        self.stats_collection = stats # lead_stats: reused and refreshed leads count toward the task's yield
+        self.ttl = ttl
+        self._entries = {}
+        self._pending = {} # dedup_key -> (place key, content hash) for new leads not written yet
+        self._lock = threading.Lock()
+        self.counts = {"reused": 0, "refreshed_unchanged": 0, "refreshed_changed": 0, "fetched_new": 0, "lead_deleted": 0}
+
+    def prefetch(self, keys):
+        """One $in query for a whole query's links instead of a lookup per link."""
+        with self._lock:
+            missing = [key for key in dict.fromkeys(keys) if key and key not in self._entries]
+        if not missing:
+            return
+        found = {doc["_id"]: doc for doc in self.collection.find({"_id": {"$in": missing}})}
+        with self._lock:
+            for key in missing:
+                self._entries.setdefault(key, found.get(key))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+        entry = self.collection.find_one({"_id": key})
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("scraped_at", 0) < self.ttl
+
+    def forget(self, entry):
+        """Drop an entry whose lead no longer exists."""
+        self.collection.delete_one({"_id": entry["_id"], "lead_id": entry["lead_id"]})
+        with self._lock:
+            self._entries[entry["_id"]] = None
+            self.counts["lead_deleted"] += 1
+
+    def reuse(self, entry):
+        """Fresh place: attach its stored lead to this task, no page visit. False if that lead was deleted."""
+        if not self.leads.update_one({"_id": entry["lead_id"]}, {"$addToSet": {"task_ids": self.task_id}}).matched_count:
+            self.forget(entry)
+            return False
+        self._record_yield()
+        with self._lock:
+            self.counts["reused"] += 1
+        return True
+
+    def _record_yield(self):
+        if self.stats_collection is not None:
+            record_task_yield(self.stats_collection, self.task_id)
+
+    def refresh(self, entry, fields, extra=None):
+        """
+        Stale place that was read again: rewrite the lead only if its content changed.
+        Returns whether it changed, or None if the lead was deleted (store the place as new).
+        """
+        new_hash = content_hash(fields)
+        changed = new_hash != entry.get("content_hash")
+        update = {"$addToSet": {"task_ids": self.task_id}}
+        if changed:
+            # A new name or address means a new dedup key; the unique index decides who owns it
+            key = make_dedup_key(fields.get("name"), fields.get("address"))
+            update["$set"] = {**fields, **(extra or {}), "dedup_key": key}
+            update["$unset"] = {"duplicate_of": ""}
+        try:
+            matched = self.leads.update_one({"_id": entry["lead_id"]}, update).matched_count
+        except DuplicateKeyError:
+            # Another stored lead is this business now: keep ours as its duplicate, like backfill_dedup_keys
+            holder = self.leads.find_one({"dedup_key": key}, {"_id": 1})
+            update["$set"].pop("dedup_key")
+            if holder is not None:
+                update["$set"]["duplicate_of"] = holder["_id"]
+                update["$unset"] = {"dedup_key": ""}
+            else:
+                update.pop("$unset")
+            matched = self.leads.update_one({"_id": entry["lead_id"]}, update).matched_count
+        if not matched:
+            self.forget(entry)
+            return None
+        self._record_yield()
+        self.collection.update_one({"_id": entry["_id"]}, {"$set": {"scraped_at": time.time(), "content_hash": new_hash}})
+        with self._lock:
+            self.counts["refreshed_changed" if changed else "refreshed_unchanged"] += 1
+        return changed
+
+    def expect(self, dedup_key, key, fields):
+        """A new lead was handed to the pipeline; it is cached once the writer stores it."""
+        with self._lock:
+            self.counts["fetched_new"] += 1
+            self._pending[dedup_key] = (key, content_hash(fields))
+
+    def written(self, leads):
+        ops = []
+        now = time.time()
+        with self._lock:
+            for lead in leads:
+                pending = self._pending.pop(lead.get("dedup_key"), None)
+                if pending and lead.get("_id") is not None:
+                    key, digest = pending
+                    ops.append(UpdateOne(
+                        {"_id": key},
+                        {"$set": {"lead_id": lead["_id"], "scraped_at": now, "content_hash": digest}},
+                        upsert=True,
+                    ))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        skipped = counts["reused"]
+        fetched = counts["refreshed_unchanged"] + counts["refreshed_changed"] + counts["fetched_new"]
+        counts["skip_ratio"] = round(skipped / (skipped + fetched), 3) if skipped + fetched else 0.0
+        return counts
@@ -0,0 +1,194 @@
+import os
+import time
+import random
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Adaptive pacing shared by the API engine and the SCRAPER CLI (no DB or Selenium imports).
+# Every request to a host takes a token from that host's bucket and from the controller's
+# global bucket. A host's rate creeps up while its responses are healthy (additive increase)
+# and is halved on a throttling signal, which also pauses the host for an exponentially
+# growing cool-down (multiplicative decrease):
+#   captcha     Google's /sorry/ page or an "unusual traffic" interstitial
+#   consent     redirected to consent.google.com mid-session
+#   empty_feed  a search came back without a results feed or cards
+#   http_429    a website answered 429 Too Many Requests
+# Rates are requests per second. "maps" paces browser page loads, "web" the email fetches.
+RATE_PROFILES = {
+    "maps": {
+        "initial": float(os.getenv("MAPS_RATE_INITIAL", "1")),
+        "max": float(os.getenv("MAPS_RATE_MAX", "4")),
+        "global": float(os.getenv("MAPS_RATE_GLOBAL", "6")),
+    },
+    "web": {
+        "initial": float(os.getenv("WEB_RATE_INITIAL", "1")),
+        "max": float(os.getenv("WEB_RATE_MAX", "4")),
+        "global": float(os.getenv("WEB_RATE_GLOBAL", "50")),
+    },
+}
+RATE_MIN = 0.05
+RATE_STEP = 0.05 # added per healthy response
+RATE_BURST = 2.0
+RATE_COOLDOWN = 5.0 # first pause after a throttling signal, doubled per consecutive signal
+RATE_MAX_COOLDOWN = 300.0
+RATE_JITTER = 0.2 # +-20% on every wait so parallel workers do not move in lockstep
+# The "web" controller sees a new host per business website; hosts idle this long (and not
+# cooling down) are forgotten, and the least recently used go first past RATE_MAX_HOSTS
+RATE_HOST_IDLE = float(os.getenv("RATE_HOST_IDLE", "600"))
+RATE_MAX_HOSTS = int(os.getenv("RATE_MAX_HOSTS", "2000"))
+
+class Throttled(Exception):
+    """Raised by a fetch that got a throttling response (e.g. HTTP 429)."""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower() if "://" in (url or "") else (url or "").lower()
+
+
+def page_signal(current_url, title=""):
+    """Throttling signal for a loaded page, from its URL and title, or None."""
+    url = (current_url or "").lower()
+    if "/sorry/" in url or "captcha" in url or "unusual traffic" in (title or "").lower():
+        return "captcha"
+    if "consent.google." in url:
+        return "consent"
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def reserve(self, now):
+        """Take a token; returns how long the caller has to wait for it (tokens may go into debt)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _Host:
+    def __init__(self, rate):
+        self.bucket = TokenBucket(rate)
+        self.paused_until = 0.0
+        self.strikes = 0
+        self.requests = 0
+        self.waited = 0.0
+        self.signals = {}
+
+
+class RateController:
+    def __init__(self, initial=1.0, max_rate=4.0, global_rate=6.0):
+        self.initial = initial
+        self.max_rate = max_rate
+        self._global = TokenBucket(global_rate, burst=max(RATE_BURST, global_rate))
+        self._hosts = OrderedDict() # least recently used first
+        self._retired = {"requests": 0, "waited": 0.0, "signals": {}} # totals of evicted hosts, for report()
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        entry = self._hosts.get(host)
+        if entry is None:
+            self._evict(time.monotonic())
+            entry = self._hosts[host] = _Host(self.initial)
+        else:
+            self._hosts.move_to_end(host)
+        return entry
+
+    def _evict(self, now):
+        victims = []
+        over = len(self._hosts) - RATE_MAX_HOSTS + 1
+        for host, entry in self._hosts.items():
+            if over <= len(victims) and now - entry.bucket.last < RATE_HOST_IDLE:
+                break
+            if entry.paused_until <= now: # a host in its cool-down is never forgotten
+                victims.append(host)
+        for host in victims:
+            entry = self._hosts.pop(host)
+            self._retired["requests"] += entry.requests
+            self._retired["waited"] += entry.waited
+            for reason, count in entry.signals.items():
+                self._retired["signals"][reason] = self._retired["signals"].get(reason, 0) + count
+
+    def acquire(self, url, cancel_event=None):
+        """Block until a request to url's host is allowed. Returns the seconds waited."""
+        host = host_of(url)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._host(host)
+            delay = max(entry.bucket.reserve(now), self._global.reserve(now), entry.paused_until - now)
+            if delay > 0:
+                delay *= random.uniform(1 - RATE_JITTER, 1 + RATE_JITTER)
+            entry.requests += 1
+            entry.waited += delay
+        if delay > 0:
+            if cancel_event is not None:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+        return delay
+
+    def success(self, url):
+        with self._lock:
+            entry = self._host(host_of(url))
+            entry.strikes = 0
+            entry.bucket.rate = min(self.max_rate, entry.bucket.rate + RATE_STEP)
+
+    def throttled(self, url, reason, retry_after=None):
+        with self._lock:
+            entry = self._host(host_of(url))
+            entry.strikes += 1
+            entry.bucket.rate = max(RATE_MIN, entry.bucket.rate / 2)
+            cooldown = min(RATE_MAX_COOLDOWN, RATE_COOLDOWN * 2 ** (entry.strikes - 1))
+            entry.paused_until = max(entry.paused_until, time.monotonic() + max(cooldown, retry_after or 0))
+            entry.signals[reason] = entry.signals.get(reason, 0) + 1
+
+    def observe(self, url, signal):
+        """success() or throttled() depending on a page_signal() result."""
+        if signal:
+            self.throttled(url, signal)
+        else:
+            self.success(url)
+
+    def rate(self, url):
+        with self._lock:
+            return self._host(host_of(url)).bucket.rate
+
+    def report(self, top=5):
+        """Effective rate per host (busiest first) plus totals, for task status."""
+        with self._lock:
+            hosts = sorted(self._hosts.items(), key=lambda item: -item[1].requests)
+            signals = dict(self._retired["signals"])
+            for _, entry in hosts:
+                for reason, count in entry.signals.items():
+                    signals[reason] = signals.get(reason, 0) + count
+            return {
+                "requests": self._retired["requests"] + sum(entry.requests for _, entry in hosts),
+                "waited_s": round(self._retired["waited"] + sum(entry.waited for _, entry in hosts), 1),
+                "throttle_signals": signals,
+                "hosts": {
+                    host: {"rate_per_s": round(entry.bucket.rate, 2), "requests": entry.requests, "paused": entry.paused_until > time.monotonic()}
+                    for host, entry in hosts[:top]
+                },
+            }
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_rate_controller(name="maps"):
+    with _controllers_lock:
+        if name not in _controllers:
+            profile = RATE_PROFILES[name]
+            _controllers[name] = RateController(profile["initial"], profile["max"], profile["global"])
+        return _controllers[name]
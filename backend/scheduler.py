@@ -0,0 +1,291 @@
+import os
+import time
+import heapq
+import socket
+import itertools
+import threading
+from instrumentation import count_error
+
+# Bounded job scheduler for POST /scrape: a fixed number of jobs run at once,
+# the rest wait in a priority queue (higher priority first, FIFO within a priority).
+# Jobs only start when the box has the memory and CPU headroom for another Chrome.
+SCRAPE_MAX_CONCURRENT_JOBS = int(os.getenv("SCRAPE_MAX_CONCURRENT_JOBS", "1"))
+SCRAPE_MIN_FREE_MB = int(os.getenv("SCRAPE_MIN_FREE_MB", "350"))
+SCRAPE_MAX_LOAD = float(os.getenv("SCRAPE_MAX_LOAD", "1.5")) # 1-minute load average per CPU
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "5"))
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+def available_memory_mb():
+    """Free memory as the container sees it (cgroup limit first, then the host), or None if unknown."""
+    for limit_path, usage_path in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    ):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit and usage is not None and limit < 1 << 50:
+            return (limit - usage) / (1024 * 1024)
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def admission_check(min_free_mb=SCRAPE_MIN_FREE_MB, max_load=SCRAPE_MAX_LOAD):
+    """(ok, reason). Unknown metrics never block a job."""
+    free_mb = available_memory_mb()
+    if free_mb is not None and free_mb < min_free_mb:
+        return False, f"waiting for memory ({int(free_mb)} MB free, need {min_free_mb} MB)"
+    try:
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        load = None
+    if load is not None and load > max_load:
+        return False, f"waiting for CPU (load {load:.2f} per core)"
+    return True, None
+
+
+class InMemoryJobQueue:
+    """Priority queue of jobs for a single API process."""
+
+    def __init__(self):
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def push(self, task_id, request, priority=0):
+        with self._lock:
+            seq = next(self._seq)
+            self._jobs[task_id] = (-priority, seq)
+            heapq.heappush(self._heap, (-priority, seq, task_id, request))
+
+    def pop(self):
+        with self._lock:
+            while self._heap:
+                _, _, task_id, request = heapq.heappop(self._heap)
+                if self._jobs.pop(task_id, None) is not None:
+                    return {"task_id": task_id, "request": request}
+        return None
+
+    def remove(self, task_id):
+        # Lazy delete: the heap entry is skipped when popped
+        with self._lock:
+            return self._jobs.pop(task_id, None) is not None
+
+    def position(self, task_id):
+        with self._lock:
+            key = self._jobs.get(task_id)
+            if key is None:
+                return None
+            return 1 + sum(1 for other in self._jobs.values() if other < key)
+
+    def ensure_indexes(self):
+        pass
+
+    def request_cancel(self, task_id):
+        return False
+
+    def cancel_requested(self, task_id):
+        return False
+
+    def finish(self, task_id, state):
+        pass
+
+
+class MongoJobQueue:
+    """
+    Persistent queue in the scrape_jobs collection. Jobs survive restarts and are
+    claimed with an atomic find_one_and_update, so several API processes can share it.
+    """
+
+    def __init__(self, collection):
+        from pymongo import ReturnDocument
+        self.collection = collection
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._return_after = ReturnDocument.AFTER
+
+    def ensure_indexes(self):
+        self.collection.create_index([("state", 1), ("priority", -1), ("seq", 1)])
+
+    def push(self, task_id, request, priority=0):
+        # Upsert: a resumed task re-enters the queue under its old id
+        self.collection.replace_one({"_id": task_id}, {
+            "_id": task_id, "request": request, "priority": priority,
+            "seq": time.time_ns(), "state": "queued", "cancel_requested": False,
+        }, upsert=True)
+
+    def pop(self):
+        doc = self.collection.find_one_and_update(
+            {"state": "queued"},
+            {"$set": {"state": "running", "owner": self.owner, "started_at": time.time()}},
+            sort=[("priority", -1), ("seq", 1)],
+            return_document=self._return_after,
+        )
+        return {"task_id": doc["_id"], "request": doc["request"]} if doc else None
+
+    def remove(self, task_id):
+        result = self.collection.update_one({"_id": task_id, "state": "queued"}, {"$set": {"state": "cancelled"}})
+        return result.modified_count == 1
+
+    def position(self, task_id):
+        doc = self.collection.find_one({"_id": task_id, "state": "queued"}, {"priority": 1, "seq": 1})
+        if not doc:
+            return None
+        ahead = self.collection.count_documents({"state": "queued", "$or": [
+            {"priority": {"$gt": doc["priority"]}},
+            {"priority": doc["priority"], "seq": {"$lt": doc["seq"]}},
+        ]})
+        return ahead + 1
+
+    def request_cancel(self, task_id):
+        result = self.collection.update_one({"_id": task_id, "state": "running"}, {"$set": {"cancel_requested": True}})
+        return result.modified_count == 1
+
+    def cancel_requested(self, task_id):
+        doc = self.collection.find_one({"_id": task_id}, {"cancel_requested": 1})
+        return bool(doc and doc.get("cancel_requested"))
+
+    def finish(self, task_id, state):
+        self.collection.update_one({"_id": task_id}, {"$set": {"state": state, "finished_at": time.time()}})
+
+
+class JobScheduler:
+    """
+    Runs queued jobs on at most `max_jobs` threads. runner(task_id, request, cancel_event)
+    does the work and should stop soon after cancel_event is set.
+    """
+
+    def __init__(self, runner, queue, max_jobs=SCRAPE_MAX_CONCURRENT_JOBS):
+        self.runner = runner
+        self.queue = queue
+        self.max_jobs = max(1, max_jobs)
+        self.blocked_reason = None # why the next job is not starting, if admission control is holding it
+        self._slots = threading.Semaphore(self.max_jobs)
+        self._running = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher = None
+
+    def start(self):
+        self.queue.ensure_indexes()
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for cancel_event in self._running.values():
+                cancel_event.set()
+
+    def submit(self, task_id, request, priority=0):
+        self.queue.push(task_id, request, priority)
+        self._wake.set()
+
+    def position(self, task_id):
+        return self.queue.position(task_id)
+
+    def is_active(self, task_id):
+        """True while the job is queued or running in this process."""
+        with self._lock:
+            if task_id in self._running:
+                return True
+        return self.queue.position(task_id) is not None
+
+    def cancel(self, task_id):
+        """'queued' if removed before it started, 'running' if asked to stop, None if unknown/finished."""
+        if self.queue.remove(task_id):
+            return "queued"
+        with self._lock:
+            cancel_event = self._running.get(task_id)
+        if cancel_event is not None:
+            cancel_event.set()
+            self.queue.request_cancel(task_id)
+            return "running"
+        # Running in another API process: it picks the flag up from the shared queue
+        if self.queue.request_cancel(task_id):
+            return "running"
+        return None
+
+    def _sync_remote_cancels(self):
+        with self._lock:
+            running = list(self._running.items())
+        for task_id, cancel_event in running:
+            if not cancel_event.is_set() and self.queue.cancel_requested(task_id):
+                cancel_event.set()
+
+    def _wait(self):
+        self._wake.wait(QUEUE_POLL_INTERVAL)
+        self._wake.clear()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._sync_remote_cancels()
+            except Exception as e:
+                count_error("job_cancel_sync", e)
+
+            if not self._slots.acquire(timeout=QUEUE_POLL_INTERVAL):
+                continue
+            ok, reason = admission_check()
+            self.blocked_reason = reason
+            if not ok:
+                self._slots.release()
+                self._wait()
+                continue
+
+            try:
+                job = self.queue.pop()
+            except Exception as e:
+                count_error("job_pop", e)
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wait()
+                continue
+
+            cancel_event = threading.Event()
+            with self._lock:
+                self._running[job["task_id"]] = cancel_event
+            threading.Thread(target=self._run, args=(job, cancel_event), name=f"job-{job['task_id'][:8]}", daemon=True).start()
+
+    def _run(self, job, cancel_event):
+        task_id = job["task_id"]
+        state = "done"
+        try:
+            self.runner(task_id, job["request"], cancel_event)
+            if cancel_event.is_set():
+                state = "cancelled"
+        except Exception as e:
+            count_error("job", e)
+            state = "failed"
+        finally:
+            try:
+                self.queue.finish(task_id, state)
+            except Exception as e:
+                count_error("job_finish", e)
+            with self._lock:
+                self._running.pop(task_id, None)
+            self._slots.release()
+            self._wake.set()
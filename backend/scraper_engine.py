@@ -1,33 +1,42 @@
-import time
-import re
-import random
 import os
-import asyncio
-import requests
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import phonenumbers
-from phonenumbers import phonenumberutil
 
 # Import DB
-from database import db
+from database import db_sync
+from driver_pool import get_driver_pool
+from geocoding import resolve_country
+from email_enricher import EmailStage, get_email_enricher
+from lead_writer import LeadWriter
+from dedup import get_dedup_index, make_dedup_key, parse_place_id
+from feed_parser import parse_feed_cards, is_complete
+from scroll_engine import scroll_feed, LEGACY_SCROLL_SECONDS
+from task_store import get_task_store
+from search_index import search_fields
+from lead_stats import record_leads, record_task_outcome
+from checkpoints import TaskCheckpoint
+from place_cache import PlaceCache, place_key
+from browser_profile import PageMetrics
+from instrumentation import StageTimings, count_error, inc
+from rate_control import get_rate_controller, page_signal
 
-def get_country_for_location(location):
-    try:
-        from geopy.geocoders import Nominatim
-        geolocator = Nominatim(user_agent="map_scrape_v2_fast")
-        location_data = geolocator.geocode(location, addressdetails=True, language="en", timeout=5)
-        if location_data and 'address' in location_data.raw and 'country' in location_data.raw['address']:
-            return location_data.raw['address']['country'], location_data.raw['address']['country_code'].upper()
-    except:
-        pass
-    return "India", "IN"
+# Overridable so the offline benchmark (benchmarks/) can point the engine at a local fixture server
+MAPS_BASE_URL = os.getenv("MAPS_BASE_URL", "https://www.google.com/maps").rstrip("/")
+
+def get_country_for_location(location, progress=None):
+    # Cached: same city across keywords (and restarts) never re-hits Nominatim
+    resolution = resolve_country(location, default=("India", "IN"))
+    inc("scraper_geocode_total", source=resolution.source, cache_hit=str(resolution.cache_hit).lower())
+    if progress is not None:
+        progress.incr_stat("geocode", resolution.source)
+    return resolution.country, resolution.country_code
 
 def validate_and_get_phone(phone_number_str, country_code):
     if not phone_number_str or phone_number_str == "No phone": return None
@@ -35,136 +44,543 @@ def validate_and_get_phone(phone_number_str, country_code):
         parsed_number = phonenumbers.parse(phone_number_str, country_code)
         if phonenumbers.is_valid_number(parsed_number):
             return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
-    except:
-        pass
+    except Exception as e:
+        count_error("phone_parse", e)
     return phone_number_str
 
-def fast_extract_email(url):
-    """Ultra-fast email extraction without opening a browser tab"""
-    if not url or url == "No website": return "No email"
+class TaskProgress:
+    """Thread-safe progress writer for one task, shared by all of its workers."""
+
+    def __init__(self, task_id, num_queries, store=None):
+        self.task_id = task_id
+        self.num_queries = max(1, num_queries)
+        self.store = store or get_task_store()
+        self._fractions = [0.0] * self.num_queries
+        self._lock = threading.Lock()
+
+    def update(self, query_idx, fraction, message=None):
+        # Each query owns an equal slice of the bar; overall progress is the sum of slices
+        with self._lock:
+            self._fractions[query_idx] = max(self._fractions[query_idx], min(fraction, 1.0))
+            progress = min(int(sum(self._fractions) * 100 / self.num_queries), 99)
+
+        def apply(status):
+            status.progress = progress
+            if message:
+                status.message = message
+        self.store.mutate(self.task_id, apply)
+
+    def fraction(self, query_idx):
+        with self._lock:
+            return self._fractions[query_idx]
+
+    def add_leads(self, count=1):
+        def apply(status):
+            status.leads_found += count
+        self.store.mutate(self.task_id, apply)
+
+    def set_stats(self, name, value):
+        def apply(status):
+            status.stats[name] = value
+        self.store.mutate(self.task_id, apply)
+
+    def incr_stat(self, section, name, count=1):
+        def apply(status):
+            bucket = status.stats.setdefault(section, {})
+            bucket[name] = round(bucket.get(name, 0) + count, 2)
+        self.store.mutate(self.task_id, apply)
+
+
+class TaskCancelled(Exception):
+    """Raised at the next checkpoint (between links/queries) after a task was cancelled."""
+
+
+class SharedKeys:
+    """Dedup set that several detail workers can check-and-claim atomically."""
+
+    def __init__(self, keys=()):
+        self._keys = set(keys)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._keys
+
+    def claim(self, key):
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._keys.discard(key)
+
+
+class _LinkCounter:
+    def __init__(self, total):
+        self.total = total
+        self._done = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            self._done += 1
+            return self._done
+
+
+class ScrapeContext:
+    """Everything the workers of one scrape task share."""
+
+    def __init__(self, task_id, num_queries, workers=1, detail_executor=None, extraction_mode="feed", max_results=None, cancel_event=None, checkpoint=None, progress=None):
+        self.task_id = task_id
+        self.checkpoint = checkpoint # TaskCheckpoint, or None to run without resume support
+        self.cancel_event = cancel_event or threading.Event()
+        self.max_results = max_results # per query; stops scrolling (and link processing) once reached
+        self.extraction_mode = extraction_mode # "feed": parse result cards in bulk, "detail": visit every place page
+        self.progress = progress or TaskProgress(task_id, num_queries)
+        self.existing_keys = SharedKeys() # in-flight claims within this task
+        self.dedup = get_dedup_index() # businesses stored by any earlier task
+        self.places = PlaceCache(db_sync.place_cache, db_sync.leads, task_id, stats=db_sync.lead_stats) # when each known place was last read
+        self.timings = StageTimings() # per-stage time breakdown, reported as stats["timings"]
+        self.rate = get_rate_controller("maps") # paces page loads across all tasks in this process
+        self.browser = PageMetrics(get_driver_pool().profile, self.timings) # bytes and load time of every page this task opens
+        self.workers = workers
+        self.detail_executor = detail_executor
+        self.email_stage = EmailStage(get_email_enricher(), self.save_lead, self.timings)
+        self.writer = LeadWriter(db_sync.leads, on_flushed=self._on_flushed, key_field="dedup_key", timings=self.timings)
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+    def count_lead(self, outcome, reason=None):
+        """accepted / dropped / deduped, for /metrics and this task's stats."""
+        inc("scraper_leads_total", outcome=outcome)
+        self.progress.incr_stat("leads", outcome)
+        if reason:
+            self.progress.incr_stat("dedup", reason)
+
+    def error(self, category, exc=None):
+        count_error(category, exc)
+        self.progress.incr_stat("errors", category)
+
+    @contextmanager
+    def driver(self):
+        """Pooled browser checkout; the wait (and any cold start) is timed as driver_checkout."""
+        pool = get_driver_pool()
+        with self.timings.span("driver_checkout"):
+            item = pool.acquire()
+        try:
+            yield item.driver
+        finally:
+            pool.release(item)
+
+    def report_timings(self):
+        self.progress.set_stats("timings", self.timings.report())
+        self.progress.set_stats("rate", {"maps": self.rate.report(), "web": self.email_stage.enricher.rate.report()})
+
+    def load_page(self, driver, url):
+        """Paced, timed page load. Returns the throttling signal the page showed, if any."""
+        self.rate.acquire(url, self.cancel_event)
+        self.browser.timed_get(driver, url)
+        signal = page_signal(driver.current_url, driver.title)
+        if signal:
+            self.progress.incr_stat("throttle", signal)
+        return signal
+
+    def save_lead(self, lead):
+        # Called by the email stage once the lead is enriched; the writer batches the insert
+        self.writer.add(lead)
+
+    def _on_flushed(self, written, failed):
+        # leads_found only counts what actually reached Mongo
+        for lead in failed:
+            # Let another worker (or a later query) retry this business
+            self.existing_keys.release(lead["dedup_key"])
+        for lead in written:
+            self.dedup.add(lead["dedup_key"], lead.get("place_id"))
+        if written:
+            self.progress.add_leads(len(written))
+            try:
+                record_leads(db_sync.lead_stats, written)
+                self.places.written(written)
+            except Exception as e:
+                self.error("lead_stats", e)
+        self.progress.set_stats("places", self.places.stats())
+        self.progress.set_stats("writer", self.writer.stats())
+        self.progress.set_stats("email", self.email_stage.enricher.stats())
+        self.report_timings()
+        if self.checkpoint:
+            try:
+                self.checkpoint.leads_flushed(written, failed)
+            except Exception as e:
+                self.error("checkpoint", e)
+
+    def link_done(self, link):
+        if self.checkpoint:
+            self.checkpoint.link_done(link)
+
+    def close(self):
+        """Drain the email stage, then flush the writer. Runs on success and on failure."""
+        try:
+            self.email_stage.join()
+        finally:
+            self.writer.close()
+            if self.checkpoint:
+                self.checkpoint.flush()
+            self.report_timings()
+
+
+def collect_business_links(driver, url, keyword, ctx, query_idx):
+    progress = ctx.progress
+    wait = WebDriverWait(driver, 10) 
+    signal = ctx.load_page(driver, url)
+
+    # Handle Privacy Consent
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        response = requests.get(url, headers=headers, timeout=5, verify=False)
-        emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', response.text)
-        if emails:
-            clean = [e for e in emails if not any(x in e.lower() for x in ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp'])]
-            return clean[0] if clean else "No email"
-    except:
-        pass
-    return "No email"
-
-def find_and_save_dynamically(keyword, location, user_country, user_country_code, existing_keys, task_id, start_prog, end_prog):
-    from main import tasks
-    search_query = f"{keyword} in {location}".replace(" ", "+")
-    url = f"https://www.google.com/maps/search/{search_query}" 
-
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless=new') 
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--window-size=1280,720')
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-    options.add_argument('--log-level=3')
+        reject_button = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Reject all')] | //button[contains(., 'Rechazar todo')]")))
+        reject_button.click()
+    except TimeoutException:
+        pass # no consent screen
+    except Exception as e:
+        ctx.error("consent", e)
+
+    progress.update(query_idx, 0.0, f"Scanning {keyword}...")
     
-    driver = None
+    business_card_selector = 'a.hfpxzc, a[href*="/maps/place/"]'
+
+    # ADAPTIVE SCROLLING: poll for new cards, stop at end of list or at max_results
+    def on_scroll(count, scrolls):
+        target = ctx.max_results or 120
+        progress.update(query_idx, 0.05 + min(count / target, 1.0) * 0.10)
+
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-        wait = WebDriverWait(driver, 10) 
-        driver.get(url)
+        scrollable_div = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="feed"]')))
+        with ctx.timings.span("scroll"):
+            result = scroll_feed(driver, scrollable_div, business_card_selector, max_results=ctx.max_results, on_scroll=on_scroll)
+        progress.incr_stat("scroll", "queries")
+        progress.incr_stat("scroll", "scrolls", result.scrolls)
+        progress.incr_stat("scroll", "seconds", result.elapsed)
+        progress.incr_stat("scroll", "saved_seconds", max(LEGACY_SCROLL_SECONDS - result.elapsed, 0))
+        progress.incr_stat("scroll", f"stopped_{result.reason}")
+    except Exception as e:
+        ctx.error("scroll", e)
 
-        # Handle Privacy Consent
-        try:
-            reject_button = WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Reject all')] | //button[contains(., 'Rechazar todo')]")))
-            reject_button.click()
-        except: pass
+    ctx.browser.add_transfer(driver)
+    ctx.progress.set_stats("browser", ctx.browser.report())
+    elements = driver.find_elements(By.CSS_SELECTOR, business_card_selector)
+    links = list(dict.fromkeys([elem.get_attribute('href') for elem in elements if elem.get_attribute('href')]))
+    if not signal and not links:
+        signal = "empty_feed"
+        progress.incr_stat("throttle", signal)
+    ctx.rate.observe(url, signal)
+    return links[:ctx.max_results] if ctx.max_results else links
 
-        tasks[task_id].message = f"Scanning {keyword}..."
-        
-        # FASTER SCROLLING
-        try:
-            scrollable_div = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div[role="feed"]')))
-            for s in range(15): # Balanced for Render: 15 scrolls give enough results quickly
-                driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", scrollable_div)
-                time.sleep(1.5)
-                # Small progress boost
-                tasks[task_id].progress = int(start_prog + (end_prog - start_prog) * (0.05 + (s/15)*0.10))
-        except: pass
-
-        business_card_selector = 'a.hfpxzc, a[href*="/maps/place/"]'
-        elements = driver.find_elements(By.CSS_SELECTOR, business_card_selector)
-        business_links = list(dict.fromkeys([elem.get_attribute('href') for elem in elements if elem.get_attribute('href')]))
-        
-        total_links = len(business_links)
-        proc_start = start_prog + (end_prog - start_prog) * 0.15
-        proc_range = (end_prog - start_prog) * 0.85
-
-        for i, link in enumerate(business_links):
+def read_feed_html(driver):
+    try:
+        return driver.find_element(By.CSS_SELECTOR, 'div[role="feed"]').get_attribute('outerHTML')
+    except Exception as e:
+        count_error("feed_html", e)
+        return None
+
+def read_field(driver, selector, default, attribute=None):
+    try:
+        element = driver.find_element(By.CSS_SELECTOR, selector)
+        return element.get_attribute(attribute) if attribute else element.text
+    except NoSuchElementException:
+        return default # the place simply has no such field
+    except Exception as e:
+        count_error("detail_field", e)
+        return default
+
+def check_place(ctx, link, place_id):
+    """
+    What to do with a place link: "skip" (already handled by this task, or stored by a task
+    from before the place cache), "reuse" (read within PLACE_CACHE_TTL; its stored lead is
+    attached to this task here), "refresh" (cached but stale: read it again) or "new".
+    Returns (action, cache entry).
+    """
+    key = place_key(link, place_id)
+    if not ctx.existing_keys.claim("p:" + key):
+        ctx.count_lead("deduped", "skipped_before_visit")
+        return "skip", None
+    entry = ctx.places.get(key)
+    if entry and not ctx.places.is_fresh(entry):
+        return "refresh", entry
+    if entry and ctx.places.reuse(entry):
+        return "reuse", entry
+    if place_id and ctx.dedup.is_known_place(place_id):
+        ctx.count_lead("deduped", "skipped_before_visit")
+        return "skip", None
+    return "new", None
+
+def reuse_place(ctx, entry):
+    ctx.progress.add_leads(1)
+
+def refresh_place(ctx, entry, location, user_country_code, name, address, phone, website):
+    """
+    Re-read a stale cached place; the stored lead is updated in place and attached to this task.
+    Returns None if that lead was deleted, so the caller stores the place as a new lead.
+    """
+    with ctx.timings.span("phone_validation"):
+        fields = {"name": name, "address": address, "phone": validate_and_get_phone(phone, user_country_code), "website": website}
+    if not fields["phone"]:
+        ctx.count_lead("dropped")
+        return False
+    changed = ctx.places.refresh(entry, fields, search_fields(name, location, address))
+    if changed is None:
+        return None
+    if changed:
+        ctx.dedup.add(make_dedup_key(name, address))
+    ctx.progress.add_leads(1)
+    return True
+
+def accept_lead(ctx, keyword, location, user_country, user_country_code, name, address, phone, website, place_id, link):
+    """Validate, dedup and hand a lead to the email stage. Returns True if it was handed off."""
+    with ctx.timings.span("phone_validation"):
+        formatted_phone = validate_and_get_phone(phone, user_country_code)
+    item_key = make_dedup_key(name, address)
+
+    if not formatted_phone:
+        ctx.count_lead("dropped")
+    elif ctx.dedup.is_known(item_key):
+        ctx.count_lead("deduped", "skipped_known_lead")
+    elif ctx.existing_keys.claim(item_key):
+        lead_data = {
+            "name": name, "address": address, "phone": formatted_phone,
+            "website": website, "country": user_country,
+            "keyword": keyword, "city": location, "task_id": ctx.task_id,
+            "dedup_key": item_key, "place_id": place_id,
+            "timestamp": datetime.utcnow(),
+            **search_fields(name, location, address)
+        }
+        if ctx.checkpoint:
+            # The link counts as processed once this lead is written
+            ctx.checkpoint.lead_pending(item_key, link)
+        ctx.places.expect(item_key, place_key(link, place_id), lead_data)
+        # Email fetch + insert happen in the email stage; the browser moves straight on
+        ctx.email_stage.put(lead_data)
+        ctx.count_lead("accepted")
+        return True
+    else:
+        ctx.count_lead("deduped", "claimed_by_other_worker")
+    return False
+
+def scrape_links(links, keyword, location, user_country, user_country_code, ctx, query_idx, counter):
+    """Visit a slice of one query's place links with a single pooled browser."""
+    progress = ctx.progress
+    handed_off = 0
+    with ctx.driver() as driver:
+        wait = WebDriverWait(driver, 10)
+        for link in links:
+            ctx.check_cancelled()
             try:
-                tasks[task_id].progress = min(int(proc_start + (i / total_links) * proc_range), 99)
-                tasks[task_id].message = f"Processing {i+1}/{total_links} for {keyword}"
+                done = counter.next()
+                progress.update(query_idx, 0.15 + 0.85 * (done - 1) / counter.total, f"Processing {done}/{counter.total} for {keyword}")
+
+                # Known place (from an earlier task, or another query of this one): skip the page visit entirely
+                place_id = parse_place_id(link)
+                action, entry = check_place(ctx, link, place_id)
+                if action in ("skip", "reuse"):
+                    if action == "reuse":
+                        reuse_place(ctx, entry)
+                    ctx.link_done(link)
+                    continue
 
-                driver.get(link)
+                signal = ctx.load_page(driver, link)
+                ctx.rate.observe(link, signal)
+                if signal:
+                    # Left unprocessed in the checkpoint, so a resume retries it
+                    continue
                 # Wait for h1 to ensure page load
                 wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'h1')))
                 
                 name = driver.find_element(By.CSS_SELECTOR, 'h1').text
                 
-                try: website = driver.find_element(By.CSS_SELECTOR, 'a[data-item-id="authority"]').get_attribute('href')
-                except: website = "No website"
-                
-                try: address = driver.find_element(By.CSS_SELECTOR, 'button[data-item-id="address"] div.Io6YTe').text
-                except: address = "No address"
-                
-                try: phone = driver.find_element(By.CSS_SELECTOR, 'button[data-item-id^="phone:tel:"] div.Io6YTe').text
-                except: phone = "No phone"
-                
-                formatted_phone = validate_and_get_phone(phone, user_country_code)
-                item_key = f"{name}-{address}"
+                website = read_field(driver, 'a[data-item-id="authority"]', "No website", "href")
+                address = read_field(driver, 'button[data-item-id="address"] div.Io6YTe', "No address")
+                phone = read_field(driver, 'button[data-item-id^="phone:tel:"] div.Io6YTe', "No phone")
                 
-                if formatted_phone and item_key not in existing_keys:
-                    # FAST EMAIL EXTRACTION (NO BROWSER TAB)
-                    email = fast_extract_email(website)
-                    
-                    lead_data = {
-                        "name": name, "address": address, "phone": formatted_phone,
-                        "website": website, "email": email, "country": user_country,
-                        "keyword": keyword, "city": location, "task_id": task_id,
-                        "timestamp": datetime.utcnow()
-                    }
-                    
-                    from database import db_sync
-                    db_sync.leads.insert_one(lead_data)
-                    existing_keys.add(item_key)
-                    tasks[task_id].leads_found += 1
+                if action == "refresh" and refresh_place(ctx, entry, location, user_country_code, name, address, phone, website) is not None:
+                    ctx.link_done(link)
+                elif accept_lead(ctx, keyword, location, user_country, user_country_code, name, address, phone, website, place_id, link):
+                    handed_off += 1
+                else:
+                    ctx.link_done(link)
                 
-            except: pass
+            except Exception as e:
+                ctx.error("detail_page", e)
+    return handed_off
 
-        return len(business_links)
-    finally:
-        if driver: driver.quit()
+def resolve_from_feed(feed_html, business_links, keyword, location, user_country, user_country_code, ctx):
+    """
+    Turn complete feed cards into leads directly; return the links that still
+    need a detail-page visit (cards missing a required field, or cards the parser missed).
+    """
+    cards = parse_feed_cards(feed_html)
+    if ctx.max_results:
+        cards = cards[:ctx.max_results]
+    detail_links = []
+    from_feed = 0
+    for card in cards:
+        ctx.check_cancelled()
+        if not is_complete(card):
+            detail_links.append(card["link"])
+            continue
+        from_feed += 1
+        website = card["website"] or "No website"
+        action, entry = check_place(ctx, card["link"], card["place_id"])
+        handed_off = False
+        if action == "reuse":
+            reuse_place(ctx, entry)
+        elif action == "refresh" and refresh_place(ctx, entry, location, user_country_code, card["name"], card["address"], card["phone"], website) is not None:
+            pass # the card has everything needed to compare against the cached copy
+        elif action in ("new", "refresh"): # refresh falls through here when the cached lead was deleted
+            handed_off = accept_lead(ctx, keyword, location, user_country, user_country_code,
+                                     card["name"], card["address"], card["phone"], website, card["place_id"], card["link"])
+        if not handed_off:
+            ctx.link_done(card["link"])
 
-def run_scraper_task(task_id, keywords, locations):
-    from main import tasks 
-    from database import db_sync 
+    parsed = {card["link"] for card in cards}
+    detail_links += [link for link in business_links if link not in parsed]
+
+    ctx.progress.incr_stat("feed", "from_feed", from_feed)
+    ctx.progress.incr_stat("feed", "detail_fetches", len(detail_links))
+    return detail_links
+
+def find_and_save_dynamically(keyword, location, user_country, user_country_code, ctx, query_idx=0):
+    search_query = f"{keyword} in {location}".replace(" ", "+")
+    url = f"{MAPS_BASE_URL}/search/{search_query}" 
+
+    remaining = ctx.checkpoint.links_for(query_idx) if ctx.checkpoint else None
+    if remaining is not None:
+        # Resumed task: this query was already scrolled, only its unprocessed links are left
+        business_links = detail_links = remaining
+        ctx.places.prefetch([place_key(link, parse_place_id(link)) for link in remaining])
+        ctx.progress.incr_stat("checkpoint", "links_resumed", len(remaining))
+    else:
+        # Browsers come from the shared pool: warm, reset between queries, recycled after N uses
+        with ctx.driver() as driver:
+            business_links = collect_business_links(driver, url, keyword, ctx, query_idx)
+            feed_html = read_feed_html(driver) if ctx.extraction_mode == "feed" else None
+
+        ctx.places.prefetch([place_key(link, parse_place_id(link)) for link in business_links])
+        detail_links = business_links
+        if feed_html:
+            detail_links = resolve_from_feed(feed_html, business_links, keyword, location, user_country, user_country_code, ctx)
+        if ctx.checkpoint:
+            ctx.checkpoint.set_links(query_idx, list(dict.fromkeys(business_links + detail_links)))
+
+    total_links = len(detail_links)
+    counter = _LinkCounter(total_links)
+    args = (keyword, location, user_country, user_country_code, ctx, query_idx, counter)
+
+    # Spread the detail pages over the task's workers, each with its own browser
+    if ctx.detail_executor is None or ctx.workers <= 1 or total_links <= 1:
+        scrape_links(detail_links, *args)
+    else:
+        chunks = [detail_links[w::ctx.workers] for w in range(min(ctx.workers, total_links))]
+        futures = [ctx.detail_executor.submit(scrape_links, chunk, *args) for chunk in chunks]
+        for future in futures:
+            future.result()
+
+    ctx.progress.update(query_idx, 1.0)
+    ctx.progress.set_stats("places", ctx.places.stats())
+    ctx.progress.set_stats("browser", ctx.browser.report())
+    ctx.report_timings()
+    if ctx.checkpoint:
+        ctx.checkpoint.query_finished(query_idx)
+    return len(business_links)
+
+def _run_query(keyword, location, ctx, query_idx):
+    ctx.check_cancelled()
+    user_country, user_country_code = get_country_for_location(location, ctx.progress)
+    return find_and_save_dynamically(keyword, location, user_country, user_country_code, ctx, query_idx)
+
+def checkpoint_request(keywords, locations, parallel_count, extraction_mode, max_results):
+    return {
+        "keywords": keywords, "locations": locations, "parallel_count": parallel_count,
+        "extraction_mode": extraction_mode, "max_results": max_results,
+    }
+
+def run_scraper_unit(unit, progress, cancel_event=None):
+    """
+    One (keyword, location) of a distributed job, for worker.py. Shares the job's checkpoint
+    with the other workers, so a unit picked up after an expired lease skips the links its
+    previous worker already handled. Raises TaskCancelled if cancel_event is set mid-way.
+    """
+    request = unit["request"]
+    task_id, query_idx = unit["task_id"], unit["query_idx"]
+    checkpoint = TaskCheckpoint.open(db_sync.task_checkpoints, task_id, checkpoint_request(
+        request["keywords"], request["locations"], request["parallel_count"], request["extraction_mode"], request["max_results"],
+    ))
+    if query_idx in checkpoint.done:
+        return
+    workers = max(1, min(request["parallel_count"] or 1, get_driver_pool().size))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detail") as detail_executor:
+        ctx = ScrapeContext(task_id, unit["num_queries"], workers, detail_executor, request["extraction_mode"],
+                            request["max_results"], cancel_event, checkpoint, progress=progress)
+        try:
+            _run_query(unit["keyword"], unit["location"], ctx, query_idx)
+        finally:
+            ctx.close()
+
+def run_scraper_task(task_id, keywords, locations, parallel_count=1, extraction_mode="feed", max_results=None, cancel_event=None):
+    store = get_task_store()
     
     try:
-        existing_keys = set()
-        num_queries = len(keywords) * len(locations)
-        query_weight = 100 / num_queries if num_queries > 0 else 100
-        
-        for idx, kw in enumerate(keywords):
-            for loc in locations:
-                start_prog = idx * query_weight
-                end_prog = (idx + 1) * query_weight
-                
-                user_country, user_country_code = get_country_for_location(loc)
-                find_and_save_dynamically(kw, loc, user_country, user_country_code, existing_keys, task_id, start_prog, end_prog)
+        queries = [(kw, loc) for kw in keywords for loc in locations]
+        # Picks up a previous run of this task (see POST /scrape/{task_id}/resume), or starts a new checkpoint
+        checkpoint = TaskCheckpoint.open(db_sync.task_checkpoints, task_id, checkpoint_request(
+            keywords, locations, parallel_count, extraction_mode, max_results,
+        ))
+
+        # parallel_count = browsers working for this task at once (capped by the driver pool)
+        workers = max(1, min(parallel_count or 1, get_driver_pool().size))
+
+        # Queries scroll the feed, detail workers visit place pages. Separate executors so a
+        # query waiting on its detail pages never starves the workers it is waiting for.
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detail") as detail_executor:
+            ctx = ScrapeContext(task_id, len(queries), workers, detail_executor, extraction_mode, max_results, cancel_event, checkpoint)
+            for idx in checkpoint.done:
+                ctx.progress.update(idx, 1.0)
+            if checkpoint.resumed:
+                ctx.progress.set_stats("checkpoint", {"queries_skipped": len(checkpoint.done), "links_skipped": len(checkpoint.processed)})
+            try:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query") as query_executor:
+                    futures = [
+                        query_executor.submit(_run_query, kw, loc, ctx, idx)
+                        for idx, (kw, loc) in enumerate(queries)
+                        if idx not in checkpoint.done
+                    ]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except Exception:
+                        for future in futures:
+                            future.cancel()
+                        raise
+            finally:
+                # Leads still waiting on their website fetch or in the write buffer get persisted before we report back
+                ctx.close()
 
-        tasks[task_id].status = "completed"
-        tasks[task_id].progress = 100
-        tasks[task_id].message = f"Collection Optimized! Found {tasks[task_id].leads_found} leads."
+        leads_found = store.get(task_id).leads_found
+        store.update(task_id, status="completed", progress=100, message=f"Collection Optimized! Found {leads_found} leads.")
+        try:
+            checkpoint.delete()
+        except Exception as e:
+            count_error("checkpoint", e)
+    except TaskCancelled:
+        leads_found = store.get(task_id).leads_found
+        store.update(task_id, status="cancelled", message=f"Cancelled. Kept {leads_found} leads collected so far.")
+    except Exception as e:
+        store.update(task_id, status="failed", message=f"Error: {str(e)}")
+
+    try:
+        final = store.get(task_id)
+        inc("scraper_tasks_total", status=final.status)
+        record_task_outcome(db_sync.lead_stats, task_id, final.status, final.leads_found)
     except Exception as e:
-        tasks[task_id].status = "failed"
-        tasks[task_id].message = f"Error: {str(e)}"
+        count_error("lead_stats", e)
@@ -0,0 +1,68 @@
+import time
+from collections import namedtuple
+
+# Results-feed scrolling shared by the API engine and the SCRAPER CLI.
+# Instead of sleeping a fixed time per scroll we poll the DOM until new cards
+# show up, and stop as soon as the end-of-list marker appears, the feed stops
+# growing, or enough cards are loaded. Only needs a WebDriver, no Selenium imports.
+LEGACY_SCROLL_SECONDS = 15 * 1.5  # what the old fixed loop spent on every query
+
+END_MARKER_JS = """
+const feed = arguments[0];
+if (feed.querySelector('span.HlvSq, div.PbZDve')) return true;
+return (feed.innerText || '').toLowerCase().includes("reached the end of the list");
+"""
+FEED_STATE_JS = "return [arguments[0].querySelectorAll(arguments[1]).length, arguments[0].scrollHeight];"
+SCROLL_JS = "arguments[0].scrollTop = arguments[0].scrollHeight"
+
+# reason: "end_of_list", "max_results", "stalled" or "max_scrolls"
+ScrollResult = namedtuple("ScrollResult", ["card_count", "scrolls", "elapsed", "reason"])
+
+
+def _feed_state(driver, feed, card_selector):
+    count, height = driver.execute_script(FEED_STATE_JS, feed, card_selector)
+    return int(count), int(height)
+
+
+def scroll_feed(driver, feed, card_selector, max_results=None, poll_interval=0.25,
+                stall_timeout=3.0, max_scrolls=200, on_scroll=None):
+    """
+    Scroll `feed` until it is exhausted or `max_results` cards are loaded.
+    on_scroll(card_count, scrolls) is called after every scroll, e.g. for progress updates.
+    """
+    start = time.monotonic()
+    count, height = _feed_state(driver, feed, card_selector)
+    scrolls = 0
+    reason = "max_scrolls"
+
+    while scrolls < max_scrolls:
+        if max_results and count >= max_results:
+            reason = "max_results"
+            break
+        if driver.execute_script(END_MARKER_JS, feed):
+            reason = "end_of_list"
+            break
+
+        driver.execute_script(SCROLL_JS, feed)
+        scrolls += 1
+
+        # Short poll for the feed to grow instead of a fixed sleep
+        deadline = time.monotonic() + stall_timeout
+        grew = False
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            new_count, new_height = _feed_state(driver, feed, card_selector)
+            if new_count != count or new_height != height:
+                count, height = new_count, new_height
+                grew = True
+                break
+            if driver.execute_script(END_MARKER_JS, feed):
+                break
+
+        if on_scroll:
+            on_scroll(count, scrolls)
+        if not grew:
+            reason = "end_of_list" if driver.execute_script(END_MARKER_JS, feed) else "stalled"
+            break
+
+    return ScrollResult(count, scrolls, time.monotonic() - start, reason)
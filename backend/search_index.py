@@ -0,0 +1,73 @@
+from pymongo import UpdateOne
+from text_norm import fold, clean
+
+# Precomputed search fields written with every lead, so /leads/all?search= is an
+# indexed lookup on a multikey field instead of three unanchored $regex scans.
+#   search_tokens: every prefix (MIN..MAX chars) of every word in name, city and address
+#   name_words:    whole words of the name, used to rank name matches first
+#   search_v:      SEARCH_VERSION the fields were built with; bump it when words() changes
+#                  and the startup backfill rebuilds every lead built with another version
+MIN_PREFIX = 2
+MAX_PREFIX = 20
+SEARCH_VERSION = 2 # 1: ASCII-only words()
+
+
+def words(text):
+    # Same folding as dedup keys, so names in any script are searchable
+    return clean(fold(text)).replace("_", " ").split()
+
+
+def edge_ngrams(word):
+    return [word[:n] for n in range(MIN_PREFIX, min(len(word), MAX_PREFIX) + 1)]
+
+
+def search_fields(name, city, address):
+    tokens = set()
+    for field in (name, city, address):
+        for word in words(field):
+            tokens.update(edge_ngrams(word))
+    return {"search_tokens": sorted(tokens), "name_words": sorted(set(words(name))), "search_v": SEARCH_VERSION}
+
+
+def parse_search(query):
+    """'Caf  MG-Ro' -> ['caf', 'mg', 'ro']. Terms shorter than MIN_PREFIX are dropped."""
+    terms = [w[:MAX_PREFIX] for w in words(query) if len(w) >= MIN_PREFIX]
+    return list(dict.fromkeys(terms))
+
+
+def relevance_pipeline(match, terms, skip, limit):
+    """Name word hits first, then any prefix hit, newest first within a score."""
+    return [
+        {"$match": match},
+        {"$addFields": {"_score": {"$size": {"$setIntersection": [{"$ifNull": ["$name_words", []]}, terms]}}}},
+        {"$sort": {"_score": -1, "timestamp": -1, "_id": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {"_score": 0}},
+    ]
+
+
+def backfill_search_fields(collection, batch_size=1000):
+    """(Re)build search fields on leads stored without them or by an older tokenizer. Safe to re-run."""
+    updated = 0
+    ops = []
+    cursor = collection.find({"search_v": {"$ne": SEARCH_VERSION}}, {"name": 1, "city": 1, "address": 1}).batch_size(batch_size)
+    for doc in cursor:
+        fields = search_fields(doc.get("name"), doc.get("city"), doc.get("address"))
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += collection.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+def backfill_search_index():
+    try:
+        from database import db_sync
+        count = backfill_search_fields(db_sync.leads)
+        if count:
+            print(f"✅ Search fields backfilled on {count} leads")
+    except Exception as e:
+        print(f"❌ Could not backfill search fields: {e}")
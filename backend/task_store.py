@@ -0,0 +1,234 @@
+import os
+import time
+import uuid
+import socket
+import threading
+from models import ScrapeStatus
+from instrumentation import count_error
+
+# Where ScrapeStatus lives. "memory" keeps the old single-process behaviour,
+# "mongo" persists (throttled) to a collection so any API worker can serve
+# /status and tasks survive a restart.
+TASK_STORE = os.getenv("TASK_STORE", "memory")
+TASK_STORE_WRITE_INTERVAL = float(os.getenv("TASK_STORE_WRITE_INTERVAL", "2.0"))
+TASK_STALE_SECONDS = float(os.getenv("TASK_STALE_SECONDS", "120"))
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class InMemoryTaskStore:
+    """Task state for this process only (the old main.tasks dict, behind a lock)."""
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.RLock()
+
+    def create(self, status):
+        with self._lock:
+            self._tasks[status.task_id] = status
+        return status
+
+    def owns(self, task_id):
+        with self._lock:
+            return task_id in self._tasks
+
+    def get(self, task_id):
+        with self._lock:
+            status = self._tasks.get(task_id)
+            return status.model_copy(deep=True) if status else None
+
+    def mutate(self, task_id, fn):
+        """Apply fn(status) atomically to a task owned by this process."""
+        with self._lock:
+            status = self._tasks[task_id]
+            before = status.status
+            fn(status)
+        self._changed(status, status_changed=before != status.status)
+        return status
+
+    def adopt(self, task_id):
+        """Make sure this process holds the task before mutating it (no-op in memory)."""
+        return self.owns(task_id)
+
+    def update(self, task_id, **fields):
+        def apply(status):
+            for name, value in fields.items():
+                setattr(status, name, value)
+        return self.mutate(task_id, apply)
+
+    def release(self, task_id):
+        """Stop writing this task from here; someone else (worker.py processes) owns it now. No-op in memory."""
+
+    def _changed(self, status, status_changed):
+        pass
+
+    def close(self):
+        pass
+
+
+class MongoTaskStore(InMemoryTaskStore):
+    """
+    Tasks run by this process are kept in memory and written through to Mongo
+    at most once per `write_interval` (status transitions are written at once).
+    Reads for tasks owned by another worker go to Mongo.
+
+    The document's `owner` is the process running the task: adopt() takes it over,
+    and a process that finds another owner on the document drops its own copy
+    instead of writing over the other's progress.
+    """
+
+    def __init__(self, collection, write_interval=TASK_STORE_WRITE_INTERVAL, stale_after=TASK_STALE_SECONDS):
+        super().__init__()
+        self.collection = collection
+        self.write_interval = write_interval
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}" # one per store, even within a process
+        self._dirty = set()
+        self._last_write = {}
+        self._write_lock = threading.Lock() # keeps snapshots from landing out of order
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="task-store", daemon=True)
+        self._flusher.start()
+
+    def _doc(self, status):
+        doc = status.model_dump()
+        doc["owner"] = self.owner
+        doc["updated_at"] = doc["heartbeat_at"] = time.time()
+        return doc
+
+    def _write(self, task_id):
+        from pymongo.errors import DuplicateKeyError
+        with self._write_lock:
+            with self._lock:
+                status = self._tasks.get(task_id)
+                if status is None:
+                    return
+                doc = self._doc(status)
+                self._dirty.discard(task_id)
+                self._last_write[task_id] = doc["updated_at"]
+            try:
+                # Only while nobody else owns it; with another owner the upsert hits the _id instead
+                self.collection.update_one({"_id": task_id, "owner": {"$in": [self.owner, None]}}, {"$set": doc}, upsert=True)
+            except DuplicateKeyError:
+                self._drop(task_id)
+
+    def _heartbeat(self, task_id):
+        # Liveness only: never rewrites the task, and stops once another process owns it
+        now = time.time()
+        result = self.collection.update_one({"_id": task_id, "owner": self.owner}, {"$set": {"heartbeat_at": now}})
+        if result.matched_count:
+            with self._lock:
+                self._last_write[task_id] = now
+        else:
+            self._drop(task_id)
+
+    def _drop(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._dirty.discard(task_id)
+            self._last_write.pop(task_id, None)
+
+    def create(self, status):
+        super().create(status)
+        self._write(status.task_id)
+        return status
+
+    def adopt(self, task_id):
+        # A job queued through another API process is about to run here
+        if self.owns(task_id):
+            return True
+        doc = self.collection.find_one_and_update({"_id": task_id}, {"$set": {"owner": self.owner, "heartbeat_at": time.time()}})
+        if not doc:
+            return False
+        status = ScrapeStatus(**{k: v for k, v in doc.items() if k in ScrapeStatus.model_fields})
+        with self._lock:
+            self._tasks.setdefault(task_id, status)
+        return True
+
+    def release(self, task_id):
+        # Status transitions are written at once, so only unflushed progress can be pending
+        with self._lock:
+            dirty = task_id in self._dirty
+        if dirty:
+            self._write(task_id)
+        self._drop(task_id)
+        self.collection.update_one({"_id": task_id, "owner": self.owner}, {"$set": {"owner": None}})
+
+    def _changed(self, status, status_changed):
+        task_id = status.task_id
+        with self._lock:
+            due = status_changed or time.time() - self._last_write.get(task_id, 0) >= self.write_interval
+            if not due:
+                self._dirty.add(task_id)
+        if due:
+            self._write(task_id)
+
+    def _flush_loop(self):
+        # Throttled writes plus a heartbeat for running tasks, so other workers can spot dead ones
+        while not self._stop.wait(self.write_interval):
+            with self._lock:
+                now = time.time()
+                due = set(self._dirty)
+                beats = [
+                    task_id for task_id, status in self._tasks.items()
+                    if task_id not in due and status.status not in TERMINAL_STATUSES and now - self._last_write.get(task_id, 0) >= self.stale_after / 4
+                ]
+            for task_id in due:
+                try:
+                    self._write(task_id)
+                except Exception as e:
+                    count_error("task_write", e)
+            for task_id in beats:
+                try:
+                    self._heartbeat(task_id)
+                except Exception as e:
+                    count_error("task_heartbeat", e)
+            self._evict_finished()
+
+    def _evict_finished(self):
+        # Finished tasks are served from Mongo after their final write
+        with self._lock:
+            for task_id, status in list(self._tasks.items()):
+                if status.status in TERMINAL_STATUSES and task_id not in self._dirty and time.time() - self._last_write.get(task_id, 0) > 60:
+                    del self._tasks[task_id]
+                    self._last_write.pop(task_id, None)
+
+    def get(self, task_id):
+        local = super().get(task_id)
+        if local:
+            return local
+        doc = self.collection.find_one({"_id": task_id})
+        if not doc:
+            return None
+        # Queued jobs wait in a persistent queue, only running ones can be orphaned
+        if doc.get("status") == "running" and time.time() - max(doc.get("heartbeat_at", 0), doc.get("updated_at", 0)) > self.stale_after:
+            # The worker running it stopped heartbeating (restart, crash)
+            doc["status"] = "failed"
+            doc["message"] = "Task was interrupted: the worker running it stopped responding."
+        return ScrapeStatus(**{k: v for k, v in doc.items() if k in ScrapeStatus.model_fields})
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            pending = list(self._dirty)
+        for task_id in pending:
+            try:
+                self._write(task_id)
+            except Exception as e:
+                count_error("task_write", e)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_task_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if TASK_STORE == "mongo":
+                from database import db_sync
+                _store = MongoTaskStore(db_sync.tasks)
+            else:
+                _store = InMemoryTaskStore()
+        return _store
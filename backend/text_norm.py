@@ -0,0 +1,27 @@
+import unicodedata
+
+# Case- and accent-insensitive text folding shared by dedup keys, search tokens and the
+# geocoding cache. Works for every script. Combining marks are dropped where they are
+# optional accents (Latin "Café" == "cafe", Arabic/Hebrew vowel points) and kept where they
+# are part of the letter (Devanagari vowel signs, Cyrillic "й").
+def _optional_marks(base):
+    return base < "\u0250" or "\u0590" <= base <= "\u08ff" # Latin up to Extended-B; Hebrew, Arabic
+
+
+def fold(text):
+    """'  Café ROMA ' -> '  cafe roma ', 'Москва' -> 'москва', 'दुकान' -> 'दुकान'."""
+    decomposed = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", text or "").casefold())
+    kept = []
+    for ch in decomposed:
+        if unicodedata.category(ch) == "Mn" and kept and _optional_marks(kept[-1]):
+            continue
+        kept.append(ch)
+    return unicodedata.normalize("NFKC", "".join(kept))
+
+
+def clean(text):
+    """Punctuation and symbols to spaces; letters, digits, '_' and combining marks (part of letters in many scripts) stay."""
+    return "".join(
+        ch if ch.isalnum() or ch == "_" or ch.isspace() or unicodedata.category(ch).startswith("M") else " "
+        for ch in text
+    )
@@ -0,0 +1,280 @@
+import os
+import time
+import uuid
+import socket
+from task_store import TERMINAL_STATUSES
+
+# Distributed execution (SCRAPE_EXECUTION=workers): POST /scrape splits a job into one
+# document per (keyword, location) in the scrape_units collection and any number of
+# worker processes (worker.py) lease and run them. A lease is held for UNIT_LEASE_SECONDS
+# and extended by heartbeats; a unit whose lease runs out (worker crashed, lost its network)
+# goes back to the queue and its next worker resumes it from the task checkpoint. Workers
+# publish the job's ScrapeStatus, aggregated over its units, to the tasks collection.
+#   queued -> leased -> done | failed | cancelled   (leased -> queued on expiry or shutdown)
+SCRAPE_EXECUTION = os.getenv("SCRAPE_EXECUTION", "local") # "local": API threads, "workers": worker.py processes
+UNIT_LEASE_SECONDS = float(os.getenv("UNIT_LEASE_SECONDS", "60"))
+UNIT_HEARTBEAT_INTERVAL = float(os.getenv("UNIT_HEARTBEAT_INTERVAL", "5"))
+UNIT_MAX_ATTEMPTS = int(os.getenv("UNIT_MAX_ATTEMPTS", "3")) # leases a unit may use up before it fails
+
+UNIT_TERMINAL_STATES = ("done", "failed", "cancelled")
+# Per-unit stats that add up across units; snapshots (writer, email, rate...) stay per worker
+COUNTER_SECTIONS = ("leads", "dedup", "errors", "throttle", "scroll", "feed", "checkpoint")
+
+
+def unit_id(task_id, query_idx):
+    return f"{task_id}:{query_idx}"
+
+
+class UnitQueue:
+    """The scrape_units collection. Every state change is one atomic update on the unit."""
+
+    def __init__(self, collection, lease_seconds=UNIT_LEASE_SECONDS, max_attempts=UNIT_MAX_ATTEMPTS):
+        from pymongo import ReturnDocument
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._return_after = ReturnDocument.AFTER
+
+    def ensure_indexes(self):
+        self.collection.create_index([("state", 1), ("priority", -1), ("seq", 1)])
+        self.collection.create_index([("state", 1), ("lease_until", 1)])
+        self.collection.create_index([("task_id", 1), ("query_idx", 1)])
+
+    def enqueue(self, task_id, request, priority=0, done=()):
+        """Write the job's units; queries in `done` (from a checkpoint) are stored as done. Upserts, so a resume re-queues."""
+        from pymongo import UpdateOne
+        queries = [(keyword, location) for keyword in request["keywords"] for location in request["locations"]]
+        seq = time.time_ns()
+        ops = []
+        for idx, (keyword, location) in enumerate(queries):
+            finished = idx in done
+            ops.append(UpdateOne({"_id": unit_id(task_id, idx)}, {
+                "$set": {
+                    "task_id": task_id, "query_idx": idx, "num_queries": len(queries),
+                    "keyword": keyword, "location": location, "request": request,
+                    "priority": priority, "seq": seq + idx, "state": "done" if finished else "queued",
+                    "progress": 1.0 if finished else 0.0, "attempts": 0, "cancel_requested": False,
+                    "owner": None, "lease": None, "lease_until": None, "error": None,
+                },
+                # Kept across a resume: what earlier runs of the unit already found
+                "$setOnInsert": {"leads_found": 0, "stats": {}, "reclaimed": 0},
+            }, upsert=True))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        return len(queries)
+
+    def claim(self):
+        """Lease the next queued unit (highest priority, oldest job first), or None."""
+        now = time.time()
+        return self.collection.find_one_and_update(
+            {"state": "queued"},
+            {
+                "$set": {"state": "leased", "owner": self.owner, "lease": uuid.uuid4().hex, "lease_until": now + self.lease_seconds, "started_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("seq", 1)],
+            return_document=self._return_after,
+        )
+
+    def reclaim_expired(self):
+        """Re-queue units whose lease ran out (or fail them after max_attempts). Returns the task ids touched."""
+        now = time.time()
+        expired = {"state": "leased", "lease_until": {"$lt": now}}
+        touched = set()
+        for unit in self.collection.find(expired, {"task_id": 1, "attempts": 1, "cancel_requested": 1}):
+            if unit.get("cancel_requested"):
+                update = {"state": "cancelled", "finished_at": now}
+            elif unit.get("attempts", 0) >= self.max_attempts:
+                update = {"state": "failed", "error": f"lease expired {unit['attempts']} times"}
+            else:
+                update = {"state": "queued"}
+            # Same filter again: a heartbeat or another worker's reclaim may have got there first
+            result = self.collection.update_one(
+                {"_id": unit["_id"], **expired},
+                {"$set": {**update, "owner": None, "lease": None, "lease_until": None}, "$inc": {"reclaimed": 1}},
+            )
+            if result.modified_count:
+                touched.add(unit["task_id"])
+        return touched
+
+    def heartbeat(self, unit, **fields):
+        """Extend the lease and store progress. 'ok', 'cancel' (the job is being cancelled) or 'lost'."""
+        doc = self.collection.find_one_and_update(
+            {"_id": unit["_id"], "lease": unit["lease"]},
+            {"$set": {**fields, "lease_until": time.time() + self.lease_seconds}},
+            projection={"cancel_requested": 1},
+        )
+        if doc is None:
+            return "lost"
+        return "cancel" if doc.get("cancel_requested") else "ok"
+
+    def finish(self, unit, state, error=None, **fields):
+        """done / cancelled / failed; a failed unit with attempts left is queued again. False if the lease was lost."""
+        if state == "failed" and unit.get("attempts", 0) < self.max_attempts:
+            state = "queued"
+        update = {**fields, "state": state, "error": error, "owner": None, "lease": None, "lease_until": None}
+        if state in UNIT_TERMINAL_STATES:
+            update["finished_at"] = time.time()
+        if state == "done":
+            update["progress"] = 1.0
+        result = self.collection.update_one({"_id": unit["_id"], "lease": unit["lease"]}, {"$set": update})
+        return result.modified_count == 1
+
+    def release(self, unit, **fields):
+        """Hand a unit back without using up an attempt (the worker is shutting down)."""
+        cancelled = self.collection.update_one(
+            {"_id": unit["_id"], "lease": unit["lease"], "cancel_requested": True},
+            {"$set": {**fields, "state": "cancelled", "owner": None, "lease": None, "lease_until": None, "finished_at": time.time()}},
+        )
+        if cancelled.modified_count:
+            return True
+        result = self.collection.update_one(
+            {"_id": unit["_id"], "lease": unit["lease"]},
+            {"$set": {**fields, "state": "queued", "owner": None, "lease": None, "lease_until": None}, "$inc": {"attempts": -1}},
+        )
+        return result.modified_count == 1
+
+    def cancel(self, task_id):
+        """Cancel queued units, flag leased ones for their workers. (queued cancelled, running flagged)."""
+        queued = self.collection.update_many({"task_id": task_id, "state": "queued"}, {"$set": {"state": "cancelled", "finished_at": time.time()}})
+        running = self.collection.update_many({"task_id": task_id, "state": "leased"}, {"$set": {"cancel_requested": True}})
+        return queued.modified_count, running.modified_count
+
+    def pending(self):
+        """Units queued or leased, in any job."""
+        return self.collection.count_documents({"state": {"$in": ["queued", "leased"]}})
+
+    def is_active(self, task_id):
+        return self.collection.count_documents({"task_id": task_id, "state": {"$in": ["queued", "leased"]}}, limit=1) > 0
+
+    def position(self, task_id):
+        """1-based place of the job among jobs waiting for a worker, or None if none of its units is waiting."""
+        first = self.collection.find_one({"task_id": task_id, "state": "queued"}, {"priority": 1, "seq": 1}, sort=[("priority", -1), ("seq", 1)])
+        if not first:
+            return None
+        ahead = self.collection.distinct("task_id", {"state": "queued", "task_id": {"$ne": task_id}, "$or": [
+            {"priority": {"$gt": first["priority"]}},
+            {"priority": first["priority"], "seq": {"$lt": first["seq"]}},
+        ]})
+        return len(ahead) + 1
+
+    def units(self, task_id):
+        return list(self.collection.find({"task_id": task_id}, {"request": 0}))
+
+
+def _merge_counters(target, source):
+    for name, value in source.items():
+        if isinstance(value, dict):
+            _merge_counters(target.setdefault(name, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            target[name] = round(target.get(name, 0) + value, 2)
+
+
+def _merge_timings(target, report):
+    for stage, numbers in report.items():
+        total = target.setdefault(stage, {"count": 0, "total_s": 0.0, "avg_ms": 0.0, "max_ms": 0.0})
+        total["count"] += numbers.get("count", 0)
+        total["total_s"] = round(total["total_s"] + numbers.get("total_s", 0.0), 3)
+        total["max_ms"] = max(total["max_ms"], numbers.get("max_ms", 0.0))
+        total["avg_ms"] = round(total["total_s"] * 1000 / total["count"], 1) if total["count"] else 0.0
+
+
+def aggregate_units(units):
+    """ScrapeStatus fields for a job from its unit documents, or None for a job without units."""
+    if not units:
+        return None
+    states = {}
+    for unit in units:
+        states[unit["state"]] = states.get(unit["state"], 0) + 1
+    total = len(units)
+    finished = sum(states.get(state, 0) for state in UNIT_TERMINAL_STATES)
+    leads_found = sum(unit.get("leads_found", 0) for unit in units)
+
+    stats = {"units": states, "workers": sorted({unit["owner"] for unit in units if unit.get("owner")})}
+    for unit in units:
+        unit_stats = unit.get("stats") or {}
+        _merge_counters(stats, {name: unit_stats[name] for name in COUNTER_SECTIONS if name in unit_stats})
+        _merge_timings(stats.setdefault("timings", {}), unit_stats.get("timings") or {})
+    reclaimed = sum(unit.get("reclaimed", 0) for unit in units)
+    if reclaimed:
+        stats["units"]["reclaimed"] = reclaimed
+
+    # Each unit owns an equal slice of the bar, as with TaskProgress
+    progress = int(sum(1.0 if unit["state"] == "done" else min(unit.get("progress", 0.0), 1.0) for unit in units) * 100 / total)
+    if finished == total:
+        errors = [unit["error"] for unit in units if unit["state"] == "failed" and unit.get("error")]
+        if states.get("cancelled"):
+            status, message = "cancelled", f"Cancelled. Kept {leads_found} leads collected so far."
+        elif states.get("failed"):
+            status, message = "failed", f"Error: {states['failed']} of {total} queries failed ({errors[0] if errors else 'unknown error'})"
+        else:
+            status, message = "completed", f"Collection Optimized! Found {leads_found} leads."
+        progress = 100 if status == "completed" else progress
+    elif states.get("leased") or finished:
+        status = "running"
+        progress = min(progress, 99)
+        message = f"{finished}/{total} queries done, {states.get('leased', 0)} running on {len(stats['workers'])} workers"
+    else:
+        status, message = "queued", "Queued for a worker..."
+    return {"status": status, "progress": progress, "leads_found": leads_found, "message": message, "stats": stats}
+
+
+def publish_job_status(units, tasks, task_id):
+    """
+    Write the job's aggregated status to the tasks collection. Every worker may call this;
+    a job that already reached a final status is never rewritten, so exactly one caller
+    gets True back when the job finishes (and records its outcome).
+    """
+    fields = aggregate_units(units.units(task_id))
+    if fields is None:
+        return False
+    result = tasks.update_one(
+        {"_id": task_id, "status": {"$nin": list(TERMINAL_STATUSES)}},
+        {"$set": {**fields, "queue_position": None, "owner": "workers", "updated_at": time.time()}},
+    )
+    return fields["status"] in TERMINAL_STATUSES and result.modified_count == 1
+
+
+class WorkerDispatch:
+    """
+    JobScheduler stand-in for the API with SCRAPE_EXECUTION=workers: jobs are only split
+    into units here, worker.py processes run them. Needs TASK_STORE=mongo.
+    """
+
+    blocked_reason = None
+
+    def __init__(self, units, store, tasks, checkpoints):
+        self.units = units
+        self.store = store
+        self.tasks = tasks
+        self.checkpoints = checkpoints
+
+    def start(self):
+        self.units.ensure_indexes()
+
+    def stop(self):
+        pass
+
+    def submit(self, task_id, request, priority=0):
+        # Workers write this task's status from now on; released before the units exist, so
+        # a pending write from this process can never land on top of a worker's first publish
+        self.store.release(task_id)
+        # A resumed job skips the queries its checkpoint has as done
+        saved = self.checkpoints.find_one({"_id": task_id}, {"done": 1}) or {}
+        self.units.enqueue(task_id, request, priority, done=set(saved.get("done", [])))
+
+    def position(self, task_id):
+        return self.units.position(task_id)
+
+    def is_active(self, task_id):
+        return self.units.is_active(task_id)
+
+    def cancel(self, task_id):
+        """'running' if workers were asked to stop; None once every unit is stopped (the published status says cancelled)."""
+        queued, running = self.units.cancel(task_id)
+        if running:
+            return "running"
+        if queued:
+            publish_job_status(self.units, self.tasks, task_id)
+        return None
@@ -0,0 +1,219 @@
+"""
+Standalone scrape worker for SCRAPE_EXECUTION=workers (see work_queue.py). Start the API
+with TASK_STORE=mongo SCRAPE_EXECUTION=workers, then any number of these, on any machine
+that reaches the same Mongo:
+
+    python worker.py                  # run until SIGTERM / Ctrl+C
+    python worker.py --units 2        # two units at once in this process
+    python worker.py --exit-when-idle # stop once every unit is finished (local runs, batch jobs)
+
+On SIGTERM the worker stops its units at their next checkpoint and hands them back to the
+queue; a worker that dies without doing so loses its leases after UNIT_LEASE_SECONDS.
+"""
+import os
+import sys
+import signal
+import argparse
+import threading
+from database import db_sync
+from models import ScrapeStatus
+from task_store import InMemoryTaskStore
+from scheduler import admission_check
+from dedup import warm_dedup_index
+from lead_writer import flush_all_writers
+from lead_stats import record_task_outcome
+from instrumentation import count_error, inc
+from scraper_engine import TaskProgress, TaskCancelled, run_scraper_unit
+from work_queue import UnitQueue, publish_job_status, UNIT_HEARTBEAT_INTERVAL
+
+WORKER_UNITS = int(os.getenv("WORKER_UNITS", "1")) # units this process runs at once
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+
+
+class UnitRun:
+    """One leased unit: its local progress, and the heartbeat that keeps the lease alive."""
+
+    def __init__(self, units, unit):
+        self.units = units
+        self.unit = unit
+        self.cancel_event = threading.Event()
+        self.interrupted = None # why cancel_event was set: "cancel", "lost" or "stopping"
+        # Engine progress goes to a private store; the heartbeat copies it into the unit
+        self.store = InMemoryTaskStore()
+        self.store.create(ScrapeStatus(
+            task_id=unit["task_id"], status="running", progress=0,
+            leads_found=unit.get("leads_found", 0), stats=unit.get("stats") or {},
+        ))
+        self.progress = TaskProgress(unit["task_id"], unit["num_queries"], store=self.store)
+        self._done = threading.Event()
+
+    def interrupt(self, reason):
+        if self.interrupted is None:
+            self.interrupted = reason
+        self.cancel_event.set()
+
+    def fields(self):
+        status = self.store.get(self.unit["task_id"])
+        return {"progress": self.progress.fraction(self.unit["query_idx"]), "leads_found": status.leads_found, "stats": status.stats}
+
+    def heartbeat_loop(self, on_beat):
+        while not self._done.wait(UNIT_HEARTBEAT_INTERVAL):
+            try:
+                outcome = self.units.heartbeat(self.unit, **self.fields())
+            except Exception as e:
+                # Keep going: the lease has UNIT_LEASE_SECONDS of slack for a flaky connection
+                count_error("unit_heartbeat", e)
+                continue
+            if outcome != "ok":
+                self.interrupt(outcome)
+            on_beat(self.unit["task_id"])
+
+    def stop_heartbeat(self):
+        self._done.set()
+
+
+class Worker:
+    def __init__(self, units, tasks, max_units=WORKER_UNITS, exit_when_idle=False):
+        self.units = units
+        self.tasks = tasks
+        self.max_units = max(1, max_units)
+        self.exit_when_idle = exit_when_idle
+        self.stats = {"claimed": 0, "done": 0, "failed": 0, "cancelled": 0, "released": 0, "lost": 0, "reclaimed_jobs": 0}
+        self._slots = threading.Semaphore(self.max_units)
+        self._runs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for run in self._runs.values():
+                run.interrupt("stopping")
+
+    def run(self):
+        self.units.ensure_indexes()
+        threads = []
+        while not self._stop.is_set():
+            try:
+                for task_id in self.units.reclaim_expired():
+                    self.stats["reclaimed_jobs"] += 1
+                    self.publish(task_id)
+            except Exception as e:
+                count_error("unit_reclaim", e)
+
+            if not self._slots.acquire(timeout=WORKER_POLL_INTERVAL):
+                continue
+            ok, reason = admission_check()
+            unit = None
+            if ok:
+                try:
+                    unit = self.units.claim()
+                except Exception as e:
+                    count_error("unit_claim", e)
+            if unit is None:
+                self._slots.release()
+                if ok and self.exit_when_idle and self._drained():
+                    break
+                self._stop.wait(WORKER_POLL_INTERVAL)
+                continue
+
+            self.stats["claimed"] += 1
+            run = UnitRun(self.units, unit)
+            with self._lock:
+                self._runs[unit["_id"]] = run
+                if self._stop.is_set():
+                    run.interrupt("stopping")
+            thread = threading.Thread(target=self._run, args=(run,), name=f"unit-{unit['query_idx']}-{unit['task_id'][:8]}")
+            thread.start()
+            threads.append(thread)
+            threads = [t for t in threads if t.is_alive()]
+        for thread in threads:
+            thread.join()
+
+    def _drained(self):
+        # Units leased by other workers may still expire and come back, so wait for those too
+        with self._lock:
+            if self._runs:
+                return False
+        try:
+            return self.units.pending() == 0
+        except Exception as e:
+            count_error("unit_claim", e)
+            return False
+
+    def _run(self, run):
+        unit = run.unit
+        heartbeat = threading.Thread(target=run.heartbeat_loop, args=(self.publish,), name=f"heartbeat-{unit['query_idx']}", daemon=True)
+        heartbeat.start()
+        state, error = "done", None
+        try:
+            self.publish(unit["task_id"]) # queued -> running as soon as the first unit starts
+            run_scraper_unit(unit, run.progress, run.cancel_event)
+        except TaskCancelled:
+            state = "cancelled"
+        except Exception as e:
+            count_error("unit", e)
+            state, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            run.stop_heartbeat()
+            heartbeat.join()
+            try:
+                self._settle(run, state, error)
+            except Exception as e:
+                count_error("unit_finish", e)
+            with self._lock:
+                self._runs.pop(unit["_id"], None)
+            self._slots.release()
+
+    def _settle(self, run, state, error):
+        unit = run.unit
+        if run.interrupted == "lost":
+            # Another worker holds the unit now; its results are not ours to write
+            self.stats["lost"] += 1
+            return
+        if run.interrupted == "stopping" and state == "cancelled":
+            self.units.release(unit, **run.fields())
+            self.stats["released"] += 1
+        else:
+            self.units.finish(unit, state, error, **run.fields())
+            self.stats[state] += 1
+        self.publish(unit["task_id"])
+
+    def publish(self, task_id):
+        try:
+            if publish_job_status(self.units, self.tasks, task_id):
+                self.finalize(task_id)
+        except Exception as e:
+            count_error("job_status", e)
+
+    def finalize(self, task_id):
+        """Called once per job, by whichever worker saw it finish."""
+        final = self.tasks.find_one({"_id": task_id}, {"status": 1, "leads_found": 1})
+        inc("scraper_tasks_total", status=final["status"])
+        record_task_outcome(db_sync.lead_stats, task_id, final["status"], final.get("leads_found", 0))
+        if final["status"] == "completed":
+            db_sync.task_checkpoints.delete_one({"_id": task_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scrape units from the shared Mongo queue")
+    parser.add_argument("--units", type=int, default=WORKER_UNITS, help="units to run at once in this process")
+    parser.add_argument("--exit-when-idle", action="store_true", help="stop once no unit is queued or leased anywhere")
+    args = parser.parse_args()
+
+    worker = Worker(UnitQueue(db_sync.scrape_units), db_sync.tasks, args.units, exit_when_idle=args.exit_when_idle)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+    threading.Thread(target=warm_dedup_index, daemon=True).start()
+    print(f"👷 Worker {worker.units.owner} waiting for units ({worker.max_units} at a time)")
+    try:
+        worker.run()
+    finally:
+        flush_all_writers()
+        if "driver_pool" in sys.modules:
+            sys.modules["driver_pool"].shutdown_driver_pool()
+    print(f"👷 Worker {worker.units.owner} stopped: {worker.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Normalization check for dedup keys and search tokens, across scripts.
+
+    python benchmarks/check_text_keys.py
+
+Exits 1 (listing the failures) if two distinct names collapse into one key, if
+spellings that should match (case, accents, width) do not, or if a search for a
+word of a lead's name does not find it.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from dedup import make_dedup_key
+from search_index import search_fields, parse_search
+
+# (name, address) pairs that must all get different keys
+DISTINCT = [
+    ("مطعم الشام", "شارع الملك فهد"),
+    ("مخبز النور", "شارع الملك فهد"),
+    ("शर्मा डेंटल क्लिनिक", "एमजी रोड"),
+    ("शरमा डेंटल क्लिनिक", "एमजी रोड"), # vowel signs are letters, not accents
+    ("गुप्ता स्वीट्स", "एमजी रोड"),
+    ("Кафе Пушкин", "Тверской бульвар, 26"),
+    ("Чайковский", "Невский проспект, 1"),
+    ("Чаиковскии", "Невский проспект, 1"),
+    ("Стоматология Улыбка", "Тверской бульвар, 26"),
+    ("すし処 銀座", "東京都中央区銀座1-2-3"),
+    ("ラーメン 一蘭", "東京都中央区銀座1-2-3"),
+    ("Café Roma", "MG Road"),
+]
+
+# Spellings that must share a key
+SAME = [
+    (("Café  Roma!", "MG Road,"), ("CAFE ROMA", "mg road")),
+    (("Ｃａｆｅ Ｒｏｍａ", "MG Road"), ("cafe roma", "mg road")),
+    (("Straße Bäckerei", "Hauptstraße 1"), ("STRASSE BACKEREI", "hauptstrasse 1")),
+    (("مَطعم الشام", "شارع الملك فهد"), ("مطعم الشام", "شارع الملك فهد")), # optional vowel points
+    (("Кафе  Пушкин", "Тверской бульвар, 26"), ("КАФЕ ПУШКИН", "тверской бульвар 26")),
+]
+
+
+def main():
+    failures = []
+    keys = {}
+    for name, address in DISTINCT:
+        key = make_dedup_key(name, address)
+        if key in keys or key.strip("| ") == "":
+            failures.append(f"{name!r} -> {key!r} (same as {keys.get(key)!r})")
+        keys[key] = name
+    for left, right in SAME:
+        if make_dedup_key(*left) != make_dedup_key(*right):
+            failures.append(f"{left!r} -> {make_dedup_key(*left)!r} but {right!r} -> {make_dedup_key(*right)!r}")
+    for name, address in DISTINCT:
+        tokens = set(search_fields(name, "", address)["search_tokens"])
+        for term in parse_search(name.split()[0]):
+            if term not in tokens:
+                failures.append(f"search {term!r} does not find {name!r}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+import time
+import html
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+# Local stand-in for Google Maps and the business websites it links to.
+#   /maps/search/<query>   results feed that loads cards in batches as it is scrolled
+#   /maps/place/<slug>/... place page with the selectors both scrapers read
+#   /site/<id>/            business homepage (padded to page_kb), email on it or on /contact-us
+# Everything is generated from the query text, so runs are repeatable.
+
+SEARCH_PAGE = """<!doctype html><html><head><title>{title}</title></head><body>
+<button onclick="this.remove()">Reject all</button>
+<div role="feed" id="feed" style="height:600px;overflow-y:scroll"></div>
+<script>
+const cards = {cards};
+const BATCH = {batch}, DELAY = {delay};
+const feed = document.getElementById("feed");
+let shown = 0, loading = false;
+function more() {{
+  const end = Math.min(shown + BATCH, cards.length);
+  feed.insertAdjacentHTML("beforeend", cards.slice(shown, end).join(""));
+  shown = end;
+  if (shown >= cards.length) feed.insertAdjacentHTML("beforeend", '<span class="HlvSq">You\\'ve reached the end of the list.</span>');
+  loading = false;
+}}
+more();
+feed.addEventListener("scroll", () => {{
+  if (loading || shown >= cards.length) return;
+  if (feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 50) {{ loading = true; setTimeout(more, DELAY); }}
+}});
+</script></body></html>"""
+
+CARD = (
+    '<div class="Nv2PK" style="height:90px">'
+    '<a class="hfpxzc" aria-label="{name}" href="{href}"></a>'
+    '<div class="qBF1Pd fontHeadlineSmall">{name}</div>'
+    '<div class="W4Efsd"><div class="W4Efsd"><span>{category}</span> · <span>{address}</span></div>'
+    '<div class="W4Efsd"><span>Open 24 hours</span>{phone_html}</div></div>'
+    '<a class="lcr4fd" data-value="Website" href="{website}"></a>'
+    '</div>'
+)
+
+PLACE_PAGE = """<!doctype html><html><body>
+<h1 class="DUwDvf fontHeadlineLarge">{name}</h1>
+<a data-item-id="authority" href="{website}">Website</a>
+<button data-item-id="address"><div class="Io6YTe">{address}</div></button>
+<button data-item-id="phone:tel:{digits}"><div class="Io6YTe">{phone}</div></button>
+<div style="display:none">{padding}</div>
+</body></html>"""
+
+SITE_PAGE = """<!doctype html><html><body>
+<h1>{name}</h1><a href="/site/{site_id}/contact-us">Contact</a>
+<div>{padding}</div>
+{footer}
+</body></html>"""
+
+
+class FixtureConfig:
+    def __init__(self, places=40, detail_ratio=0.2, latency_ms=30, jitter_ms=10, page_kb=150,
+                 email_ratio=0.7, contact_ratio=0.3, batch=20, scroll_delay_ms=150, seed=7):
+        self.places = places # result cards per search
+        self.detail_ratio = detail_ratio # cards without a phone, so they need a place page visit
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.page_kb = page_kb # size of place pages and business homepages
+        self.email_ratio = email_ratio # sites that show an email at all
+        self.contact_ratio = contact_ratio # of those, the share that only show it on /contact-us
+        self.batch = batch # cards added per scroll
+        self.scroll_delay_ms = scroll_delay_ms
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _padding(kb):
+    return ("lorem ipsum dolor sit amet " * 40 + "\n") * max(1, kb * 1024 // 1100)
+
+
+class Fixtures:
+    """Deterministic places for a query: the same query always yields the same businesses."""
+
+    def __init__(self, config, base_url):
+        self.config = config
+        self.base_url = base_url
+
+    def places(self, query):
+        query_id = zlib.crc32(query.encode()) % 100000
+        rng = random.Random(self.config.seed * 1000003 + query_id)
+        text = query.replace("+", " ")
+        keyword = text.split(" in ")[0].strip() or "business"
+        location = text.split(" in ")[-1].split(",")[0].strip().title()
+        result = []
+        for i in range(self.config.places):
+            site_id = f"{query_id}-{i}"
+            result.append({
+                "name": f"{keyword.title()} {location} {i + 1}",
+                "address": f"{i + 1} Bench Road, {location}",
+                "phone": f"+91 98{(query_id * 1000 + i) % 10**8:08d}",
+                "category": keyword.title(),
+                "website": f"{self.base_url}/site/{site_id}/",
+                "site_id": site_id,
+                "place_hex": f"0x{query_id:x}{i:04x}:0x{rng.getrandbits(48):x}",
+                "in_feed": rng.random() >= self.config.detail_ratio,
+            })
+        return result
+
+    def place_href(self, place):
+        slug = place["name"].replace(" ", "+")
+        return f"{self.base_url}/maps/place/{slug}/data=!4m7!3m6!1s{place['place_hex']}!8m2!3d0!4d0?q={place['site_id']}"
+
+    def search_page(self, query):
+        cards = []
+        for place in self.places(query):
+            phone_html = f' · <span class="UsdlK">{html.escape(place["phone"])}</span>' if place["in_feed"] else ""
+            cards.append(CARD.format(
+                name=html.escape(place["name"]), href=html.escape(self.place_href(place)),
+                category=place["category"], address=html.escape(place["address"]),
+                phone_html=phone_html, website=place["website"],
+            ))
+        return SEARCH_PAGE.format(title=html.escape(query), cards=json.dumps(cards), batch=self.config.batch, delay=self.config.scroll_delay_ms)
+
+    def site_email(self, site_id):
+        rng = random.Random(f"{self.config.seed}-{site_id}")
+        if rng.random() >= self.config.email_ratio:
+            return None, False
+        return f"hello@site-{site_id}.example.org", rng.random() < self.config.contact_ratio
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fixtures = None
+    request_count = 0
+    bytes_sent = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200):
+        data = body.encode("utf-8")
+        config = self.fixtures.config
+        delay = max(0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with _Handler._lock:
+            _Handler.request_count += 1
+            _Handler.bytes_sent += len(data)
+
+    def do_GET(self):
+        path = unquote(self.path.split("?")[0])
+        fixtures = self.fixtures
+        if path.startswith("/maps/search/"):
+            return self._send(fixtures.search_page(path[len("/maps/search/"):].strip("/")))
+        if path.startswith("/maps/place/"):
+            site_id = self.path.split("?q=")[-1]
+            query_id, index = site_id.split("-")
+            for place in self._find_places(int(query_id)):
+                if place["site_id"] == site_id:
+                    return self._send(PLACE_PAGE.format(
+                        name=html.escape(place["name"]), website=place["website"], address=html.escape(place["address"]),
+                        digits=place["phone"].replace(" ", ""), phone=place["phone"], padding=_padding(fixtures.config.page_kb),
+                    ))
+            return self._send("not found", 404)
+        if path.startswith("/site/"):
+            parts = path.strip("/").split("/")
+            site_id = parts[1]
+            email, contact_only = fixtures.site_email(site_id)
+            if len(parts) > 2:
+                footer = f'<a href="mailto:{email}">Email us</a>' if email else "<p>Call us.</p>"
+                return self._send(SITE_PAGE.format(name="Contact", site_id=site_id, padding="", footer=footer))
+            footer = f"<footer>Write to {email}</footer>" if email and not contact_only else "<footer>Follow us</footer>"
+            return self._send(SITE_PAGE.format(name=site_id, site_id=site_id, padding=_padding(fixtures.config.page_kb), footer=footer))
+        return self._send("not found", 404)
+
+    def _find_places(self, query_id):
+        # Place pages only carry the site id; remember which query each id came from
+        return self.server.places_by_query.get(query_id, [])
+
+
+class FixtureServer:
+    """Threaded HTTP server on 127.0.0.1 with a random free port."""
+
+    def __init__(self, config=None, port=0):
+        self.config = config or FixtureConfig()
+        handler = type("FixtureHandler", (_Handler,), {})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.places_by_query = {}
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        handler.fixtures = _RecordingFixtures(self.config, self.base_url, self.httpd.places_by_query)
+        self.handler = handler
+        self._thread = None
+
+    @property
+    def maps_url(self):
+        return f"{self.base_url}/maps"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return {"requests": self.handler.request_count, "mb_served": round(self.handler.bytes_sent / (1024 * 1024), 2)}
+
+
+class _RecordingFixtures(Fixtures):
+    def __init__(self, config, base_url, places_by_query):
+        super().__init__(config, base_url)
+        self.places_by_query = places_by_query
+
+    def places(self, query):
+        places = super().places(query)
+        if places:
+            query_id = int(places[0]["site_id"].split("-")[0])
+            self.places_by_query[query_id] = places
+        return places
@@ -0,0 +1,74 @@
+"""Startup budget check for the API.
+
+Imports backend/main.py in a fresh interpreter with -X importtime and fails (exit 1) if
+the import takes longer than the budget or pulls in any of the scraping stack, which
+should only load with the first /scrape:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 800 --top 15
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1200"))
+
+# Must not be imported by `import main`
+SCRAPING_STACK = ("selenium", "webdriver_manager", "phonenumbers", "requests", "bs4", "geopy", "motor", "pyarrow",
+                  "scraper_engine", "driver_pool", "email_enricher", "feed_parser", "geocoding")
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile_import(module="main"):
+    """(cumulative microseconds per top-level-or-nested module, in import order)."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("MONGODB_URI", None)  # the import must not need a database
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(cumulative_us), int(self_us), len(indent) // 2))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the API's import time and that it stays free of the scraping stack")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports of main to list")
+    args = parser.parse_args()
+
+    modules = profile_import()
+    total_ms = next(cumulative for name, cumulative, _, _ in reversed(modules) if name == "main") / 1000
+    direct = sorted(((name, cumulative) for name, cumulative, _, depth in modules if depth == 1), key=lambda item: -item[1])
+    loaded = {name.split(".")[0] for name, _, _, _ in modules} | {name for name, _, _, _ in modules}
+    leaked = [name for name in SCRAPING_STACK if name in loaded]
+
+    print(f"import main: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, cumulative in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"FAIL: over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if leaked:
+        print(f"FAIL: scraping modules loaded at startup: {', '.join(leaked)}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Offline end-to-end scraper benchmark.
+
+Starts the fixture server (fixture_server.py), points the scrapers at it through
+MAPS_BASE_URL and runs them against a local Mongo stand-in, so throughput can be
+compared between commits without touching Google Maps:
+
+    python benchmarks/run_benchmark.py --target engine --save-baseline benchmarks/results/baseline.json
+    python benchmarks/run_benchmark.py --target engine --compare benchmarks/results/baseline.json
+
+Needs Chrome and a chromedriver like the scrapers themselves. Mongo is mongomock
+unless --mongo-uri is given (use a throwaway database, leads are written to it).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import types
+import argparse
+import tempfile
+import threading
+import functools
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "SCRAPER"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import FixtureConfig, FixtureServer
+
+KEYWORDS = ["dentist", "bakery", "gym", "plumber", "florist", "pharmacy", "tailor", "optician"]
+LOCATIONS = ["Mumbai", "Delhi", "Agra", "Pune", "Jaipur", "Chennai"]
+
+
+class StageTimer:
+    """Wall-clock samples per stage, from wrapped engine functions."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, owner, name, stage=None):
+        original = getattr(owner, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(stage or name, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+    def report(self):
+        with self._lock:
+            return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p90_ms": round(percentile(values, 90) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        "total_s": round(sum(values), 2),
+    }
+
+
+class PeakRss:
+    """Peak resident memory of this process plus its children (the Chrome processes)."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _sample(self):
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except Exception:
+                pass
+        self.peak = max(self.peak, total)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        if self._process:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self):
+        if self._process:
+            return {"peak_rss_mb": round(self.peak / (1024 * 1024), 1), "source": "psutil (process tree)"}
+        import resource
+        # ru_maxrss is in KB on Linux; children only count once they have exited
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return {"peak_rss_mb": round(max(own, children) / 1024, 1), "source": "getrusage (max of self and children)"}
+
+
+def use_mongomock(database):
+    import mongomock
+
+    # mongomock's bulk_write rejects the UpdateOne ops recent pymongo builds; apply them one by one
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        upserted = {}
+        for idx, op in enumerate(requests):
+            result = self.update_one(op._filter, op._doc, upsert=op._upsert)
+            if result.upserted_id is not None:
+                upserted[idx] = result.upserted_id
+        return types.SimpleNamespace(upserted_ids=upserted)
+
+    mongomock.collection.Collection.bulk_write = bulk_write
+    database.sync_client = mongomock.MongoClient()
+    database.db_sync = database.sync_client[database.DATABASE_NAME]
+
+
+def run_engine(args, timer):
+    import database
+    if not args.mongo_uri:
+        use_mongomock(database)
+    import scraper_engine
+    import email_enricher
+    import lead_writer
+    from models import ScrapeStatus
+    from task_store import get_task_store
+
+    for name in ("collect_business_links", "resolve_from_feed", "scrape_links", "_run_query"):
+        timer.wrap(scraper_engine, name)
+    timer.wrap(email_enricher, "find_email", "email_fetch")
+    timer.wrap(lead_writer.LeadWriter, "flush", "lead_write")
+    # Every page load the engine makes goes through PageMetrics.record
+    original_record = scraper_engine.PageMetrics.record
+
+    def record(self, driver, elapsed):
+        timer.add("page_load", elapsed)
+        return original_record(self, driver, elapsed)
+
+    scraper_engine.PageMetrics.record = record
+
+    task_id = f"bench-{uuid.uuid4().hex[:8]}"
+    store = get_task_store()
+    store.create(ScrapeStatus(task_id=task_id, status="running", progress=0, leads_found=0))
+    scraper_engine.run_scraper_task(task_id, args.keywords, args.locations, args.parallel, args.mode, args.max_results)
+    status = store.get(task_id)
+    return {"status": status.status, "message": status.message, "leads": status.leads_found, "stats": status.stats}
+
+
+class MemorySink:
+    """Stands in for the CLI's SheetSink (no Sheets API in the benchmark)."""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+
+
+def run_cli(args, timer):
+    import scraper
+
+    from rate_control import RATE_PROFILES, RateController
+
+    # The CLI's waits between pages come from its rate controllers; scale their rates so the
+    # waits shrink by --cli-sleep-scale (0 = no pacing, the fixture server is local)
+    def scaled(rate):
+        return rate / args.cli_sleep_scale if args.cli_sleep_scale > 0 else 1e6
+
+    controllers = {
+        name: RateController(scaled(profile["initial"]), scaled(profile["max"]), scaled(profile["global"]))
+        for name, profile in RATE_PROFILES.items()
+    }
+    scraper.get_rate_controller = controllers.__getitem__
+    original_get = scraper.PageMetrics.timed_get
+
+    def timed_get(self, driver, url):
+        start = time.perf_counter()
+        try:
+            return original_get(self, driver, url)
+        finally:
+            timer.add("page_load", time.perf_counter() - start)
+
+    scraper.PageMetrics.timed_get = timed_get
+
+    sink = MemorySink()
+    existing_keys = scraper.SharedKeys({}, "bench") # a plain dict does for a single process
+    for keyword in args.keywords:
+        for location in args.locations:
+            country, code = scraper.get_country_for_location(location)
+            start = time.perf_counter()
+            scraper.find_and_save_dynamically(keyword, location, country, code, sink, existing_keys)
+            timer.add("query", time.perf_counter() - start)
+    return {"status": "completed", "leads": len(sink.rows)}
+
+
+def run(args):
+    config = FixtureConfig(
+        places=args.places, detail_ratio=args.detail_ratio, latency_ms=args.latency_ms,
+        page_kb=args.page_kb, scroll_delay_ms=args.scroll_delay_ms,
+    )
+    server = FixtureServer(config).start()
+    os.environ["MAPS_BASE_URL"] = server.maps_url
+    os.environ.setdefault("TASK_STORE", "memory")
+    os.environ["BROWSER_PROFILE"] = args.profile
+    os.environ.setdefault("BROWSER_METRICS", "1") # bytes per page in the report
+    os.environ["GEOCODE_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-geo-"), "geocode.sqlite3")
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+        os.environ.setdefault("DATABASE_NAME", "maps_scraper_bench")
+
+    timer = StageTimer()
+    try:
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            outcome = run_engine(args, timer) if args.target == "engine" else run_cli(args, timer)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    return {
+        "target": args.target,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "keywords": args.keywords, "locations": args.locations, "parallel": args.parallel,
+            "mode": args.mode, "profile": args.profile, "max_results": args.max_results,
+            "mongo": "uri" if args.mongo_uri else "mongomock", "fixtures": config.as_dict(),
+        },
+        "outcome": outcome,
+        "elapsed_s": round(elapsed, 2),
+        "leads_per_sec": round(outcome["leads"] / elapsed, 3) if elapsed else 0.0,
+        "stages": timer.report(),
+        "memory": rss.report(),
+        "server": server.stats(),
+    }
+
+
+def compare(result, baseline):
+    """Print the headline numbers and every stage p50/p90/p99 next to the baseline."""
+    def line(label, new, old, lower_is_better=True):
+        if not old:
+            print(f"  {label:<34} {new:>10}")
+            return
+        change = (new - old) / old * 100
+        better = change < 0 if lower_is_better else change > 0
+        print(f"  {label:<34} {new:>10} vs {old:>10}  {change:+6.1f}% {'better' if better else 'worse' if change else ''}")
+
+    print(f"Compared with baseline from {baseline.get('created_at')}:")
+    line("leads/sec", result["leads_per_sec"], baseline.get("leads_per_sec"), lower_is_better=False)
+    line("elapsed_s", result["elapsed_s"], baseline.get("elapsed_s"))
+    line("peak_rss_mb", result["memory"]["peak_rss_mb"], baseline.get("memory", {}).get("peak_rss_mb"))
+    for stage, numbers in result["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {})
+        for key in ("p50_ms", "p90_ms", "p99_ms"):
+            line(f"{stage}.{key}", numbers[key], old.get(key))
+    if result["params"] != baseline.get("params"):
+        print("  note: run parameters differ from the baseline's")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark against local Maps/website fixtures")
+    parser.add_argument("--target", choices=["engine", "cli"], default="engine", help="engine = run_scraper_task, cli = SCRAPER/scraper.py")
+    parser.add_argument("--keywords", type=int, default=2, help="number of keywords from the built-in list")
+    parser.add_argument("--locations", type=int, default=2, help="number of locations from the built-in list")
+    parser.add_argument("--places", type=int, default=40, help="results per search")
+    parser.add_argument("--latency-ms", type=int, default=30)
+    parser.add_argument("--page-kb", type=int, default=150, help="size of place pages and business websites")
+    parser.add_argument("--detail-ratio", type=float, default=0.2, help="share of cards without a phone in the feed")
+    parser.add_argument("--scroll-delay-ms", type=int, default=150, help="delay before the feed loads the next batch")
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--mode", choices=["feed", "detail"], default="feed")
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--profile", choices=["standard", "lean"], default=os.getenv("BROWSER_PROFILE", "standard"))
+    parser.add_argument("--cli-sleep-scale", type=float, default=0.0, help="multiplier for the CLI's rate-controller waits (0 = no pacing)")
+    parser.add_argument("--mongo-uri", default=None, help="real Mongo instead of mongomock")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json"))
+    parser.add_argument("--save-baseline", default=None, help="also write the result here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to diff against")
+    args = parser.parse_args()
+    args.keywords = KEYWORDS[:max(1, args.keywords)]
+    args.locations = LOCATIONS[:max(1, args.locations)]
+
+    result = run(args)
+    print(json.dumps({k: result[k] for k in ("target", "outcome", "elapsed_s", "leads_per_sec", "memory")}, indent=2, default=str))
+    for stage, numbers in result["stages"].items():
+        print(f"  {stage:<24} n={numbers['count']:<5} p50={numbers['p50_ms']}ms p90={numbers['p90_ms']}ms p99={numbers['p99_ms']}ms max={numbers['max_ms']}ms")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
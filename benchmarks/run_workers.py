@@ -0,0 +1,129 @@
+"""Local end-to-end run of the distributed queue (SCRAPE_EXECUTION=workers).
+
+Starts the fixture server, queues one job in a local Mongo and runs several worker.py
+processes against it, printing the job's aggregated status as it goes. --kill-after
+SIGKILLs one worker mid-run so its lease has to expire and be reclaimed by the others:
+
+    python benchmarks/run_workers.py --workers 3 --keywords 3 --locations 3
+    python benchmarks/run_workers.py --workers 3 --kill-after 20 --lease 15
+
+Needs Chrome and a real Mongo (worker processes cannot share mongomock). Uses its own
+database, dropped afterwards unless --keep-db.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import FixtureConfig, FixtureServer
+from run_benchmark import KEYWORDS, LOCATIONS
+
+
+def configure(args, server):
+    # Read by database.py / work_queue.py at import, and inherited by the workers
+    os.environ.update({
+        "MONGODB_URI": args.mongo_uri,
+        "DATABASE_NAME": args.database,
+        "TASK_STORE": "mongo",
+        "SCRAPE_EXECUTION": "workers",
+        "MAPS_BASE_URL": server.maps_url,
+        "UNIT_LEASE_SECONDS": str(args.lease),
+        "UNIT_HEARTBEAT_INTERVAL": str(max(1.0, args.lease / 6)),
+        "WORKER_POLL_INTERVAL": "1",
+        "DRIVER_POOL_SIZE": str(args.units),
+        "GEOCODE_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="workers-geo-"), "geocode.sqlite3"),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one scrape job on several local worker processes")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--units", type=int, default=1, help="units per worker process at once")
+    parser.add_argument("--keywords", type=int, default=2)
+    parser.add_argument("--locations", type=int, default=3)
+    parser.add_argument("--places", type=int, default=30, help="results per search")
+    parser.add_argument("--latency-ms", type=int, default=30)
+    parser.add_argument("--lease", type=float, default=15, help="UNIT_LEASE_SECONDS for this run")
+    parser.add_argument("--kill-after", type=float, default=None, help="SIGKILL the first worker after this many seconds")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="maps_scraper_workers_bench")
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--keep-db", action="store_true")
+    args = parser.parse_args()
+
+    server = FixtureServer(FixtureConfig(places=args.places, latency_ms=args.latency_ms)).start()
+    configure(args, server)
+    from database import db_sync, sync_client
+    from models import ScrapeStatus
+    from task_store import MongoTaskStore, TERMINAL_STATUSES
+    from work_queue import UnitQueue, WorkerDispatch
+
+    store = MongoTaskStore(db_sync.tasks)
+    dispatch = WorkerDispatch(UnitQueue(db_sync.scrape_units), store, db_sync.tasks, db_sync.task_checkpoints)
+    dispatch.start()
+    task_id = f"workers-{uuid.uuid4().hex[:8]}"
+    request = {
+        "keywords": KEYWORDS[:max(1, args.keywords)], "locations": LOCATIONS[:max(1, args.locations)],
+        "parallel_count": 1, "extraction_mode": "feed", "max_results": None, "priority": 0,
+    }
+    store.create(ScrapeStatus(task_id=task_id, status="queued", progress=0, leads_found=0))
+    dispatch.submit(task_id, request)
+
+    workers = [
+        subprocess.Popen([sys.executable, "worker.py", "--exit-when-idle", "--units", str(args.units)], cwd=BACKEND)
+        for _ in range(max(1, args.workers))
+    ]
+    start = time.perf_counter()
+    killed = False
+    status = None
+    try:
+        while time.perf_counter() - start < args.timeout:
+            status = store.get(task_id)
+            print(f"[{time.perf_counter() - start:6.1f}s] {status.status:<9} {status.progress:3d}%  leads={status.leads_found:<4} {status.message}")
+            if status.status in TERMINAL_STATUSES:
+                break
+            if args.kill_after is not None and not killed and time.perf_counter() - start >= args.kill_after:
+                workers[0].send_signal(signal.SIGKILL)
+                killed = True
+                print(f"Killed worker pid {workers[0].pid}; its unit comes back after the {args.lease:.0f}s lease")
+            time.sleep(1)
+        for process in workers:
+            try:
+                process.wait(timeout=args.lease * 2 + 30)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+    finally:
+        for process in workers:
+            if process.poll() is None:
+                process.kill()
+        server.stop()
+
+    elapsed = time.perf_counter() - start
+    stored = db_sync.leads.count_documents({"task_id": task_id})
+    keys = len(db_sync.leads.distinct("dedup_key", {"task_id": task_id}))
+    print(json.dumps({
+        "status": status.status if status else None,
+        "elapsed_s": round(elapsed, 1),
+        "leads_reported": status.leads_found if status else None,
+        "leads_stored": stored,
+        "duplicate_leads": stored - keys,
+        "units": status.stats.get("units") if status else None,
+        "worker_exit_codes": [process.returncode for process in workers],
+    }, indent=2))
+    store.close()
+    if not args.keep_db:
+        sync_client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
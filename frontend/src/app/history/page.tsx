@@ -1,5 +1,5 @@
 "use client";
-import React, { useEffect, useState, useCallback } from "react";
+import React, { useEffect, useState, useCallback, useRef } from "react";
 import {
     Download,
     Search,
@@ -35,6 +35,12 @@ export default function HistoryPage() {
 
     const limit = 20;
 
+    // next_cursor of each page we have seen, so paging forward seeks instead of skipping
+    const cursors = useRef<Record<number, string>>({});
+    useEffect(() => {
+        cursors.current = {};
+    }, [searchTerm, selectedKeyword]);
+
     const fetchKeywords = async () => {
         try {
             const res = await scrapeApi.getKeywords();
@@ -47,7 +53,8 @@ export default function HistoryPage() {
     const fetchLeads = useCallback(async () => {
         setLoading(true);
         try {
-            const response = await scrapeApi.getAllLeads(page, limit, searchTerm, selectedKeyword || "");
+            const response = await scrapeApi.getAllLeads(page, limit, searchTerm, selectedKeyword || "", cursors.current[page] || "");
+            if (response.data.next_cursor) cursors.current[page + 1] = response.data.next_cursor;
             setLeads(response.data.leads);
             setTotalPages(response.data.pages);
             setTotalLeads(response.data.total);
@@ -109,15 +116,13 @@ export default function HistoryPage() {
     };
 
     const exportCSV = () => {
-        if (leads.length === 0) return;
-        const headers = ["Name", "Address", "Phone", "Website", "Email", "Country", "City", "Keyword"];
-        const rows = leads.map(l => [l.name, l.address, l.phone, l.website, l.email, l.country, l.city, l.keyword]);
-        const csvContent = "data:text/csv;charset=utf-8," + [headers, ...rows].map(e => e.join(",")).join("\n");
+        // Full export of the current keyword filter, streamed by the API
         const link = document.createElement("a");
-        link.setAttribute("href", encodeURI(csvContent));
+        link.setAttribute("href", scrapeApi.exportLeadsUrl("csv", selectedKeyword || ""));
         link.setAttribute("download", "scraping_leads.csv");
         document.body.appendChild(link);
         link.click();
+        link.remove();
     };
 
     return (
@@ -148,7 +153,7 @@ export default function HistoryPage() {
                         className="flex items-center gap-2 px-6 py-2.5 premium-gradient rounded-2xl hover:opacity-90 transition-all text-sm font-bold text-white shadow-xl shadow-indigo-500/20"
                     >
                         <Download className="w-4 h-4" />
-                        Export Page
+                        Export CSV
                     </button>
                 </div>
             </div>
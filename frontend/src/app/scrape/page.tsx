@@ -76,26 +76,40 @@ export default function ScrapePage() {
         }
     };
 
-    // Poll for status if task is active
+    // Stream status while the task is active; fall back to polling if the stream drops
+    const activeTaskId = activeTask?.task_id;
+    const isActive = (status?: string) => status === "running" || status === "queued";
+    const activeTaskRunning = isActive(activeTask?.status);
     useEffect(() => {
+        if (!activeTaskId || !activeTaskRunning) return;
+
         let interval: any;
-        if (activeTask && activeTask.status === "running") {
+        const source = scrapeApi.streamStatus(activeTaskId);
+        source.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            setActiveTask(data);
+            if (!isActive(data.status)) source.close();
+        };
+        source.onerror = () => {
+            source.close();
             interval = setInterval(async () => {
                 try {
-                    const response = await scrapeApi.getStatus(activeTask.task_id);
+                    const response = await scrapeApi.getStatus(activeTaskId);
                     setActiveTask(response.data);
-                    if (response.data.status !== "running") {
+                    if (!isActive(response.data.status)) {
                         clearInterval(interval);
-                        // We can keep it or clear it. Let's clear after completion to allow new tasks easily.
-                        // localStorage.removeItem("active_scraping_task_id"); 
                     }
                 } catch (err) {
                     console.error("Poll Error:", err);
                 }
             }, 3000);
-        }
-        return () => clearInterval(interval);
-    }, [activeTask]);
+        };
+
+        return () => {
+            source.close();
+            clearInterval(interval);
+        };
+    }, [activeTaskId, activeTaskRunning]);
 
     return (
         <div className="max-w-5xl mx-auto space-y-8 animate-in fade-in slide-in-from-bottom-4 duration-700">
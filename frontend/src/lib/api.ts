@@ -12,12 +12,20 @@ export const scrapeApi = {
     startScraping: (keywords: string[], locations: string[]) =>
         api.post("/scrape", { keywords, locations }),
 
+    cancelScraping: (taskId: string) =>
+        api.delete(`/scrape/${taskId}`),
+
     getStatus: (taskId: string) =>
         api.get(`/status/${taskId}`),
 
+    // Server-Sent Events stream of status changes (replaces polling)
+    streamStatus: (taskId: string) =>
+        new EventSource(`${API_BASE_URL}/status/${taskId}/stream`),
+
     // Lead Management
-    getAllLeads: (page: number = 1, limit: number = 50, search: string = "", keyword: string = "") => {
+    getAllLeads: (page: number = 1, limit: number = 50, search: string = "", keyword: string = "", cursor: string = "") => {
         let url = `/leads/all?page=${page}&limit=${limit}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
         if (search) url += `&search=${encodeURIComponent(search)}`;
         if (keyword) url += `&keyword=${encodeURIComponent(keyword)}`;
         return api.get(url);
@@ -36,6 +44,14 @@ export const scrapeApi = {
     getStats: () =>
         api.get("/stats"),
 
+    // Streamed by the backend; open it as a download instead of loading it through axios
+    exportLeadsUrl: (format: "csv" | "ndjson" | "parquet" = "csv", keyword: string = "", taskId: string = "") => {
+        let url = `${API_BASE_URL}/leads/export?format=${format}`;
+        if (keyword) url += `&keyword=${encodeURIComponent(keyword)}`;
+        if (taskId) url += `&task_id=${encodeURIComponent(taskId)}`;
+        return url;
+    },
+
     getLeadsByTask: (taskId: string) =>
         api.get(`/leads/${taskId}`),
 };